@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# benchmark.py
+#
+# Compares the throughput of the ingest views. Runs against a throw-away test
+# database and calls the views in-process so that only the view stack and the
+# ingest work are measured.
+#
+#   python benchmark.py [requests]
+import json
+import sys
+import time
+import uuid
+
+from boot_django import boot_django
+
+boot_django()
+
+
+def run(name, view, factory, body, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        request = factory.post('/', body, content_type='application/json')
+        response = view(request)
+        if hasattr(response, 'render'):
+            response.render()
+        assert response.status_code == 200, response.status_code
+    elapsed = time.perf_counter() - start
+    print(f'{name:<32} {count / elapsed:10.1f} req/s')
+
+
+def main(count):
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.test import RequestFactory
+    from django.test.utils import setup_test_environment
+    from django.utils import timezone
+    from femtolytics.api.views import EventView, LeanEventView
+    from femtolytics.models import App
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        owner = get_user_model().objects.create_user('benchmark')
+        App.objects.create(owner=owner, package_name='com.femtolytics.benchmark')
+
+        empty = json.dumps({'events': []})
+        batch = {
+            'events': [
+                {
+                    'event': {
+                        'type': 'VIEW',
+                        'time': timezone.now().isoformat(),
+                        'properties': {'view': 'HomePage'},
+                    },
+                    'device': {'name': 'iPhone', 'os': 'iOS 14.0'},
+                    'package': {'name': 'com.femtolytics.benchmark', 'version': '1.0.0', 'build': '1'},
+                    'visitor_id': str(uuid.uuid4()),
+                },
+            ],
+        }
+        event = json.dumps(batch)
+        batch['events'][0]['event']['id'] = 1
+        retried = json.dumps(batch)
+
+        factory = RequestFactory()
+        views = [
+            ('EventView', EventView.as_view()),
+            ('LeanEventView', LeanEventView.as_view()),
+        ]
+        print('Empty batch (view overhead only)')
+        for name, view in views:
+            run(name, view, factory, empty, count)
+        print('Batch of one VIEW event')
+        for name, view in views:
+            run(name, view, factory, event, count)
+        print('Retried batch of one VIEW event')
+        for name, view in views:
+            run(name, view, factory, retried, count)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    count = 1000
+    if len(sys.argv[1:]) > 0:
+        count = int(sys.argv[1])
+    main(count)
@@ -23,7 +23,24 @@ def boot_django():
             'femtolytics',
             'django.contrib.auth',
             'django.contrib.contenttypes',
+            'django.contrib.sessions',
         ),
+        MIDDLEWARE=(
+            'django.contrib.sessions.middleware.SessionMiddleware',
+            'django.contrib.auth.middleware.AuthenticationMiddleware',
+        ),
+        TEMPLATES=[{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'APP_DIRS': True,
+            'OPTIONS': {
+                'context_processors': [
+                    'django.template.context_processors.request',
+                    'django.contrib.auth.context_processors.auth',
+                ],
+            },
+        }],
+        SECRET_KEY='femtolytics-tests',
+        STATIC_URL='/static/',
         TIME_ZONE="UTC",
         USE_TZ=True,
         ROOT_URLCONF = 'boot_urls',
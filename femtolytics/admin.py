@@ -1,12 +1,132 @@
-from femtolytics.models import App, Session, Visitor, Activity
+import uuid
+
 from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from femtolytics.handler import Handler
+from femtolytics.models import App, Session, Visitor, Activity
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that never counts every row of a large table.
+
+    Unfiltered tables are counted with the planner statistics on PostgreSQL,
+    anything else is only counted up to `max_count` rows. Use the cursor link
+    to go further.
+    """
+    max_count = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = self.estimate(queryset)
+            if estimate is not None and estimate > self.max_count:
+                return estimate
+        return queryset[:self.max_count].count()
+
+    def estimate(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        return int(row[0]) if row is not None else None
+
+
+class CursorChangeList(ChangeList):
+    """Adds a link to the rows following the current page, by `cursor_field`.
+
+    Going deep into a large table by page number means large OFFSETs, the
+    link filters on the indexed `cursor_field` instead. Rows sharing the exact
+    same value as the last one of the page are skipped.
+    """
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.next_cursor_url = None
+        results = list(self.result_list)
+        if len(results) < self.list_per_page:
+            return
+        field = self.model_admin.cursor_field
+        last = getattr(results[-1], field)
+        self.next_cursor_url = self.get_query_string({f'{field}__lt': last.isoformat()}, remove=[PAGE_VAR])
+
+
+class IdFilter(admin.SimpleListFilter):
+    """Filters on the id of a related object typed in, rather than listing all of them."""
+    template = 'admin/femtolytics/id_filter.html'
+
+    def lookups(self, request, model_admin):
+        # The input replaces the choices, but the filter is only shown when there are some.
+        return [(None, None)]
+
+    def choices(self, changelist):
+        yield {
+            'query_parts': [(k, v) for k, v in changelist.get_filters_params().items() if k != self.parameter_name],
+        }
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            return queryset.filter(**{self.parameter_name: uuid.UUID(self.value().strip())})
+        except ValueError:
+            return queryset.none()
+
+
+class VisitorFilter(IdFilter):
+    title = 'visitor id'
+    parameter_name = 'visitor_id'
+
+
+class SessionFilter(IdFilter):
+    title = 'session id'
+    parameter_name = 'session_id'
+
+
+class ActivityTypeFilter(admin.SimpleListFilter):
+    """Lists the event types known to the protocol.
+
+    A plain field filter would look for every distinct type in the table.
+    Actions have free-form types and are not listed, `?activity_type=` still
+    filters on any of them.
+    """
+    title = 'activity type'
+    parameter_name = 'activity_type'
+
+    def lookups(self, request, model_admin):
+        return [(activity_type, activity_type) for activity_type in Handler.EVENT_TYPES]
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        return queryset.filter(activity_type=self.value())
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Admin for tables with tens of millions of rows."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/femtolytics/change_list.html'
+    cursor_field = None
+
+    def get_changelist(self, request, **kwargs):
+        return CursorChangeList
+
 
 @admin.register(Activity)
-class ActivityAdmin(admin.ModelAdmin):
+class ActivityAdmin(ScalableAdmin):
     ordering = ['-occured_at']
+    cursor_field = 'occured_at'
     list_display = ['short_id', 'user', 'sid', 'activity_type', 'properties', 'version', 'device_os', 'occured_at']
-    list_filter = ['visitor', 'activity_type']
-    date_hierarchy = 'occured_at'
+    list_filter = [VisitorFilter, SessionFilter, 'category', ActivityTypeFilter]
+    list_select_related = ['visitor', 'session', 'release', 'device']
+    raw_id_fields = ['visitor', 'session', 'app', 'device', 'release']
 
     def sid(self, obj):
         return obj.session.short_id
@@ -17,20 +137,25 @@ class ActivityAdmin(admin.ModelAdmin):
     user.short_description = 'User'
 
     def version(self, obj):
-        return f"{obj.package_version}.{obj.package_build}"
+        return obj.version
 
 @admin.register(Session)
-class SessionAdmin(admin.ModelAdmin):
-    ordering = ['-started_at']
+class SessionAdmin(ScalableAdmin):
+    # created_at is indexed, unlike started_at.
+    ordering = ['-created_at']
+    cursor_field = 'created_at'
     list_display = ['short_id', 'user', 'started_at', 'ended_at']
-    date_hierarchy = 'started_at'
+    list_filter = [VisitorFilter]
+    list_select_related = ['visitor']
+    raw_id_fields = ['visitor', 'app', 'release']
 
     def user(self, obj):
         return obj.visitor.short_id
     user.short_description = 'User'
 
 @admin.register(Visitor)
-class VisitorAdmin(admin.ModelAdmin):
+class VisitorAdmin(ScalableAdmin):
     ordering = ['-created_at']
+    cursor_field = 'created_at'
     list_display = ['short_id', 'created_at']
-    date_hierarchy = 'created_at'
+    raw_id_fields = ['app', 'first_session']
@@ -0,0 +1,17 @@
+from django.urls import path
+
+from femtolytics.api import stats, views
+
+# Same endpoints as `femtolytics.api.urls`, the ingest ones being served by
+# native async views. Include this module instead of `femtolytics.api.urls`
+# when running under ASGI.
+app_name = 'femtolytics_api'
+urlpatterns = [
+     path('event', views.AsyncEventView.as_view(), name='event'),
+     path('action', views.AsyncActionView.as_view(), name='action'),
+     path('stats/<uuid:app_id>/timeseries', stats.TimeseriesView.as_view(), name='stats_timeseries'),
+     path('stats/<uuid:app_id>/map', stats.MapView.as_view(), name='stats_map'),
+     path('stats/<uuid:app_id>/goals', stats.GoalsView.as_view(), name='stats_goals'),
+     path('stats/<uuid:app_id>/crashes', stats.CrashesView.as_view(), name='stats_crashes'),
+     path('stats/<uuid:app_id>/active-users', stats.ActiveUsersView.as_view(), name='stats_active_users'),
+]
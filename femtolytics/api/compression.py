@@ -0,0 +1,110 @@
+import zlib
+
+from django.conf import settings
+
+CHUNK_SIZE = 64 * 1024
+
+
+class BodyTooLarge(ValueError):
+    pass
+
+
+class UnsupportedEncoding(ValueError):
+    pass
+
+
+class InvalidEncoding(ValueError):
+    pass
+
+
+def max_body_size():
+    size = 10 * 1024 * 1024
+    if hasattr(settings, 'FEMTOLYTICS_MAX_BODY_SIZE'):
+        size = settings.FEMTOLYTICS_MAX_BODY_SIZE
+    return size
+
+
+def read_body(request):
+    """Reads the request body, decompressing it according to `Content-Encoding`.
+
+    Bodies are streamed from the request and reading stops as soon as the
+    output goes over `FEMTOLYTICS_MAX_BODY_SIZE`, so a small compressed payload
+    cannot expand into an arbitrarily large one. Uncompressed bodies are not
+    read through `request.body`, which is capped by Django's
+    `DATA_UPLOAD_MAX_MEMORY_SIZE` instead.
+    """
+    limit = max_body_size()
+    encoding = request.META.get('HTTP_CONTENT_ENCODING', 'identity').strip().lower()
+    if encoding in ('', 'identity'):
+        return _read(request, limit)
+    if encoding in ('gzip', 'x-gzip'):
+        return _inflate(request, zlib.MAX_WBITS | 16, limit)
+    if encoding == 'deflate':
+        return _inflate(request, None, limit)
+    if encoding == 'zstd':
+        return _unzstd(request, limit)
+    raise UnsupportedEncoding(encoding)
+
+
+def _read(request, limit):
+    try:
+        if int(request.META.get('CONTENT_LENGTH') or 0) > limit:
+            raise BodyTooLarge()
+    except ValueError:
+        pass
+    output = bytearray()
+    while True:
+        chunk = request.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        output += chunk
+        if len(output) > limit:
+            raise BodyTooLarge()
+    return bytes(output)
+
+
+def _inflate(request, wbits, limit):
+    decompressor = None
+    output = bytearray()
+    try:
+        while True:
+            chunk = request.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if decompressor is None:
+                if wbits is None:
+                    # `deflate` is supposed to be zlib-wrapped but some clients send raw deflate.
+                    wrapped = len(chunk) >= 2 and (chunk[0] & 0x0f) == 8 and ((chunk[0] << 8) | chunk[1]) % 31 == 0
+                    wbits = zlib.MAX_WBITS if wrapped else -zlib.MAX_WBITS
+                decompressor = zlib.decompressobj(wbits)
+            output += decompressor.decompress(chunk, limit - len(output) + 1)
+            if len(output) > limit:
+                raise BodyTooLarge()
+        if decompressor is not None:
+            output += decompressor.flush()
+    except zlib.error as e:
+        raise InvalidEncoding(str(e))
+    if len(output) > limit:
+        raise BodyTooLarge()
+    return bytes(output)
+
+
+def _unzstd(request, limit):
+    try:
+        import zstandard
+    except ImportError:
+        raise UnsupportedEncoding('zstd')
+
+    output = bytearray()
+    try:
+        with zstandard.ZstdDecompressor().stream_reader(request, read_size=CHUNK_SIZE) as reader:
+            while True:
+                chunk = reader.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                output += chunk
+                if len(output) > limit:
+                    raise BodyTooLarge()
+    except zstandard.ZstdError as e:
+        raise InvalidEncoding(str(e))
+    return bytes(output)
@@ -0,0 +1,100 @@
+import hashlib
+import math
+
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from femtolytics.dashboard import Dashboard
+from femtolytics.models import App
+
+
+class StatsView(APIView):
+    """Base class for the endpoints returning a piece of the dashboard as JSON.
+
+    Responses carry an ETag and a Last-Modified header derived from the cached
+    piece, so clients revalidating an unchanged piece get a 304 without
+    anything being computed, and a 200 as soon as the piece is recomputed.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    name = None
+    compute = None
+    # Whether the piece covers the last `duration` days.
+    per_duration = True
+
+    def data(self, value):
+        return value
+
+    def get(self, request, app_id, format=None):
+        app = get_object_or_404(App, pk=app_id)
+        if app.owner != request.user:
+            raise Http404
+        try:
+            duration = int(request.GET.get('duration', 30))
+        except ValueError:
+            return Response({'duration': 'A number of days is required.'}, status=400)
+        if not self.per_duration:
+            duration = None
+
+        value, computed_at = Dashboard.cached_entry(app, self.name, duration, self.compute)
+        etag, last_modified = validators(app, self.name, duration, computed_at)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = Response(self.data(value))
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+def validators(app, name, duration, computed_at):
+    """Returns the ETag and the Last-Modified timestamp of a piece of the dashboard computed at `computed_at`.
+
+    Pieces are recomputed when the watermark moves, at midnight since they
+    cover the last `duration` days, and when their cache entry expires, which
+    picks up activities ingested without moving the watermark.
+    """
+    key = f'{app.id}:{name}:{duration}:{computed_at}'
+    etag = quote_etag(hashlib.sha1(key.encode('utf-8')).hexdigest())
+    # Rounded up, Last-Modified must not be earlier than the data it covers.
+    return etag, math.ceil(computed_at)
+
+
+class TimeseriesView(StatsView):
+    name = 'stats'
+    compute = Dashboard.compute_stats
+
+
+class MapView(StatsView):
+    name = 'locations'
+    compute = Dashboard.compute_locations
+
+    def data(self, value):
+        # None when geolocation is not available.
+        return {'locations': value}
+
+
+class GoalsView(StatsView):
+    name = 'goals'
+    compute = Dashboard.compute_goals
+
+    def data(self, value):
+        return {'goals': value}
+
+
+class CrashesView(StatsView):
+    name = 'crashes'
+    compute = Dashboard.compute_crashes
+
+    def data(self, value):
+        return {'crashes': value}
+
+
+class ActiveUsersView(StatsView):
+    name = 'active_users'
+    compute = Dashboard.compute_active_users
+    per_duration = False
@@ -0,0 +1,109 @@
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger("femtolytics")
+
+KEY_PREFIX = 'femtolytics:ratelimit'
+# Seconds between two warnings about the same package being rate limited.
+WARNING_INTERVAL = 60
+
+
+def rate_limits():
+    """Returns the `(rate, burst)` token buckets per `app` and per `visitor`.
+
+    `rate` is the number of events or actions accepted per second on average,
+    `burst` how many can be accepted at once. Scopes that are not configured
+    are not limited.
+    """
+    limits = {}
+    if hasattr(settings, 'FEMTOLYTICS_RATE_LIMITS'):
+        limits = settings.FEMTOLYTICS_RATE_LIMITS or {}
+    return limits
+
+
+def available(key, rate, burst, now):
+    """Returns the number of tokens in the bucket stored under `key` in the cache."""
+    tokens, updated_at = cache.get(key, (burst, now))
+    return min(burst, tokens + max(0.0, now - updated_at) * rate)
+
+
+def store(key, tokens, rate, burst, now):
+    # Past that delay the bucket is full again, it can be evicted.
+    cache.set(key, (tokens, now), math.ceil(burst / rate) + 1)
+
+
+def take(key, cost, rate, burst, now=None):
+    """Takes `cost` tokens from the bucket stored under `key` in the cache.
+
+    Returns False, leaving the bucket untouched, when there are not enough
+    tokens. The read and the write are not atomic, so concurrent requests may
+    go slightly over the limit, which is fine to protect the database.
+    """
+    if now is None:
+        now = time.time()
+    tokens = available(key, rate, burst, now)
+    if tokens < cost:
+        return False
+    store(key, tokens - cost, rate, burst, now)
+    return True
+
+
+def check_rate(body, key, item):
+    """Checks the rate limits of a batch, before doing any database work.
+
+    `item` is the first item of the batch, in the expanded format, used to
+    identify the app and the visitor. Returns None when the batch should be
+    ingested, 429 when it goes over a limit, 413 when it is larger than a
+    burst and would never go through. Every bucket is checked before tokens
+    are taken from any of them.
+    """
+    limits = rate_limits()
+    if not limits:
+        return None
+    cost = len(body[key])
+    package_name = item['package']['name']
+    buckets = []
+    if 'visitor' in limits:
+        buckets.append((f"{KEY_PREFIX}:visitor:{package_name}:{item['visitor_id']}", limits['visitor']))
+    if 'app' in limits:
+        buckets.append((f'{KEY_PREFIX}:app:{package_name}', limits['app']))
+    now = time.time()
+    balances = []
+    for bucket, (rate, burst) in buckets:
+        if cost > burst:
+            record_dropped(package_name, cost)
+            return 413
+        tokens = available(bucket, rate, burst, now)
+        if tokens < cost:
+            record_dropped(package_name, cost)
+            return 429
+        balances.append((bucket, tokens - cost, rate, burst))
+    for bucket, tokens, rate, burst in balances:
+        store(bucket, tokens, rate, burst, now)
+    return None
+
+
+def dropped_key(package_name):
+    return f'{KEY_PREFIX}:dropped:{package_name}'
+
+
+def record_dropped(package_name, count):
+    key = dropped_key(package_name)
+    try:
+        total = cache.incr(key, count)
+    except ValueError:
+        total = count
+        cache.set(key, total, None)
+    # A flood of rejected batches would flood the logs as well, warn once per interval.
+    if cache.add(f'{KEY_PREFIX}:warned:{package_name}', True, WARNING_INTERVAL):
+        logger.warning('Rate limited {}, dropped {} items so far'.format(package_name, total))
+
+
+def dropped(package_names):
+    """Returns the number of events and actions dropped per package name."""
+    counts = cache.get_many([dropped_key(package_name) for package_name in package_names])
+    return {package_name: counts.get(dropped_key(package_name), 0) for package_name in package_names}
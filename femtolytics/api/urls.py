@@ -1,11 +1,23 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework.urlpatterns import format_suffix_patterns
 
-from femtolytics.api import views
+from femtolytics.api import stats, views
+
+event_view = views.EventView
+action_view = views.ActionView
+if hasattr(settings, 'FEMTOLYTICS_LEAN_INGEST') and settings.FEMTOLYTICS_LEAN_INGEST:
+    event_view = views.LeanEventView
+    action_view = views.LeanActionView
 
 app_name = 'femtolytics_api'
 urlpatterns = [
-     path('event', views.EventView.as_view(), name='event'),
-     path('action', views.ActionView.as_view(), name='action'),
+     path('event', event_view.as_view(), name='event'),
+     path('action', action_view.as_view(), name='action'),
+     path('stats/<uuid:app_id>/timeseries', stats.TimeseriesView.as_view(), name='stats_timeseries'),
+     path('stats/<uuid:app_id>/map', stats.MapView.as_view(), name='stats_map'),
+     path('stats/<uuid:app_id>/goals', stats.GoalsView.as_view(), name='stats_goals'),
+     path('stats/<uuid:app_id>/crashes', stats.CrashesView.as_view(), name='stats_crashes'),
+     path('stats/<uuid:app_id>/active-users', stats.ActiveUsersView.as_view(), name='stats_active_users'),
 ]
 urlpatterns = format_suffix_patterns(urlpatterns)
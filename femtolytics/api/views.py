@@ -1,12 +1,23 @@
+import asyncio
+import functools
 import logging
-import json 
+import json
+import threading
 
-from django.http import HttpResponse, Http404
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse, HttpResponseNotAllowed, Http404
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from django.views.generic.base import View
 from django.shortcuts import get_object_or_404
+from femtolytics.api.compression import BodyTooLarge, InvalidEncoding, UnsupportedEncoding, read_body
+from femtolytics.api.throttling import check_rate
 from femtolytics.handler import Handler
 from femtolytics.models import App, Session
-from rest_framework import authentication, permissions, serializers, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework import permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
@@ -28,37 +39,22 @@ class EventView(APIView):
         return False
 
     def post(self, request, format=None):
-        body_unicode = request.body.decode('utf-8')
-        try:
-            body = json.loads(body_unicode)
-        except json.decoder.JSONDecodeError:
-            return HttpResponse(status=400)
-
-        if 'events' not in body:
-            return HttpResponse(status=400)
-        if len(body['events']) == 0:
-            return Response({'status': 'ok'})
-
-        event = body['events'][0]
-        if not Handler.valid_event(event):
-            return HttpResponse(status=400)
+        body, status = parse_body(request)
+        if status is None:
+            status = check_batch(body, 'events', Handler.valid_event)
+        if status is not None:
+            return response_for(status)
+
+        event = next(iter(batch_items(body, 'events')))
         logger.info('{} {}'.format(event['device']
                                 ['name'], event['event']['type']))
         remote_ip, city = get_geo_info(request)
 
         callback=lambda app, visitor, session: self.ignore(app, visitor, session)
 
-        for event in body['events']:
-            activity, result = Handler.on_event(event, remote_ip=remote_ip, city=city, ignore=callback)
-            if activity is None:
-                if result == Handler.INVALID:
-                    return HttpResponse(status=400)
-                elif result == Handler.IGNORE:
-                    return HttpResponse(status=402)
-                else:
-                    raise Http404
-
-        return Response({'status': 'ok'})
+        status = ingest_batch(batch_items(body, 'events'), Handler.on_event, remote_ip, city, callback,
+            header_valid=is_compact(body))
+        return response_for(status)
 
 
 class ActionView(APIView):
@@ -68,38 +64,266 @@ class ActionView(APIView):
         return False
 
     def post(self, request, format=None):
-        body_unicode = request.body.decode('utf-8')
-        try:
-            body = json.loads(body_unicode)
-        except json.decoder.JSONDecodeError:
-            return HttpResponse(status=400)
-
-        if 'actions' not in body:
-            return HttpResponse(status=400)
-        if len(body['actions']) == 0:
-            return Response({'status': 'ok'})
-
-        action = body['actions'][0]
-        if not Handler.valid_action(action):
-            return HttpResponse(status=400)
+        body, status = parse_body(request)
+        if status is None:
+            status = check_batch(body, 'actions', Handler.valid_action)
+        if status is not None:
+            return response_for(status)
 
+        action = next(iter(batch_items(body, 'actions')))
         logger.info('{} {}'.format(
             action['device']['name'], action['action']['type']))
         remote_ip, city = get_geo_info(request)
-        
+
         callback=lambda app, visitor, session: self.ignore(app, visitor, session)
-        
-        for action in body['actions']:
-            activity, result = Handler.on_action(action, remote_ip=remote_ip, city=city, ignore=callback)
-            if activity is None:
-                if result == Handler.INVALID:
-                    return HttpResponse(status=400)
-                elif result == Handler.IGNORE:
-                    return HttpResponse(status=402)
-                else:
-                    raise Http404
 
+        status = ingest_batch(batch_items(body, 'actions'), Handler.on_action, remote_ip, city, callback,
+            header_valid=is_compact(body))
+        return response_for(status)
+
+
+class EventIngestMixin:
+    key = 'events'
+
+    def valid(self, item):
+        return Handler.valid_event(item)
+
+    def handle(self, item, remote_ip=None, city=None, ignore=None, header_valid=False):
+        return Handler.on_event(item, remote_ip=remote_ip, city=city, ignore=ignore, header_valid=header_valid)
+
+
+class ActionIngestMixin:
+    key = 'actions'
+
+    def valid(self, item):
+        return Handler.valid_action(item)
+
+    def handle(self, item, remote_ip=None, city=None, ignore=None, header_valid=False):
+        return Handler.on_action(item, remote_ip=remote_ip, city=city, ignore=ignore, header_valid=header_valid)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class LeanIngestView(View):
+    """Base class for ingest endpoints served by plain Django.
+
+    It skips the DRF machinery (content negotiation, authentication,
+    permission classes and renderers) that `EventView` and `ActionView` go
+    through and answers with prebuilt bodies.
+    """
+    http_method_names = ['post']
+
+    def ignore(self, app, visitor, session):
+        return False
+
+    def post(self, request, format=None):
+        body, status = parse_body(request)
+        if status is None:
+            status = check_batch(body, self.key, self.valid)
+        if status is not None:
+            return plain_response_for(status)
+
+        remote_ip, city = get_geo_info(request)
+
+        callback=lambda app, visitor, session: self.ignore(app, visitor, session)
+
+        status = ingest_batch(batch_items(body, self.key), self.handle, remote_ip, city, callback,
+            header_valid=is_compact(body))
+        return plain_response_for(status)
+
+
+class LeanEventView(EventIngestMixin, LeanIngestView):
+    pass
+
+
+class LeanActionView(ActionIngestMixin, LeanIngestView):
+    pass
+
+
+class AsyncIngestView:
+    """Base class for the ingest endpoints to be served natively under ASGI.
+
+    Django (before 4.1) only runs function views as coroutines, so `as_view`
+    returns an `async def` view. Decoding the body, the rate limits, the GeoIP
+    lookup and the database work run in a bounded thread pool (see
+    `run_in_pool`), so that neither slow clients nor large bodies hold the
+    event loop.
+    """
+
+    def __init__(self, **kwargs):
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        async def view(request, *args, **kwargs):
+            self = cls(**initkwargs)
+            if request.method != 'POST':
+                return HttpResponseNotAllowed(['POST'])
+            return await self.post(request, *args, **kwargs)
+        view.csrf_exempt = True
+        return view
+
+    def ignore(self, app, visitor, session):
+        return False
+
+    async def post(self, request, format=None):
+        body, status = await run_in_pool(parse_batch, request, self.key, self.valid)
+        if status is not None:
+            return plain_response_for(status)
+
+        remote_ip, city = await run_in_pool(get_geo_info, request)
+
+        callback=lambda app, visitor, session: self.ignore(app, visitor, session)
+
+        status = await run_in_pool(ingest_batch, batch_items(body, self.key), self.handle, remote_ip, city, callback,
+            is_compact(body))
+        return plain_response_for(status)
+
+
+class AsyncEventView(EventIngestMixin, AsyncIngestView):
+    pass
+
+
+class AsyncActionView(ActionIngestMixin, AsyncIngestView):
+    pass
+
+
+def parse_body(request):
+    """Returns the decoded JSON body and None, or None and an HTTP status."""
+    try:
+        data = read_body(request)
+    except BodyTooLarge:
+        return None, 413
+    except UnsupportedEncoding:
+        return None, 415
+    except InvalidEncoding:
+        return None, 400
+    try:
+        return json.loads(data.decode('utf-8')), None
+    except (json.decoder.JSONDecodeError, UnicodeDecodeError):
+        return None, 400
+
+
+def parse_batch(request, key, valid):
+    """Returns the decoded body of a batch and None, or None and an HTTP status (see `check_batch`)."""
+    body, status = parse_body(request)
+    if status is None:
+        status = check_batch(body, key, valid)
+    return body, status
+
+
+HEADER_KEYS = ['package', 'device', 'visitor_id']
+
+
+def is_compact(body):
+    """Compact batches (protocol version 2) carry the package, device and
+    visitor once, in a header, followed by the list of entries."""
+    version = body.get('version', 1)
+    return isinstance(version, int) and version >= 2
+
+
+def batch_items(body, key):
+    """Returns the items of a batch in the expanded format expected by Handler."""
+    if not is_compact(body):
+        return body[key]
+    item_key = key[:-1]
+    header = {k: body[k] for k in HEADER_KEYS if k in body}
+    return ({**header, item_key: entry} for entry in body[key])
+
+
+def check_batch(body, key, valid):
+    """Checks the envelope of a batch before doing any work.
+
+    Returns None when the batch should be ingested, an HTTP status otherwise,
+    429 or 413 when it goes over the rate limits (see `check_rate`).
+    """
+    if not isinstance(body, dict):
+        return 400
+    if key not in body or not isinstance(body[key], list):
+        return 400
+    if is_compact(body) and not Handler.valid_header(body):
+        return 400
+    if len(body[key]) == 0:
+        return 200
+    item = next(iter(batch_items(body, key)))
+    if not valid(item):
+        return 400
+    return check_rate(body, key, item)
+
+
+def ingest_batch(items, handle, remote_ip, city, ignore, header_valid=False):
+    """Ingests every item of a batch and returns the resulting HTTP status."""
+    for item in items:
+        activity, result = handle(item, remote_ip=remote_ip, city=city, ignore=ignore, header_valid=header_valid)
+        if result in Handler.ACCEPTED:
+            continue
+        if result == Handler.INVALID:
+            return 400
+        elif result == Handler.IGNORE:
+            return 402
+        else:
+            return 404
+    return 200
+
+
+def response_for(status):
+    if status == 200:
         return Response({'status': 'ok'})
+    elif status == 404:
+        raise Http404
+    return plain_response_for(status)
+
+
+OK_BODY = b'{"status":"ok"}'
+
+
+def plain_response_for(status):
+    if status == 200:
+        return HttpResponse(OK_BODY, content_type='application/json')
+    response = HttpResponse(status=status)
+    if status == 429:
+        response['Retry-After'] = '1'
+    return response
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def async_workers():
+    workers = 8
+    if hasattr(settings, 'FEMTOLYTICS_ASYNC_WORKERS'):
+        workers = settings.FEMTOLYTICS_ASYNC_WORKERS
+    return workers
+
+
+def _run_with_connections(func, *args):
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def run_in_pool(func, *args):
+    """Runs blocking work (database, GeoIP) outside of the event loop.
+
+    Work goes to a dedicated pool of `FEMTOLYTICS_ASYNC_WORKERS` threads, each
+    thread keeping its own database connection, which bounds the number of
+    connections an ASGI process opens. When set to 0, work is delegated to
+    Django's `sync_to_async` instead, outside of its single thread-sensitive
+    thread so that requests are still ingested concurrently.
+    """
+    global _pool
+    workers = async_workers()
+    if not workers:
+        return await sync_to_async(_run_with_connections, thread_sensitive=False)(func, *args)
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='femtolytics')
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool, functools.partial(_run_with_connections, func, *args))
 
 
 def get_client_ip(request):
@@ -0,0 +1,129 @@
+import functools
+import hashlib
+import re
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Fingerprinter:
+    """Computes the signature used to group crashes.
+
+    Stack traces are split into frames, volatile tokens (frame numbers, line
+    and column numbers, addresses, generated names) are stripped from every
+    frame, and the signature is the SHA-1 of the top `frames` frames that
+    belong to the application. This way the same crash reported by two builds,
+    or with a different memory layout, ends up in the same group.
+
+    Another implementation can be used by setting
+    `FEMTOLYTICS_CRASH_FINGERPRINTER` to the dotted path of a class providing
+    `fingerprint(exception, stack_trace)`.
+    """
+    frames = 5
+
+    # (pattern, replacement) applied in order to every frame.
+    RULES = [
+        # Frame index: `#12 `, `12  `
+        (r'^\s*#?\d+\s+', ''),
+        # Java/Kotlin/Swift prefixes
+        (r'^\s*at\s+', ''),
+        # Line and column numbers: `file.dart:12:7`, `File.java:12)`, `line 12`
+        (r':\d+(:\d+)?', ''),
+        (r'\bline \d+', 'line'),
+        # Addresses and offsets: `0x7fff5fbff8c8`, `+ 1234`
+        (r'0x[0-9a-fA-F]+', '0x'),
+        (r'\+\s*\d+', ''),
+        # Generated names: `lambda$onCreate$0`, `$$Lambda$12/0x...`, `<anonymous closure>` numbering
+        (r'\$\$Lambda\$\d+(/\S*)?', '$$Lambda'),
+        (r'\$\d+', '$'),
+        (r'\(\d+\)', ''),
+        (r'\s+', ' '),
+    ]
+
+    # Frames matching one of these patterns are not part of the application.
+    SYSTEM_PATTERNS = [
+        r'<asynchronous suspension>',
+        r'dart:',
+        r'package:flutter/',
+        r'^(java|javax|android|androidx|kotlin|kotlinx|dalvik|com\.android|sun)\.',
+        r'^(libsystem|libdispatch|libobjc|CoreFoundation|Foundation|UIKit|UIKitCore|GraphicsServices)\b',
+    ]
+
+    # Lines that are not frames (e.g. the exception message repeated in the trace).
+    FRAME_PATTERN = r'^\s*(#\d+|at\s|\d+\s+\S+\s+0x)'
+
+    def __init__(self, frames=None, in_app_patterns=None, system_patterns=None):
+        if frames is not None:
+            self.frames = frames
+        if in_app_patterns is None and hasattr(settings, 'FEMTOLYTICS_CRASH_IN_APP_PATTERNS'):
+            in_app_patterns = settings.FEMTOLYTICS_CRASH_IN_APP_PATTERNS
+        if system_patterns is None:
+            system_patterns = self.SYSTEM_PATTERNS
+            if hasattr(settings, 'FEMTOLYTICS_CRASH_SYSTEM_PATTERNS'):
+                system_patterns = system_patterns + list(settings.FEMTOLYTICS_CRASH_SYSTEM_PATTERNS)
+        self.rules = compile_rules(tuple(self.RULES))
+        self.in_app = compile_patterns(tuple(in_app_patterns or ()))
+        self.system = compile_patterns(tuple(system_patterns))
+        self.frame = re.compile(self.FRAME_PATTERN)
+
+    def split(self, stack_trace):
+        lines = [line for line in stack_trace.splitlines() if line.strip() != '']
+        frames = [line for line in lines if self.frame.match(line)]
+        # Unknown trace format, every line is a frame.
+        return frames if len(frames) > 0 else lines
+
+    def normalize(self, frame):
+        for pattern, replacement in self.rules:
+            frame = pattern.sub(replacement, frame)
+        return frame.strip()
+
+    def is_in_app(self, frame):
+        if len(self.in_app) > 0:
+            return any(pattern.search(frame) for pattern in self.in_app)
+        return not any(pattern.search(frame) for pattern in self.system)
+
+    def normalize_exception(self, exception):
+        line = exception.strip().split('\n')[0]
+        # Keep the exception type and the shape of its message.
+        line = re.sub(r'(["\']).*?\1', '""', line)
+        line = re.sub(r'0x[0-9a-fA-F]+', '0x', line)
+        line = re.sub(r'\d+', '0', line)
+        return line
+
+    def significant_frames(self, stack_trace):
+        frames = [self.normalize(frame) for frame in self.split(stack_trace)]
+        frames = [frame for frame in frames if frame != '']
+        in_app = [frame for frame in frames if self.is_in_app(frame)]
+        return (in_app if len(in_app) > 0 else frames)[:self.frames]
+
+    def fingerprint(self, exception, stack_trace=None):
+        parts = []
+        if stack_trace is not None and stack_trace.strip() != '':
+            parts = self.significant_frames(stack_trace)
+        if len(parts) == 0:
+            parts = [self.normalize_exception(exception or '')]
+        return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    @classmethod
+    def get(cls):
+        path = None
+        if hasattr(settings, 'FEMTOLYTICS_CRASH_FINGERPRINTER'):
+            path = settings.FEMTOLYTICS_CRASH_FINGERPRINTER
+        return _fingerprinter(path)
+
+
+@functools.lru_cache(maxsize=None)
+def _fingerprinter(path):
+    if path is None:
+        return Fingerprinter()
+    return import_string(path)()
+
+
+@functools.lru_cache(maxsize=32)
+def compile_rules(rules):
+    return [(re.compile(pattern), replacement) for pattern, replacement in rules]
+
+
+@functools.lru_cache(maxsize=32)
+def compile_patterns(patterns):
+    return [re.compile(pattern) for pattern in patterns]
@@ -0,0 +1,326 @@
+import hashlib
+import logging
+import time
+
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.gis.geoip2 import HAS_GEOIP2
+from django.core.cache import cache
+from django.db.models import Count, Max, OuterRef, Subquery, Sum, UUIDField
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+from femtolytics.models import (
+    ActiveUsers, Activity, Crash, CrashDay, Goal, Occurrence, ReleaseDay, Session, Visitor, VisitorDay, VisitorSummary,
+)
+from femtolytics.rollups import Rollups
+
+logger = logging.getLogger("femtolytics")
+
+MISSING = object()
+
+
+class Dashboard:
+    """Computes the pieces of an app dashboard and caches them.
+
+    Every piece is cached per app and per duration under a key that includes
+    the app watermark, the time of the last ingested activity. `touch` moves the
+    watermark forward so that stale entries are simply never read again and
+    expire on their own. Ingest only moves it once per watermark interval, so
+    a busy app does not recompute its dashboard on every activity.
+    """
+
+    @classmethod
+    def cache_timeout(cls):
+        timeout = 300
+        if hasattr(settings, 'FEMTOLYTICS_DASHBOARD_CACHE_TIMEOUT'):
+            timeout = settings.FEMTOLYTICS_DASHBOARD_CACHE_TIMEOUT
+        return timeout
+
+    @classmethod
+    def watermark_interval(cls):
+        interval = 30
+        if hasattr(settings, 'FEMTOLYTICS_DASHBOARD_WATERMARK_INTERVAL'):
+            interval = settings.FEMTOLYTICS_DASHBOARD_WATERMARK_INTERVAL
+        return interval
+
+    @classmethod
+    def watermark_key(cls, app_id):
+        return f'femtolytics:watermark:{app_id}'
+
+    @classmethod
+    def watermark(cls, app_id):
+        watermark = cache.get(Dashboard.watermark_key(app_id))
+        if watermark is None:
+            # Unknown (e.g. cache was flushed), start a new generation.
+            watermark = Dashboard.touch(app_id, force=True)
+        return watermark
+
+    @classmethod
+    def touch(cls, app_id, force=False):
+        """Moves the watermark of an app to now, unless it moved less than the watermark interval ago.
+
+        Use `force` when the data changed outside of ingest and must show up right away.
+        """
+        key = Dashboard.watermark_key(app_id)
+        watermark = time.time()
+        if not force:
+            current = cache.get(key)
+            if current is not None and watermark - current < Dashboard.watermark_interval():
+                return current
+        cache.set(key, watermark, None)
+        return watermark
+
+    @classmethod
+    def cache_key(cls, app, name, duration):
+        return 'femtolytics:dashboard:{}:{}:{}:{}:{}'.format(
+            app.id, name, duration, timezone.now().date(), Dashboard.watermark(app.id))
+
+    @classmethod
+    def cached_entry(cls, app, name, duration, compute):
+        """Returns a piece of the dashboard and the time it was computed at."""
+        key = Dashboard.cache_key(app, name, duration)
+        entry = cache.get(key, MISSING)
+        if entry is MISSING:
+            logger.debug(f'Dashboard cache miss {key}')
+            entry = (compute(app, duration), time.time())
+            cache.set(key, entry, Dashboard.cache_timeout())
+        return entry
+
+    @classmethod
+    def cached(cls, app, name, duration, compute):
+        return Dashboard.cached_entry(app, name, duration, compute)[0]
+
+    @classmethod
+    def period_start(cls, duration):
+        return timezone.now() - timedelta(days=duration)
+
+    @classmethod
+    def stats(cls, app, duration):
+        return Dashboard.cached(app, 'stats', duration, Dashboard.compute_stats)
+
+    @classmethod
+    def locations(cls, app, duration):
+        return Dashboard.cached(app, 'locations', duration, Dashboard.compute_locations)
+
+    @classmethod
+    def goals(cls, app, duration):
+        return Dashboard.cached(app, 'goals', duration, Dashboard.compute_goals)
+
+    @classmethod
+    def crashes(cls, app, duration):
+        return Dashboard.cached(app, 'crashes', duration, Dashboard.compute_crashes)
+
+    @classmethod
+    def active_users(cls, app):
+        return Dashboard.cached(app, 'active_users', None, Dashboard.compute_active_users)
+
+    @classmethod
+    def overview(cls, apps, duration):
+        """Returns the sessions, visitors, crashes and goals of several apps over the last `duration` days.
+
+        Computed with one grouped query per table for all the apps, and cached
+        until any of their watermarks moves.
+        """
+        apps = list(apps)
+        keys = [Dashboard.watermark_key(app.id) for app in apps]
+        watermarks = cache.get_many(keys)
+        generation = ':'.join('{}={}'.format(
+            app.id, watermarks[key] if key in watermarks else Dashboard.touch(app.id, force=True))
+            for app, key in zip(apps, keys))
+        key = 'femtolytics:overview:{}:{}:{}'.format(
+            hashlib.sha1(generation.encode('utf-8')).hexdigest(), duration, timezone.now().date())
+        value = cache.get(key, MISSING)
+        if value is MISSING:
+            logger.debug(f'Dashboard cache miss {key}')
+            value = Dashboard.compute_overview(apps, duration)
+            cache.set(key, value, Dashboard.cache_timeout())
+        return value
+
+    @classmethod
+    def compute_overview(cls, apps, duration):
+        since = timezone.localdate() - timedelta(days=duration)
+        app_ids = [app.id for app in apps]
+        # SELECT app_id, SUM(sessions), ... FROM releaseday WHERE app_id IN (...) AND day >= ? GROUP BY app_id
+        releases = {row['app_id']: row for row in ReleaseDay.objects.filter(app_id__in=app_ids, day__gte=since).values(
+            'app_id').annotate(sessions=Sum('sessions'), crashed_sessions=Sum('crashed_sessions'), goals=Sum('goals'))}
+        # SELECT app_id, COUNT(DISTINCT visitor_id) FROM visitorday WHERE app_id IN (...) AND day >= ? GROUP BY app_id
+        visitors = dict(VisitorDay.objects.filter(app_id__in=app_ids, day__gte=since).values('app_id').annotate(
+            c=Count('visitor_id', distinct=True)).values_list('app_id', 'c'))
+        # SELECT app_id, SUM(occurrences) FROM crashday WHERE app_id IN (...) AND day >= ? GROUP BY app_id
+        crashes = dict(CrashDay.objects.filter(app_id__in=app_ids, day__gte=since).values('app_id').annotate(
+            c=Sum('occurrences')).values_list('app_id', 'c'))
+
+        overview = []
+        for app in apps:
+            release = releases.get(app.id, {})
+            sessions = release.get('sessions', 0)
+            crashed_sessions = release.get('crashed_sessions', 0)
+            overview.append({
+                'app': app,
+                'sessions': sessions,
+                'visitors': visitors.get(app.id, 0),
+                'crash_free_rate': round(100.0 * (sessions - crashed_sessions) / sessions, 2) if sessions > 0 else None,
+                'crashes': crashes.get(app.id, 0),
+                'goals': release.get('goals', 0),
+            })
+        return overview
+
+    @classmethod
+    def compute_stats(cls, app, duration):
+        period_start = Dashboard.period_start(duration)
+        stats = {}
+        # Create empty entries
+        tzinfo = None
+        for index in range(0, duration):
+            then = period_start + timedelta(days=index)
+            then = timezone.datetime(then.year, then.month, then.day, tzinfo=then.tzinfo)
+            tzinfo = then.tzinfo
+            stats[then] = {
+                'sessions': 0,
+                'visitors': 0,
+            }
+        # SELECT COUNT(*) AS c, DATE(started_at) AS day FROM sessions GROUP BY day
+        sessions = Session.objects.filter(app=app, started_at__gte=period_start).annotate(day=TruncDay(
+            'started_at')).values('day').annotate(c=Count('id')).values('day', 'c')
+        session_count = 0
+        for session in sessions:
+            then = timezone.datetime(session['day'].year, session['day'].month, session['day'].day, tzinfo=tzinfo)
+            stats[then] = {
+                'sessions': session['c'],
+                'visitors': 0,
+            }
+            session_count += session['c']
+        # SELECT COUNT(*) AS c, DATE(registered_at) AS day FROM visitors GROUP BY day
+        visitors = Visitor.objects.filter(app=app, registered_at__gte=period_start).annotate(day=TruncDay(
+            'registered_at')).values('day').annotate(c=Count('id')).values('day', 'c')
+        visitor_count = 0
+        for visitor in visitors:
+            then = timezone.datetime(visitor['day'].year, visitor['day'].month, visitor['day'].day, tzinfo=tzinfo)
+            stats.setdefault(then, {'sessions': 0})['visitors'] = visitor['c']
+            visitor_count += visitor['c']
+        # Organize entries to be easily graphed.
+        entries = []
+        for day in sorted(stats):
+            entries.append({
+                'day': day,
+                'sessions': stats[day]['sessions'],
+                'visitors': stats[day]['visitors'],
+            })
+        return {
+            'stats': entries,
+            'session_count': session_count,
+            'visitor_count': visitor_count,
+        }
+
+    @classmethod
+    def compute_locations(cls, app, duration):
+        """Returns None when geolocation is not available."""
+        if not HAS_GEOIP2:
+            # geoip2 unavailable, ignore silently
+            return None
+
+        period_start = Dashboard.period_start(duration)
+        # Visitors seen over the period, by the country of their latest activity, sampled out ones included.
+        # Names were resolved at ingest.
+        # SELECT COUNT(*) AS c, country_code, MAX(country) FROM visitorsummary WHERE last_seen_at >= ? GROUP BY country_code
+        countries = VisitorSummary.objects.filter(
+            app=app, last_seen_at__gte=period_start, country_code__isnull=False).values(
+            'country_code').annotate(c=Count('visitor_id'), country=Max('country')).values(
+            'country_code', 'country', 'c')
+        locations = []
+        min_sessions = 0
+        max_sessions = None
+        for country in countries:
+            if min_sessions is None or country['c'] < min_sessions:
+                min_sessions = country['c']
+            if max_sessions is None or country['c'] > max_sessions:
+                max_sessions = country['c']
+            locations.append({
+                'country': country['country'] or country['country_code'],
+                'alpha_3': country['country_code'],
+                'count': country['c'],
+            })
+        for location in locations:
+            if max_sessions > min_sessions:
+                r = (location['count'] - min_sessions) / \
+                    (max_sessions - min_sessions)
+                r = round(r, 1)
+                location['fill'] = 'FILL{}'.format(r)
+            else:
+                location['fill'] = 'FILL0.7'
+        return locations
+
+    @classmethod
+    def compute_goals(cls, app, duration):
+        period_start = Dashboard.period_start(duration)
+        return Dashboard.summarize_goals(Goal.objects.filter(app=app, last_at__gte=period_start))
+
+    @classmethod
+    def compute_crashes(cls, app, duration):
+        period_start = Dashboard.period_start(duration)
+        return Dashboard.summarize_crashes(Crash.objects.filter(app=app, last_at__gte=period_start))
+
+    @classmethod
+    def summarize_goals(cls, goals):
+        # SELECT goal.*, COUNT(occurrence.id) FROM goal LEFT JOIN occurrence GROUP BY goal.id
+        goal_map = {}
+        for goal in goals.annotate(count=Count('occurrence')):
+            goal_map[goal.name] = {
+                'id': goal.id,
+                'short_id': goal.short_id,
+                'count': goal.count,
+            }
+        return goal_map
+
+    @classmethod
+    def summarize_crashes(cls, crashes):
+        first = Occurrence.objects.filter(crash=OuterRef('pk')).order_by('occured_at').values('activity_id')[:1]
+        crashes = list(crashes.annotate(count=Count('occurrence'), sample_id=Subquery(first, output_field=UUIDField())))
+        samples = Activity.objects.in_bulk([crash.sample_id for crash in crashes if crash.sample_id is not None])
+        crash_map = {}
+        for crash in crashes:
+            sample = samples.get(crash.sample_id)
+            crash_map[crash.signature] = {
+                'id': crash.id,
+                'short_id': crash.short_id,
+                'count': crash.count,
+                'sample': sample.analyzed_properties if sample is not None else None,
+            }
+        return crash_map
+
+    @classmethod
+    def compute_active_users(cls, app, duration=None):
+        today = Rollups.day(timezone.now())
+
+        # Visitors with at least a number of sessions over the last 30 and 7 days.
+        min_sessions = 5
+        if hasattr(settings, 'FEMTOLYTICS_30DAU_SESSIONS_THRESHOLD'):
+            min_sessions = settings.FEMTOLYTICS_30DAU_SESSIONS_THRESHOLD
+        thirty_dau = Dashboard.engaged_visitors(app, today, 30, min_sessions)
+
+        min_sessions = 2
+        if hasattr(settings, 'FEMTOLYTICS_7DAU_SESSIONS_THRESHOLD'):
+            min_sessions = settings.FEMTOLYTICS_7DAU_SESSIONS_THRESHOLD
+        seven_dau = Dashboard.engaged_visitors(app, today, 7, min_sessions)
+
+        # Distinct visitors over each window ending today, maintained by `Rollups`.
+        counts = dict(ActiveUsers.objects.filter(app=app, day=today).values_list('window', 'visitors'))
+        labels = {1: 'DAU', 7: 'WAU', 30: 'MAU'}
+        active_users = [{
+            'window': window,
+            'label': labels.get(window, f'{window}-day'),
+            'visitors': counts.get(window, 0),
+        } for window in Rollups.windows()]
+
+        return {
+            '30dau': thirty_dau,
+            '7dau': seven_dau,
+            'active_users': active_users,
+        }
+
+    @classmethod
+    def engaged_visitors(cls, app, today, days, min_sessions):
+        since = today - timedelta(days=days - 1)
+        return VisitorDay.objects.filter(app=app, day__gte=since).values('visitor_id').annotate(
+            sessions=Sum('sessions')).filter(sessions__gte=min_sessions).count()
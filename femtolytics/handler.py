@@ -1,19 +1,38 @@
+import functools
 import hashlib
 import json
 import uuid
 
 from dateutil import parser
 from django.conf import settings
-from django.utils import timezone
+from django.db import IntegrityError, transaction
+from django.db.models import F
 from django.utils.timezone import is_aware, make_aware
 
-from femtolytics.models import Activity, Crash, Goal
+from femtolytics.crashes import Fingerprinter
+from femtolytics.dashboard import Dashboard
+from femtolytics.live import Live
+from femtolytics.models import Activity, Crash, Device, Goal, Occurrence, Release, Session
+from femtolytics.rollups import Rollups
+from femtolytics.utils import LRU
 
 class Handler:
     SUCCESS = 0
     APP_NOT_FOUND = 1
     IGNORE = 2
     INVALID = 3
+    DUPLICATE = 4
+    SAMPLED = 5
+    COLLAPSED = 6
+    # Results for which the item is acknowledged to the client.
+    ACCEPTED = (SUCCESS, DUPLICATE, SAMPLED, COLLAPSED)
+
+    EVENT_TYPES = ('VIEW', 'NEW_USER', 'CRASH', 'GOAL', 'DETACHED', 'RESUMED', 'INACTIVE', 'PAUSED')
+    # Events feeding the visitor, crash and goal counters are always recorded.
+    UNSAMPLED_EVENTS = ('NEW_USER', 'CRASH', 'GOAL')
+
+    # (package_name, dedup_key) of committed activities.
+    seen = LRU(maxsize=16384)
 
     @classmethod
     def log_city(cls):
@@ -23,48 +42,151 @@ class Handler:
         return log_city
 
     @classmethod
-    def valid_event(cls, event):
-        if not Handler.valid_event_or_action(event, 'event'):
+    def lifecycle_events(cls):
+        """How lifecycle events are ingested: `record`, `counters` or `boundaries`."""
+        lifecycle_events = 'record'
+        if hasattr(settings, 'FEMTOLYTICS_LIFECYCLE_EVENTS'):
+            lifecycle_events = settings.FEMTOLYTICS_LIFECYCLE_EVENTS
+        return lifecycle_events
+
+    @classmethod
+    def sample_rate(cls, event_or_action, key):
+        """Returns the fraction of visitors for which this type of event or action is recorded."""
+        if not hasattr(settings, 'FEMTOLYTICS_SAMPLING'):
+            return 1.0
+        activity_type = event_or_action[key]['type']
+        if key == 'event' and activity_type in Handler.UNSAMPLED_EVENTS:
+            return 1.0
+        rates = settings.FEMTOLYTICS_SAMPLING.get(event_or_action['package']['name'], {})
+        return float(rates.get(activity_type, 1.0))
+
+    @classmethod
+    def sampled(cls, visitor_id, sample_rate):
+        """Whether the visitor is part of the sample.
+
+        The decision only depends on the visitor id, so a visitor is either
+        kept or dropped for good, and the visitors kept at a given rate are
+        also kept at any higher rate.
+        """
+        if sample_rate >= 1:
+            return True
+        if sample_rate <= 0:
             return False
-        if event['event']['type'] not in ['VIEW', 'NEW_USER', 'CRASH', 'GOAL', 'DETACHED', 'RESUMED', 'INACTIVE', 'PAUSED']:
+        input_form = 'int' if isinstance(visitor_id, int) else 'hex'
+        digest = hashlib.sha1(uuid.UUID(**{input_form: visitor_id}).bytes).digest()
+        return int.from_bytes(digest[:8], 'big') / 2 ** 64 < sample_rate
+
+    @classmethod
+    def deduplicate(cls):
+        deduplicate = False
+        if hasattr(settings, 'FEMTOLYTICS_DEDUPLICATE'):
+            deduplicate = settings.FEMTOLYTICS_DEDUPLICATE
+        return deduplicate
+
+    @classmethod
+    def dedup_key(cls, event_or_action, key):
+        """Returns the key identifying an event or an action across retries.
+
+        It is derived from the client `id` when there is one. Without it, the
+        visitor, type, time and properties are used when
+        `FEMTOLYTICS_DEDUPLICATE` is enabled, nothing is deduplicated otherwise.
+        """
+        item = event_or_action[key]
+        visitor_id = str(event_or_action['visitor_id'])
+        if item.get('id') is not None:
+            parts = [visitor_id, key, str(item['id'])]
+        elif Handler.deduplicate():
+            parts = [visitor_id, key, item['type'], item['time'], item.get('properties')]
+        else:
+            return None
+        return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    @classmethod
+    def create_activity(cls, app, dedup_key, **kwargs):
+        """Creates an activity, returns None if it was already ingested."""
+        if not Rollups.inline():
+            Rollups.start(app)
+        if dedup_key is None:
+            return Activity.objects.create(app=app, **kwargs)
+        seen_key = (app.package_name, dedup_key)
+        try:
+            with transaction.atomic():
+                activity = Activity.objects.create(app=app, dedup_key=dedup_key, **kwargs)
+        except IntegrityError:
+            if not Activity.objects.filter(app=app, dedup_key=dedup_key).exists():
+                raise
+            Handler.seen.put(seen_key, True)
+            return None
+        transaction.on_commit(lambda: Handler.seen.put(seen_key, True))
+        return activity
+
+    @classmethod
+    def country_code(cls, city):
+        if city is None:
+            return None
+        return _country_alpha_3(city.get('country_code'), city.get('country_name'))
+
+    @classmethod
+    def valid_event(cls, event, header_valid=False):
+        if not Handler.valid_event_or_action(event, 'event', header_valid=header_valid):
+            return False
+        if event['event']['type'] not in Handler.EVENT_TYPES:
             return False
         return True
 
     @classmethod
-    def valid_action(cls, action):
-        return Handler.valid_event_or_action(action, 'action')
+    def valid_action(cls, action, header_valid=False):
+        return Handler.valid_event_or_action(action, 'action', header_valid=header_valid)
 
     @classmethod
-    def valid_event_or_action(cls, event_or_action, key):
-        if key not in event_or_action:
+    def valid_event_or_action(cls, event_or_action, key, header_valid=False):
+        """Validates an event or an action.
+
+        `header_valid` skips the checks of the `package`, `device` and
+        `visitor_id` blocks, for batches that share a header validated once.
+        """
+        if not isinstance(event_or_action, dict) or key not in event_or_action:
+            return False
+        if not isinstance(event_or_action[key], dict):
             return False
         if 'type' not in event_or_action[key] or 'time' not in event_or_action[key]:
             return False
         if not isinstance(event_or_action[key]['time'], str):
             return False
-        if 'package' not in event_or_action:
+        if header_valid:
+            return True
+        return Handler.valid_header(event_or_action)
+
+    @classmethod
+    def valid_header(cls, header):
+        if 'package' not in header or not isinstance(header['package'], dict):
             return False
-        if 'name' not in event_or_action['package'] or 'version' not in event_or_action['package'] or 'build' not in event_or_action['package']:
+        if 'name' not in header['package'] or 'version' not in header['package'] or 'build' not in header['package']:
             return False
-        if 'device' not in event_or_action:
+        if 'device' not in header or not isinstance(header['device'], dict):
             return False
-        if 'name' not in event_or_action['device'] or 'os' not in event_or_action['device']:
+        if 'name' not in header['device'] or 'os' not in header['device']:
             return False
-        if 'visitor_id' not in event_or_action:
+        if 'visitor_id' not in header:
             return False
-        input_form = 'int' if isinstance(event_or_action['visitor_id'], int) else 'hex'
+        input_form = 'int' if isinstance(header['visitor_id'], int) else 'hex'
         try:
-            return uuid.UUID(**{input_form: event_or_action['visitor_id']})
-        except (AttributeError, ValueError):
+            return uuid.UUID(**{input_form: header['visitor_id']})
+        except (AttributeError, TypeError, ValueError):
             return False
 
-        return True
-
     @classmethod
-    def on_event(cls, event, remote_ip=None, city=None, ignore=None):
-        if not Handler.valid_event(event):
+    def on_event(cls, event, remote_ip=None, city=None, ignore=None, header_valid=False):
+        if not Handler.valid_event(event, header_valid=header_valid):
             return None, Handler.INVALID
 
+        sample_rate = Handler.sample_rate(event, 'event')
+        recorded = Handler.sampled(event['visitor_id'], sample_rate)
+
+        dedup_key = Handler.dedup_key(event, 'event')
+        if dedup_key is not None and (event['package']['name'], dedup_key) in Handler.seen:
+            return None, Handler.DUPLICATE
+
         properties = None
         if 'properties' in event['event']:
             properties = json.dumps(event['event']['properties'])
@@ -80,38 +202,74 @@ class Handler:
             return None, Handler.APP_NOT_FOUND
         if ignore is not None and ignore(app, visitor, session):
             return None, Handler.IGNORE
-        activity = Activity.objects.create(
+        fields = dict(
             visitor=visitor,
             session=session,
-            app=app,
             category=Activity.EVENT,
             activity_type=event['event']['type'],
             properties=properties,
+            sample_rate=sample_rate,
             occured_at=event['event_time'],
-            device_name=event['device']['name'],
-            device_os=event['device']['os'],
-            package_name=event['package']['name'],
-            package_version=event['package']['version'],
-            package_build=event['package']['build'],
+            device_id=Device.resolve(event['device']['name'], event['device']['os']),
+            release_id=Release.resolve(app, event['package']['version'], event['package']['build']),
             city=city['city'] if city is not None and Handler.log_city() else None,
             region=city['region'] if city is not None and 'region' in city else None,
             country=city['country_name'] if city is not None else None,
+            country_code=Handler.country_code(city),
         )
+        if not recorded:
+            Handler.on_unrecorded(Activity(app=app, **fields))
+            return None, Handler.SAMPLED
+        if event['event']['type'] in Session.LIFECYCLE_EVENTS and Handler.lifecycle_events() != 'record':
+            Handler.on_lifecycle(Activity(app=app, **fields), event['package']['version'], dedup_key)
+            return None, Handler.COLLAPSED
+        activity = Handler.create_activity(app, dedup_key, **fields)
+        if activity is None:
+            return None, Handler.DUPLICATE
         if event['event']['type'] == 'CRASH':
             Handler.on_crash(app, visitor, session, activity)
         elif event['event']['type'] == 'GOAL':
             Handler.on_goal(app, visitor, session, activity)
+        if Rollups.inline():
+            Rollups.on_activity(activity)
+        Live.publish_on_commit(app.id, Live.entry_for_activity(activity, visitor, event['package']['version']))
+        Dashboard.touch(app.id)
         return activity, Handler.SUCCESS
 
+    @classmethod
+    def on_unrecorded(cls, activity):
+        """Accounts for an event or action that is not recorded, passed as an unsaved `Activity`.
+
+        The session boundaries were already moved by `find_app_visitor_session`,
+        the session and the visitor are still counted. The rollup worker only
+        sees recorded activities, so this is rolled up right away.
+        """
+        Rollups.on_activity(activity, recorded=False)
+        Dashboard.touch(activity.app_id)
+
+    @classmethod
+    def on_lifecycle(cls, activity, version, dedup_key):
+        """Collapses a lifecycle event into its session instead of recording an activity.
+
+        With `counters` the event is also counted on the session.
+        """
+        session = activity.session
+        if Handler.lifecycle_events() == 'counters':
+            field = f'{activity.activity_type.lower()}_count'
+            Session.objects.filter(id=session.id).update(**{field: F(field) + 1})
+        Live.publish_on_commit(activity.app_id, Live.entry(
+            session, activity.visitor, Activity.EVENT, activity.activity_type, activity.occured_at, version=version))
+        if dedup_key is not None:
+            # No row to hold the key, retries are only caught while it is remembered.
+            seen_key = (activity.app.package_name, dedup_key)
+            transaction.on_commit(lambda: Handler.seen.put(seen_key, True))
+        Handler.on_unrecorded(activity)
+
     @classmethod
     def on_crash(cls, app, visitor, session, activity):
-        props = activity.properties
-        if isinstance(activity.properties, str):
-            props = json.loads(activity.properties)
-        
-        signature = hashlib.sha1(props['exception'].encode('utf-8')).hexdigest()
-        if 'stack_trace' in props and props['stack_trace'] is not None and props['stack_trace'] != '':
-            signature = hashlib.sha1(props['stack_trace'].encode('utf-8')).hexdigest()
+        props = activity.decoded_properties
+
+        signature = Fingerprinter.get().fingerprint(props['exception'], props.get('stack_trace'))
         crash, created = Crash.objects.get_or_create(
             signature=signature,
             app=app,
@@ -125,16 +283,24 @@ class Handler:
             changed = True
         if changed:
             crash.save()
-        crash.sessions.add(session)
-        crash.activities.add(activity)
+        occurrence = Occurrence(
+            app=app,
+            crash=crash,
+            session=session,
+            activity=activity,
+            visitor=visitor,
+            release_id=activity.release_id,
+            occured_at=activity.occured_at,
+        )
+        if Rollups.inline():
+            Rollups.on_occurrence(occurrence)
+        occurrence.save(force_insert=True)
 
         return crash
     
     @classmethod
     def on_goal(cls, app, visitor, session, activity):
-        props = activity.properties
-        if isinstance(activity.properties, str):
-            props = json.loads(activity.properties)
+        props = activity.decoded_properties
         name = props['goal']
         goal, created = Goal.objects.get_or_create(
             name=name,
@@ -149,17 +315,34 @@ class Handler:
             changed = True
         if changed:
             goal.save()
-        goal.sessions.add(session)
-        goal.activities.add(activity)
+        occurrence = Occurrence(
+            app=app,
+            goal=goal,
+            session=session,
+            activity=activity,
+            visitor=visitor,
+            release_id=activity.release_id,
+            occured_at=activity.occured_at,
+        )
+        if Rollups.inline():
+            Rollups.on_occurrence(occurrence)
+        occurrence.save(force_insert=True)
 
         return goal
 
 
     @classmethod
-    def on_action(cls, action, remote_ip=None, city=None, ignore=None):
-        if not Handler.valid_action(action):
+    def on_action(cls, action, remote_ip=None, city=None, ignore=None, header_valid=False):
+        if not Handler.valid_action(action, header_valid=header_valid):
             return None, Handler.INVALID
 
+        sample_rate = Handler.sample_rate(action, 'action')
+        recorded = Handler.sampled(action['visitor_id'], sample_rate)
+
+        dedup_key = Handler.dedup_key(action, 'action')
+        if dedup_key is not None and (action['package']['name'], dedup_key) in Handler.seen:
+            return None, Handler.DUPLICATE
+
         properties = None
         if 'properties' in action['action']:
             properties = json.dumps(action['action']['properties'])
@@ -175,21 +358,46 @@ class Handler:
             return None, Handler.APP_NOT_FOUND
         if ignore is not None and ignore(app, visitor, session):
             return None, Handler.IGNORE
-        activity = Activity.objects.create(
+        fields = dict(
             visitor=visitor,
             session=session,
-            app=app,
             category=Activity.ACTION,
             activity_type=action['action']['type'],
             properties=properties,
+            sample_rate=sample_rate,
             occured_at=action['event_time'],
-            device_name=action['device']['name'],
-            device_os=action['device']['os'],
-            package_name=action['package']['name'],
-            package_version=action['package']['version'],
-            package_build=action['package']['build'],
+            device_id=Device.resolve(action['device']['name'], action['device']['os']),
+            release_id=Release.resolve(app, action['package']['version'], action['package']['build']),
             city=city['city'] if city is not None and Handler.log_city() else None,
             region=city['region'] if city is not None and 'region' in city else None,
             country=city['country_name'] if city is not None else None,
+            country_code=Handler.country_code(city),
         )
+        if not recorded:
+            Handler.on_unrecorded(Activity(app=app, **fields))
+            return None, Handler.SAMPLED
+        activity = Handler.create_activity(app, dedup_key, **fields)
+        if activity is None:
+            return None, Handler.DUPLICATE
+        if Rollups.inline():
+            Rollups.on_activity(activity)
+        Live.publish_on_commit(app.id, Live.entry_for_activity(activity, visitor, action['package']['version']))
+        Dashboard.touch(app.id)
         return activity, Handler.SUCCESS
+
+
+@functools.lru_cache(maxsize=512)
+def _country_alpha_3(alpha_2, name):
+    try:
+        import pycountry
+    except ImportError:
+        return None
+    country = None
+    try:
+        if alpha_2 is not None:
+            country = pycountry.countries.get(alpha_2=alpha_2)
+        if country is None and name is not None:
+            country = pycountry.countries.get(name=name)
+    except LookupError:
+        return None
+    return country.alpha_3 if country is not None else None
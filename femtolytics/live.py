@@ -0,0 +1,126 @@
+import threading
+import time
+
+from collections import deque
+from django.conf import settings
+from django.db import transaction
+
+
+class Feed:
+    """The most recent entries published for an app, numbered from 1."""
+
+    def __init__(self, size):
+        self.entries = deque(maxlen=size)
+        self.last = 0
+        self.condition = threading.Condition()
+
+
+class Live:
+    """In-process publish/subscribe of the activities ingested per app.
+
+    `Handler` publishes every activity once committed, the live views wait
+    for new entries without touching the database. Only the last
+    `FEMTOLYTICS_LIVE_BUFFER_SIZE` entries of an app are kept. The feed is
+    per process, so the live views only see the activities ingested by the
+    process serving them.
+    """
+    feeds = {}
+    lock = threading.Lock()
+
+    @classmethod
+    def buffer_size(cls):
+        size = 200
+        if hasattr(settings, 'FEMTOLYTICS_LIVE_BUFFER_SIZE'):
+            size = settings.FEMTOLYTICS_LIVE_BUFFER_SIZE
+        return size
+
+    @classmethod
+    def active_seconds(cls):
+        seconds = 300
+        if hasattr(settings, 'FEMTOLYTICS_LIVE_ACTIVE_SECONDS'):
+            seconds = settings.FEMTOLYTICS_LIVE_ACTIVE_SECONDS
+        return seconds
+
+    @classmethod
+    def transport(cls):
+        """`poll` (long polling, the default) or `sse` (server-sent events)."""
+        transport = 'poll'
+        if hasattr(settings, 'FEMTOLYTICS_LIVE_TRANSPORT'):
+            transport = settings.FEMTOLYTICS_LIVE_TRANSPORT
+        return transport
+
+    @classmethod
+    def feed(cls, app_id):
+        with Live.lock:
+            feed = Live.feeds.get(app_id)
+            if feed is None:
+                feed = Feed(Live.buffer_size())
+                Live.feeds[app_id] = feed
+        return feed
+
+    @classmethod
+    def publish(cls, app_id, entry):
+        feed = Live.feed(app_id)
+        with feed.condition:
+            feed.last += 1
+            feed.entries.append(dict(entry, seq=feed.last, received_at=time.time()))
+            feed.condition.notify_all()
+
+    @classmethod
+    def publish_on_commit(cls, app_id, entry):
+        transaction.on_commit(lambda: Live.publish(app_id, entry))
+
+    @classmethod
+    def since(cls, app_id, after=0, timeout=0):
+        """Returns the entries published after `after` and the number of the last one.
+
+        Waits up to `timeout` seconds for one when there is none yet. A number
+        from a previous process, in the future of this feed, starts over.
+        """
+        feed = Live.feed(app_id)
+        with feed.condition:
+            if after > feed.last:
+                after = 0
+            if timeout > 0:
+                feed.condition.wait_for(lambda: feed.last > after, timeout)
+            return [entry for entry in feed.entries if entry['seq'] > after], feed.last
+
+    @classmethod
+    def active_sessions(cls, app_id):
+        """Returns the latest entry of the sessions active recently, most recent first.
+
+        Only the entries still in the buffer are looked at.
+        """
+        since = time.time() - Live.active_seconds()
+        feed = Live.feed(app_id)
+        sessions = {}
+        with feed.condition:
+            for entry in feed.entries:
+                if entry['received_at'] >= since:
+                    sessions[entry['session_id']] = entry
+        return sorted(sessions.values(), key=lambda entry: entry['seq'], reverse=True)
+
+    @classmethod
+    def entry(cls, session, visitor, category, activity_type, occured_at, summary=None, version=None):
+        return {
+            'session_id': str(session.id),
+            'visitor_id': str(visitor.id),
+            'visitor': visitor.name,
+            'category': category,
+            'type': activity_type,
+            'summary': summary,
+            'version': version,
+            'occured_at': occured_at.isoformat(),
+        }
+
+    @classmethod
+    def entry_for_activity(cls, activity, visitor, version):
+        try:
+            summary = activity.analyzed_properties
+        except (KeyError, TypeError, ValueError, AttributeError):
+            summary = None
+        return Live.entry(
+            activity.session, visitor, activity.category, activity.activity_type, activity.occured_at,
+            summary=str(summary) if summary is not None else None,
+            version=version,
+        )
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from femtolytics.crashes import Fingerprinter
+from femtolytics.models import Crash
+from femtolytics.rollups import Rollups
+
+
+class Command(BaseCommand):
+    help = 'Recomputes crash signatures with the configured fingerprinter and merges crashes that now share one.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--app', help='Only regroup the crashes of this application id.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of crashes processed per transaction.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would change without writing anything.')
+
+    def handle(self, *args, **options):
+        fingerprinter = Fingerprinter.get()
+        crashes = Crash.objects.order_by('id')
+        if options['app'] is not None:
+            crashes = crashes.filter(app_id=options['app'])
+
+        seen = renamed = merged = 0
+        last_id = None
+        while True:
+            batch = crashes
+            if last_id is not None:
+                batch = batch.filter(id__gt=last_id)
+            batch = list(batch[:options['batch_size']])
+            if len(batch) == 0:
+                break
+            last_id = batch[-1].id
+            with transaction.atomic():
+                for crash in batch:
+                    seen += 1
+                    result = self.regroup(fingerprinter, crash)
+                    if result == 'renamed':
+                        renamed += 1
+                    elif result == 'merged':
+                        merged += 1
+                if options['dry_run']:
+                    transaction.set_rollback(True)
+
+        self.stdout.write(f'{seen} crashes processed, {renamed} renamed, {merged} merged.')
+
+    def regroup(self, fingerprinter, crash):
+        # Crashes were grouped by signature, one sample is enough to fingerprint the group.
+        sample = crash.activities.first()
+        if sample is None:
+            return None
+        props = sample.decoded_properties
+        signature = fingerprinter.fingerprint(props.get('exception'), props.get('stack_trace'))
+        if signature == crash.signature:
+            return None
+
+        target = Crash.objects.filter(app_id=crash.app_id, signature=signature).exclude(id=crash.id).first()
+        if target is None:
+            crash.signature = signature
+            crash.save(update_fields=['signature'])
+            return 'renamed'
+
+        crash.occurrences.update(crash=target)
+        target.first_at = min(target.first_at, crash.first_at)
+        target.last_at = max(target.last_at, crash.last_at)
+        target.save(update_fields=['first_at', 'last_at'])
+        crash.delete()
+        Rollups.rebuild_occurrences(target)
+        return 'merged'
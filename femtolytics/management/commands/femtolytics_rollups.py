@@ -0,0 +1,98 @@
+import time
+
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from femtolytics.dashboard import Dashboard
+from femtolytics.models import Activity, App, RollupCheckpoint
+from femtolytics.rollups import Rollups
+
+
+class Command(BaseCommand):
+    help = ('Rolls up the activities ingested since the last checkpoint of every app. '
+            'Use with FEMTOLYTICS_ROLLUPS_INLINE = False to take rollups off the ingest path.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of activities rolled up per transaction.')
+        parser.add_argument('--lag', type=float, default=5.0,
+                            help='Only roll up activities created at least this many seconds ago, '
+                                 'so that activities from transactions still in flight are not skipped.')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running, waiting for new activities when caught up.')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to wait when caught up, with --loop.')
+        parser.add_argument('--partitions', type=int, default=1,
+                            help='Number of workers running in parallel, apps are partitioned between them.')
+        parser.add_argument('--partition', type=int, default=0,
+                            help='Partition handled by this worker, between 0 and --partitions - 1.')
+        parser.add_argument('--rebuild-active-users', action='store_true',
+                            help='Recompute the active users of every app and exit. Run it after changing '
+                                 'FEMTOLYTICS_ACTIVE_USERS_WINDOWS.')
+
+    def handle(self, *args, **options):
+        if options['partitions'] < 1 or not 0 <= options['partition'] < options['partitions']:
+            raise CommandError('--partition must be between 0 and --partitions - 1.')
+
+        if options['rebuild_active_users']:
+            rebuilt = 0
+            for app in self.apps(options):
+                Rollups.rebuild_active_users(app.id)
+                Dashboard.touch(app.id, force=True)
+                rebuilt += 1
+            self.stdout.write(f'Active users of {rebuilt} apps rebuilt.')
+            return
+
+        if Rollups.inline():
+            raise CommandError('Activities are already rolled up at ingest, set FEMTOLYTICS_ROLLUPS_INLINE = False.')
+
+        while True:
+            processed = 0
+            for app in self.apps(options):
+                processed += self.roll_up_app(app, options)
+            if options['verbosity'] > 1 or (processed > 0 and not options['loop']):
+                self.stdout.write(f'{processed} activities rolled up.')
+            if not options['loop']:
+                break
+            if processed == 0:
+                time.sleep(options['interval'])
+
+    def apps(self, options):
+        for app in App.objects.order_by('id'):
+            if app.id.int % options['partitions'] == options['partition']:
+                yield app
+
+    def roll_up_app(self, app, options):
+        """Rolls up the pending activities of an app, one batch per transaction, returns how many."""
+        processed = 0
+        while True:
+            count = self.roll_up_batch(app, options)
+            processed += count
+            if count < options['batch_size']:
+                break
+        if processed > 0:
+            Dashboard.touch(app.id, force=True)
+        return processed
+
+    def roll_up_batch(self, app, options):
+        until = timezone.now() - timedelta(seconds=options['lag'])
+        with transaction.atomic():
+            # Created by the first activity ingested without being rolled up.
+            checkpoint = RollupCheckpoint.objects.select_for_update().filter(app=app).first()
+            if checkpoint is None:
+                return 0
+            after = Q(created_at__gt=checkpoint.created_at)
+            if checkpoint.activity_id is not None:
+                after |= Q(created_at=checkpoint.created_at, id__gt=checkpoint.activity_id)
+            activities = list(Activity.objects.filter(after, app=app, created_at__lte=until).select_related(
+                'session').order_by('created_at', 'id')[:options['batch_size']])
+            for activity in activities:
+                Rollups.roll_up(activity)
+            if len(activities) > 0:
+                checkpoint.created_at = activities[-1].created_at
+                checkpoint.activity_id = activities[-1].id
+                checkpoint.save()
+        return len(activities)
@@ -0,0 +1,67 @@
+# Generated by Django 3.1.14 on 2026-10-19 19:00
+
+import random
+
+from django.db import migrations, models
+
+
+ADJECTIVES = [
+    'Adorable', 'Adventurous', 'Agile', 'Amphibious', 'Amused', 'Anxious', 'Articulate', 'Avian',
+    'Beautiful', 'Bitter', 'Carnivorous', 'Cautious', 'Clever', 'Colorful', 'Compassionate',
+    'Confused', 'Content', 'Cuddly', 'Curious', 'Cute', 'Desperate', 'Doubtful', 'Elegant',
+    'Energectic', 'Excited', 'Fancy', 'Fast', 'Feathered', 'Feisty', 'Ferocious', 'Fierce',
+    'Flying', 'Furry', 'Gentle', 'Giant', 'Glamorous', 'Gloomy', 'Graceful', 'Happy',
+    'Heartbroken', 'Helpful', 'Herbivorous', 'Joyed', 'Lonely', 'Lost', 'Loved', 'Loving',
+    'Magnificient', 'Malicious', 'Nervous', 'Nimble', 'Noisy', 'Nosy', 'Omnivorous', 'Picky',
+    'Playful', 'Pleasant', 'Precious', 'Proud', 'Resigned', 'Satisfied', 'Simian', 'Sneaky',
+    'Tiny', 'Uncomfortable', 'Unhappy', 'Unusual', 'Wild', 'Withdrawn',
+]
+ANIMALS = [
+    'Aardvark', 'Albatros', 'Alligator', 'Anteater', 'Antelope', 'Armadillo', 'Aurochs',
+    'Axolotl', 'Badger', 'Bat', 'Beaver', 'Buffalo', 'Camel', 'Capybara', 'Caracal',
+    'Chameleon', 'Cheetah', 'Chinchilla', 'Chipmunk', 'Chupacabra', 'Cormorant', 'Coyote',
+    'Crow', 'Dingo', 'Dinosaur', 'Dolphin', 'Dromedary', 'Duck', 'Eland', 'Elephant', 'Ferret',
+    'Fox', 'Frog', 'Giraffe', 'Gopher', 'Grizzly', 'Hartebeest', 'Hedgehog', 'Hippo', 'Hyena',
+    'Ibex', 'Ifrit', 'Iguana', 'Jackal', 'Jackalope', 'Kangaroo', 'Koala', 'Kraken', 'Lemur',
+    'Leopard', 'Liger', 'Llama', 'Manatee', 'Meerkat', 'Mink', 'Monkey', 'Moose', 'Narwhal',
+    'Orangutan', 'Ostrich', 'Otter', 'Panda', 'Penguin', 'Platypus', 'Pumpkin', 'Python',
+    'Quagga', 'Rabbit', 'Racoon', 'Rhino', 'Seagull', 'Sheep', 'Shrew', 'Skunk', 'Squirrel',
+    'Tiger', 'Turtle', 'Walrus', 'Warthog', 'Wildebeest', 'Wolf', 'Wolverine', 'Wombat', 'Zebra',
+]
+
+
+def legacy_name(id):
+    # Names used to be derived with `random.seed(visitor.id)`, which seeds from hash(uuid).
+    rng = random.Random(hash(id))
+    a = rng.randint(0, len(ADJECTIVES) - 1)
+    b = rng.randint(0, len(ANIMALS) - 1)
+    return '{} {}'.format(ADJECTIVES[a], ANIMALS[b])
+
+
+def backfill_names(apps, schema_editor):
+    Visitor = apps.get_model('femtolytics', 'Visitor')
+    batch = []
+    for visitor in Visitor.objects.filter(name='').only('id').iterator(chunk_size=1000):
+        visitor.name = legacy_name(visitor.id)
+        batch.append(visitor)
+        if len(batch) >= 1000:
+            Visitor.objects.bulk_update(batch, ['name'])
+            batch = []
+    if len(batch) > 0:
+        Visitor.objects.bulk_update(batch, ['name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('femtolytics', '0006_goal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visitor',
+            name='name',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.RunPython(backfill_names, migrations.RunPython.noop),
+    ]
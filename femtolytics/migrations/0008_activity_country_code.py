@@ -0,0 +1,36 @@
+# Generated by Django 3.1.14 on 2026-10-19 19:02
+
+from django.db import migrations, models
+
+
+def backfill_country_codes(apps, schema_editor):
+    try:
+        import pycountry
+    except ImportError:
+        # Geolocation was never enabled, there is nothing to backfill.
+        return
+
+    Activity = apps.get_model('femtolytics', 'Activity')
+    names = Activity.objects.filter(country__isnull=False, country_code__isnull=True).values_list(
+        'country', flat=True).distinct()
+    for name in list(names):
+        country = pycountry.countries.get(name=name)
+        if country is None:
+            continue
+        Activity.objects.filter(country=name, country_code__isnull=True).update(country_code=country.alpha_3)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('femtolytics', '0007_visitor_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activity',
+            name='country_code',
+            field=models.CharField(blank=True, db_index=True, default=None, max_length=3, null=True),
+        ),
+        migrations.RunPython(backfill_country_codes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.1.14 on 2026-10-19 19:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('femtolytics', '0008_activity_country_code'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Device',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('os', models.CharField(max_length=255)),
+            ],
+            options={
+                'unique_together': {('name', 'os')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Release',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.CharField(max_length=255)),
+                ('build', models.CharField(max_length=255)),
+                ('app', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='femtolytics.app')),
+            ],
+            options={
+                'unique_together': {('app', 'version', 'build')},
+            },
+        ),
+        migrations.AddField(
+            model_name='activity',
+            name='device',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='femtolytics.device'),
+        ),
+        migrations.AddField(
+            model_name='activity',
+            name='release',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='femtolytics.release'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+def populate_dimensions(apps, schema_editor):
+    Activity = apps.get_model('femtolytics', 'Activity')
+    Device = apps.get_model('femtolytics', 'Device')
+    Release = apps.get_model('femtolytics', 'Release')
+
+    devices = Activity.objects.values_list('device_name', 'device_os').distinct()
+    for name, os in list(devices):
+        device, _ = Device.objects.get_or_create(name=name, os=os)
+        Activity.objects.filter(device_name=name, device_os=os).update(device=device)
+
+    releases = Activity.objects.values_list('app_id', 'package_version', 'package_build').distinct()
+    for app_id, version, build in list(releases):
+        release, _ = Release.objects.get_or_create(app_id=app_id, version=version, build=build)
+        Activity.objects.filter(app_id=app_id, package_version=version, package_build=build).update(release=release)
+
+
+# Separate from the schema changes: on PostgreSQL, altering activity in the same
+# transaction as these updates fails because of the pending foreign key checks.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('femtolytics', '0009_device_release'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_dimensions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('femtolytics', '0010_device_release_backfill'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='activity',
+            name='device_name',
+        ),
+        migrations.RemoveField(
+            model_name='activity',
+            name='device_os',
+        ),
+        migrations.RemoveField(
+            model_name='activity',
+            name='package_build',
+        ),
+        migrations.RemoveField(
+            model_name='activity',
+            name='package_name',
+        ),
+        migrations.RemoveField(
+            model_name='activity',
+            name='package_version',
+        ),
+        migrations.AlterField(
+            model_name='activity',
+            name='device',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='femtolytics.device'),
+        ),
+        migrations.AlterField(
+            model_name='activity',
+            name='release',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='femtolytics.release'),
+        ),
+    ]
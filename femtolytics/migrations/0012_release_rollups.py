@@ -0,0 +1,77 @@
+# Generated by Django 3.1.14 on 2026-10-19 19:08
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def backfill_release_days(apps, schema_editor):
+    Activity = apps.get_model('femtolytics', 'Activity')
+    Release = apps.get_model('femtolytics', 'Release')
+    ReleaseDay = apps.get_model('femtolytics', 'ReleaseDay')
+    Session = apps.get_model('femtolytics', 'Session')
+
+    first_release = Activity.objects.filter(session=OuterRef('pk')).order_by('occured_at').values('release_id')[:1]
+    Session.objects.filter(release__isnull=True).update(release=Subquery(first_release))
+    Session.objects.filter(activity__category='E', activity__activity_type='CRASH').update(crashed=True)
+
+    days = {}
+
+    def add(rows, field):
+        for row in rows:
+            key = (row['release_id'], row['day'])
+            days.setdefault(key, {})[field] = row['c']
+
+    add(Activity.objects.annotate(day=TruncDate('occured_at')).values('release_id', 'day').annotate(
+        c=Count('id')), 'activities')
+    add(Activity.objects.filter(category='E', activity_type='GOAL').annotate(day=TruncDate('occured_at')).values(
+        'release_id', 'day').annotate(c=Count('id')), 'goals')
+    add(Activity.objects.filter(category='E', activity_type='CRASH').annotate(day=TruncDate('occured_at')).values(
+        'release_id', 'day').annotate(c=Count('session_id', distinct=True)), 'crashed_sessions')
+    add(Session.objects.filter(release__isnull=False).annotate(day=TruncDate('started_at')).values(
+        'release_id', 'day').annotate(c=Count('id')), 'sessions')
+
+    release_apps = dict(Release.objects.values_list('id', 'app_id'))
+    ReleaseDay.objects.bulk_create([
+        ReleaseDay(app_id=release_apps[release_id], release_id=release_id, day=day, **counts)
+        for (release_id, day), counts in days.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('femtolytics', '0011_device_release_not_null'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='crashed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='release',
+            field=models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, to='femtolytics.release'),
+        ),
+        migrations.CreateModel(
+            name='ReleaseDay',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True)),
+                ('sessions', models.PositiveIntegerField(default=0)),
+                ('crashed_sessions', models.PositiveIntegerField(default=0)),
+                ('goals', models.PositiveIntegerField(default=0)),
+                ('activities', models.PositiveIntegerField(default=0)),
+                ('app', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='femtolytics.app')),
+                ('release', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='femtolytics.release')),
+            ],
+            options={
+                'unique_together': {('release', 'day')},
+                'index_together': {('app', 'day')},
+            },
+        ),
+        migrations.RunPython(backfill_release_days, migrations.RunPython.noop),
+    ]
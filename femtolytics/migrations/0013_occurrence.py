@@ -0,0 +1,72 @@
+# Generated by Django 3.1.14 on 2026-10-19 19:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_links(apps, schema_editor):
+    Crash = apps.get_model('femtolytics', 'Crash')
+    Goal = apps.get_model('femtolytics', 'Goal')
+    Occurrence = apps.get_model('femtolytics', 'Occurrence')
+
+    for model, field in ((Crash, 'crash_id'), (Goal, 'goal_id')):
+        links = model.activities.through.objects.select_related('activity').order_by('id')
+        batch = []
+        for link in links.iterator():
+            activity = link.activity
+            batch.append(Occurrence(
+                app_id=activity.app_id,
+                session_id=activity.session_id,
+                activity_id=activity.id,
+                visitor_id=activity.visitor_id,
+                occured_at=activity.occured_at,
+                **{field: getattr(link, field)},
+            ))
+            if len(batch) >= 1000:
+                Occurrence.objects.bulk_create(batch)
+                batch = []
+        Occurrence.objects.bulk_create(batch)
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('femtolytics', '0012_release_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Occurrence',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('occured_at', models.DateTimeField()),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='femtolytics.activity')),
+                ('app', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='femtolytics.app')),
+                ('crash', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='femtolytics.crash')),
+                ('goal', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='femtolytics.goal')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='femtolytics.session')),
+                ('visitor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='femtolytics.visitor')),
+            ],
+            options={
+                'index_together': {('goal', 'occured_at'), ('crash', 'occured_at')},
+            },
+        ),
+        migrations.RunPython(copy_links, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='crash',
+            name='activities',
+        ),
+        migrations.RemoveField(
+            model_name='crash',
+            name='sessions',
+        ),
+        migrations.RemoveField(
+            model_name='goal',
+            name='activities',
+        ),
+        migrations.RemoveField(
+            model_name='goal',
+            name='sessions',
+        ),
+    ]
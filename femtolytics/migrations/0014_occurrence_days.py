@@ -0,0 +1,99 @@
+# Generated by Django 3.1.14 on 2026-10-19 19:14
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def backfill_occurrence_days(apps, schema_editor):
+    Activity = apps.get_model('femtolytics', 'Activity')
+    Crash = apps.get_model('femtolytics', 'Crash')
+    CrashDay = apps.get_model('femtolytics', 'CrashDay')
+    Goal = apps.get_model('femtolytics', 'Goal')
+    GoalDay = apps.get_model('femtolytics', 'GoalDay')
+    Occurrence = apps.get_model('femtolytics', 'Occurrence')
+
+    release = Activity.objects.filter(id=OuterRef('activity_id')).values('release_id')[:1]
+    Occurrence.objects.filter(release__isnull=True).update(release=Subquery(release))
+
+    for model, day_model, field in ((Crash, CrashDay, 'crash_id'), (Goal, GoalDay, 'goal_id')):
+        occurrences = Occurrence.objects.filter(**{field + '__isnull': False})
+        days = {}
+        for row in occurrences.values(field, 'app_id', 'release_id', 'occured_at').iterator():
+            key = (row[field], row['app_id'], row['release_id'], timezone.localdate(row['occured_at']))
+            days.setdefault(key, {'occurrences': 0, 'visitors': 0})['occurrences'] += 1
+        firsts = occurrences.values(field, 'app_id', 'visitor_id', 'release_id').annotate(first_at=Min('occured_at'))
+        for row in firsts.iterator():
+            key = (row[field], row['app_id'], row['release_id'], timezone.localdate(row['first_at']))
+            days[key]['visitors'] += 1
+        day_model.objects.bulk_create([
+            day_model(**{field: group_id}, app_id=app_id, release_id=release_id, day=day, **counts)
+            for (group_id, app_id, release_id, day), counts in days.items()
+        ], batch_size=1000)
+
+        visitors = occurrences.values(field).annotate(c=Count('visitor_id', distinct=True))
+        for row in visitors.iterator():
+            model.objects.filter(id=row[field]).update(visitors=row['c'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('femtolytics', '0013_occurrence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crash',
+            name='visitors',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='visitors',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='occurrence',
+            name='release',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='femtolytics.release'),
+        ),
+        migrations.AlterIndexTogether(
+            name='occurrence',
+            index_together={('crash', 'visitor'), ('crash', 'occured_at'), ('goal', 'visitor'), ('goal', 'occured_at')},
+        ),
+        migrations.CreateModel(
+            name='GoalDay',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('occurrences', models.PositiveIntegerField(default=0)),
+                ('visitors', models.PositiveIntegerField(default=0)),
+                ('app', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='femtolytics.app')),
+                ('goal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='femtolytics.goal')),
+                ('release', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='femtolytics.release')),
+            ],
+            options={
+                'unique_together': {('goal', 'release', 'day')},
+                'index_together': {('goal', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CrashDay',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('occurrences', models.PositiveIntegerField(default=0)),
+                ('visitors', models.PositiveIntegerField(default=0)),
+                ('app', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='femtolytics.app')),
+                ('crash', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='femtolytics.crash')),
+                ('release', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='femtolytics.release')),
+            ],
+            options={
+                'unique_together': {('crash', 'release', 'day')},
+                'index_together': {('crash', 'day')},
+            },
+        ),
+        migrations.RunPython(backfill_occurrence_days, migrations.RunPython.noop),
+    ]
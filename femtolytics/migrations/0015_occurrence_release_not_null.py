@@ -0,0 +1,19 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Separate from the backfill: on PostgreSQL, altering occurrence in the same
+# transaction as the updates fails because of the pending foreign key checks.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('femtolytics', '0014_occurrence_days'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='occurrence',
+            name='release',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='femtolytics.release'),
+        ),
+    ]
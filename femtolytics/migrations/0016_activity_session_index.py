@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-19 19:17
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('femtolytics', '0015_occurrence_release_not_null'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='activity',
+            index_together={('session', 'occured_at')},
+        ),
+    ]
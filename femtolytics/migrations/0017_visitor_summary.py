@@ -0,0 +1,82 @@
+# Generated by Django 3.1.14 on 2026-10-19 19:19
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Q, Subquery
+import django.db.models.deletion
+
+
+def backfill_visitor_summaries(apps, schema_editor):
+    Activity = apps.get_model('femtolytics', 'Activity')
+    Session = apps.get_model('femtolytics', 'Session')
+    Visitor = apps.get_model('femtolytics', 'Visitor')
+    VisitorSummary = apps.get_model('femtolytics', 'VisitorSummary')
+
+    summaries = {}
+
+    def summary(visitor_id, app_id):
+        return summaries.setdefault(visitor_id, VisitorSummary(visitor_id=visitor_id, app_id=app_id))
+
+    for session in Session.objects.only('id', 'visitor_id', 'app_id', 'started_at', 'ended_at').iterator():
+        seconds = max(int((session.ended_at - session.started_at).total_seconds()), 0)
+        Session.objects.filter(id=session.id).update(counted_seconds=seconds)
+        row = summary(session.visitor_id, session.app_id)
+        row.sessions += 1
+        row.seconds += seconds
+
+    counts = Activity.objects.values('visitor_id', 'app_id').annotate(
+        activities=Count('id'),
+        goals=Count('id', filter=Q(category='E', activity_type='GOAL')),
+        crashes=Count('id', filter=Q(category='E', activity_type='CRASH')),
+        last_seen_at=Max('occured_at'))
+    for counted in counts.iterator():
+        row = summary(counted['visitor_id'], counted['app_id'])
+        row.activities = counted['activities']
+        row.goals = counted['goals']
+        row.crashes = counted['crashes']
+        row.last_seen_at = counted['last_seen_at']
+
+    latest = Activity.objects.filter(visitor=OuterRef('pk')).order_by('-occured_at')
+    visitors = Visitor.objects.annotate(
+        device_id=Subquery(latest.values('device_id')[:1]),
+        release_id=Subquery(latest.values('release_id')[:1])).values('id', 'device_id', 'release_id')
+    for visitor in visitors.iterator():
+        if visitor['id'] in summaries:
+            summaries[visitor['id']].device_id = visitor['device_id']
+            summaries[visitor['id']].release_id = visitor['release_id']
+
+    VisitorSummary.objects.bulk_create(summaries.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('femtolytics', '0016_activity_session_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='counted_seconds',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='VisitorSummary',
+            fields=[
+                ('visitor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='femtolytics.visitor')),
+                ('sessions', models.PositiveIntegerField(default=0)),
+                ('seconds', models.PositiveIntegerField(default=0)),
+                ('activities', models.PositiveIntegerField(default=0)),
+                ('goals', models.PositiveIntegerField(default=0)),
+                ('crashes', models.PositiveIntegerField(default=0)),
+                ('last_seen_at', models.DateTimeField(blank=True, default=None, null=True)),
+                ('app', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='femtolytics.app')),
+                ('device', models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, to='femtolytics.device')),
+                ('release', models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, to='femtolytics.release')),
+            ],
+            options={
+                'verbose_name_plural': 'Visitor summaries',
+                'index_together': {('app', 'last_seen_at')},
+            },
+        ),
+        migrations.RunPython(backfill_visitor_summaries, migrations.RunPython.noop),
+    ]
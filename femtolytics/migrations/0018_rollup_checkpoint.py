@@ -0,0 +1,27 @@
+# Generated by Django 3.1.14 on 2026-10-19 19:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('femtolytics', '0017_visitor_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCheckpoint',
+            fields=[
+                ('app', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='femtolytics.app')),
+                ('created_at', models.DateTimeField()),
+                ('activity_id', models.UUIDField(blank=True, default=None, null=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='activity',
+            index_together={('app', 'created_at'), ('session', 'occured_at')},
+        ),
+    ]
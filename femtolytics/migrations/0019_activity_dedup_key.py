@@ -0,0 +1,22 @@
+# Generated by Django 3.1.14 on 2026-10-19 19:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('femtolytics', '0018_rollup_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activity',
+            name='dedup_key',
+            field=models.CharField(blank=True, default=None, max_length=40, null=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='activity',
+            unique_together={('app', 'dedup_key')},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-19 19:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('femtolytics', '0019_activity_dedup_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activity',
+            name='sample_rate',
+            field=models.FloatField(default=1.0),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.1.14 on 2026-10-19 19:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('femtolytics', '0020_activity_sample_rate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='detached_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='inactive_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='paused_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='resumed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
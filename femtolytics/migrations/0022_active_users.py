@@ -0,0 +1,76 @@
+# Generated by Django 3.1.14 on 2026-10-19 19:34
+
+from django.db import migrations, models
+from django.utils import timezone
+from datetime import timedelta
+import django.db.models.deletion
+
+
+def backfill_active_users(apps, schema_editor):
+    ActiveUsers = apps.get_model('femtolytics', 'ActiveUsers')
+    Session = apps.get_model('femtolytics', 'Session')
+    VisitorDay = apps.get_model('femtolytics', 'VisitorDay')
+
+    rows = {}
+    sessions = Session.objects.filter(release__isnull=False).values_list('visitor_id', 'app_id', 'started_at')
+    for visitor_id, app_id, started_at in sessions.iterator():
+        day = timezone.localdate(started_at)
+        row = rows.setdefault((visitor_id, day), VisitorDay(visitor_id=visitor_id, app_id=app_id, day=day))
+        row.sessions += 1
+    VisitorDay.objects.bulk_create(rows.values(), batch_size=1000)
+
+    # Same as `Rollups.rebuild_active_users`, with the default windows.
+    days = {}
+    for row in rows.values():
+        days.setdefault((row.app_id, row.visitor_id), []).append(row.day)
+    counts = {}
+    for (app_id, _), visitor_days in days.items():
+        for window in (1, 7, 30):
+            covered = set()
+            for day in visitor_days:
+                covered.update(day + timedelta(days=offset) for offset in range(window))
+            for day in covered:
+                counts[(app_id, window, day)] = counts.get((app_id, window, day), 0) + 1
+    ActiveUsers.objects.bulk_create([
+        ActiveUsers(app_id=app_id, window=window, day=day, visitors=visitors)
+        for (app_id, window, day), visitors in counts.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('femtolytics', '0021_session_lifecycle_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitorDay',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sessions', models.PositiveIntegerField(default=0)),
+                ('app', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='femtolytics.app')),
+                ('visitor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='femtolytics.visitor')),
+            ],
+            options={
+                'unique_together': {('visitor', 'day')},
+                'index_together': {('app', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ActiveUsers',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.PositiveSmallIntegerField()),
+                ('day', models.DateField()),
+                ('visitors', models.PositiveIntegerField(default=0)),
+                ('app', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='femtolytics.app')),
+            ],
+            options={
+                'verbose_name_plural': 'Active users',
+                'unique_together': {('app', 'window', 'day')},
+            },
+        ),
+        migrations.RunPython(backfill_active_users, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 3.1.14 on 2026-10-19 19:41
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Lower
+
+
+SQLITE_FTS = [
+    # External content table over the visitors, indexed by rowid.
+    "CREATE VIRTUAL TABLE femtolytics_visitor_search USING fts5("
+    "search_name, content='femtolytics_visitor', content_rowid='rowid')",
+    "CREATE TRIGGER femtolytics_visitor_search_insert AFTER INSERT ON femtolytics_visitor BEGIN "
+    "INSERT INTO femtolytics_visitor_search(rowid, search_name) VALUES (new.rowid, new.search_name); END",
+    "CREATE TRIGGER femtolytics_visitor_search_delete AFTER DELETE ON femtolytics_visitor BEGIN "
+    "INSERT INTO femtolytics_visitor_search(femtolytics_visitor_search, rowid, search_name) "
+    "VALUES ('delete', old.rowid, old.search_name); END",
+    "CREATE TRIGGER femtolytics_visitor_search_update AFTER UPDATE OF search_name ON femtolytics_visitor BEGIN "
+    "INSERT INTO femtolytics_visitor_search(femtolytics_visitor_search, rowid, search_name) "
+    "VALUES ('delete', old.rowid, old.search_name); "
+    "INSERT INTO femtolytics_visitor_search(rowid, search_name) VALUES (new.rowid, new.search_name); END",
+    "INSERT INTO femtolytics_visitor_search(femtolytics_visitor_search) VALUES ('rebuild')",
+]
+
+
+def backfill_search(apps, schema_editor):
+    Activity = apps.get_model('femtolytics', 'Activity')
+    Visitor = apps.get_model('femtolytics', 'Visitor')
+    VisitorSummary = apps.get_model('femtolytics', 'VisitorSummary')
+
+    # Generated names are single spaced, lowering them is enough.
+    Visitor.objects.update(search_name=Lower('name'))
+    latest = Activity.objects.filter(visitor=OuterRef('visitor_id')).order_by('-occured_at')
+    VisitorSummary.objects.update(country_code=Subquery(latest.values('country_code')[:1]))
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute('CREATE INDEX femtolytics_visitor_search_name_trgm '
+                              'ON femtolytics_visitor USING gin (search_name gin_trgm_ops)')
+    elif vendor == 'sqlite':
+        for statement in SQLITE_FTS:
+            schema_editor.execute(statement)
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS femtolytics_visitor_search_name_trgm')
+    elif vendor == 'sqlite':
+        for name in ['insert', 'delete', 'update']:
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS femtolytics_visitor_search_{name}')
+        schema_editor.execute('DROP TABLE IF EXISTS femtolytics_visitor_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('femtolytics', '0022_active_users'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visitor',
+            name='search_name',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='visitorsummary',
+            name='country_code',
+            field=models.CharField(blank=True, default=None, max_length=3, null=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='activity',
+            index_together={('session', 'occured_at'), ('app', 'activity_type', 'occured_at'), ('app', 'created_at')},
+        ),
+        migrations.AlterIndexTogether(
+            name='visitorsummary',
+            index_together={('app', 'last_seen_at'), ('app', 'country_code')},
+        ),
+        migrations.RunPython(backfill_search, migrations.RunPython.noop),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
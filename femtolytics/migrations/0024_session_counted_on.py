@@ -0,0 +1,48 @@
+# Generated by Django 3.1.14 on 2026-10-19 21:02
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+
+def backfill_counted_on(apps, schema_editor):
+    """Stores the day counted sessions were counted for and moves their crashes to it."""
+    ReleaseDay = apps.get_model('femtolytics', 'ReleaseDay')
+    Session = apps.get_model('femtolytics', 'Session')
+
+    sessions = Session.objects.filter(release__isnull=False, counted_on__isnull=True)
+    batch = []
+    for session in sessions.only('id', 'started_at').iterator():
+        session.counted_on = timezone.localdate(session.started_at)
+        batch.append(session)
+        if len(batch) >= 1000:
+            Session.objects.bulk_update(batch, ['counted_on'])
+            batch = []
+    Session.objects.bulk_update(batch, ['counted_on'])
+
+    # Crashed sessions used to go to the release and the day of the crash.
+    ReleaseDay.objects.update(crashed_sessions=0)
+    crashed = Session.objects.filter(crashed=True, release__isnull=False).values(
+        'app_id', 'release_id', 'counted_on').annotate(c=Count('id'))
+    for row in crashed.iterator():
+        updated = ReleaseDay.objects.filter(release_id=row['release_id'], day=row['counted_on']).update(
+            crashed_sessions=row['c'])
+        if updated == 0:
+            ReleaseDay.objects.create(app_id=row['app_id'], release_id=row['release_id'], day=row['counted_on'],
+                                      crashed_sessions=row['c'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('femtolytics', '0023_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='counted_on',
+            field=models.DateField(blank=True, default=None, null=True),
+        ),
+        migrations.RunPython(backfill_counted_on, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.1.14 on 2026-10-19 21:40
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_country(apps, schema_editor):
+    Activity = apps.get_model('femtolytics', 'Activity')
+    VisitorSummary = apps.get_model('femtolytics', 'VisitorSummary')
+    country = Activity.objects.filter(
+        visitor_id=OuterRef('visitor_id'), country_code=OuterRef('country_code'), country__isnull=False).order_by(
+        '-occured_at').values('country')[:1]
+    VisitorSummary.objects.filter(country_code__isnull=False).update(country=Subquery(country))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('femtolytics', '0024_session_counted_on'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visitorsummary',
+            name='country',
+            field=models.CharField(blank=True, default=None, max_length=255, null=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='visitorsummary',
+            index_together={('app', 'last_seen_at'), ('app', 'country_code'), ('app', 'country')},
+        ),
+        migrations.RunPython(backfill_country, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-19 21:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('femtolytics', '0025_visitor_summary_country'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='releaseday',
+            name='activities',
+            field=models.FloatField(default=0),
+        ),
+    ]
@@ -1,12 +1,14 @@
+import functools
 import json
 import logging
-import random
 import uuid
 
 from datetime import datetime, timedelta
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
+from django.utils.functional import cached_property
+from femtolytics.utils import LRU
 
 
 User = get_user_model()
@@ -194,17 +196,55 @@ class Visitor(BaseModel):
     app = models.ForeignKey(App, on_delete=models.CASCADE)
     # First session can be used in the list of sessions to tell whether the visitor is a returning or not.
     first_session = models.ForeignKey('Session', related_name='first_visitor', on_delete=models.CASCADE, default=None, null=True, blank=True)
+    # Generated once at creation so that existing visitors keep their name even if the derivation changes.
+    name = models.CharField(max_length=255, blank=True, default='')
+    # Normalized name, indexed for search (trigram on PostgreSQL, FTS5 on SQLite), see `Search`.
+    search_name = models.TextField(blank=True, default='')
 
-    @property
-    def name(self):
-        return Visitor.name_from_id(self.id)
+    def save(self, *args, **kwargs):
+        if not self.name:
+            self.name = Visitor.name_from_id(self.id)
+        self.search_name = Visitor.normalize_name(self.name)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def normalize_name(cls, name):
+        return ' '.join(name.lower().split())
 
     @classmethod
     def name_from_id(cls, id):
-        random.seed(id)
-        a = random.randint(0, len(Visitor.ADJECTIVES) - 1)
-        b = random.randint(0, len(Visitor.ANIMALS) - 1)
-        return '{} {}'.format(Visitor.ADJECTIVES[a], Visitor.ANIMALS[b])
+        if not isinstance(id, uuid.UUID):
+            id = uuid.UUID(str(id))
+        return _name_from_int(id.int)
+
+
+@functools.lru_cache(maxsize=4096)
+def _name_from_int(value):
+    # The low bits and the bits above the UUID version nibble are random in a uuid4.
+    adjective = Visitor.ADJECTIVES[value % len(Visitor.ADJECTIVES)]
+    animal = Visitor.ANIMALS[(value >> 80) % len(Visitor.ANIMALS)]
+    return f'{adjective} {animal}'
+
+
+def duration_str(seconds):
+    periods = [
+        ('year',        60*60*24*365),
+        ('month',       60*60*24*30),
+        ('day',         60*60*24),
+        ('hour',        60*60),
+        ('minute',      60),
+        ('second',      1)
+    ]
+
+    strings = []
+    for period_name, period_seconds in periods:
+        if seconds > period_seconds:
+            period_value, seconds = divmod(seconds, period_seconds)
+            has_s = 's' if period_value > 1 else ''
+            strings.append("%s %s%s" % (period_value, period_name, has_s))
+    if len(strings) == 0:
+        strings.append("0 seconds")
+    return ", ".join(strings)
 
 
 class Session(BaseModel):
@@ -212,37 +252,97 @@ class Session(BaseModel):
     app = models.ForeignKey(App, on_delete=models.CASCADE)
     started_at = models.DateTimeField(default=timezone.now)
     ended_at = models.DateTimeField()
+    # Release and day of the first activity rolled up for this session, also marks the session as counted.
+    release = models.ForeignKey('Release', on_delete=models.SET_NULL, default=None, null=True, blank=True)
+    counted_on = models.DateField(default=None, null=True, blank=True)
+    crashed = models.BooleanField(default=False)
+    # Duration already accounted for in the visitor summary.
+    counted_seconds = models.PositiveIntegerField(default=0)
+    # Lifecycle events collapsed at ingest, see `FEMTOLYTICS_LIFECYCLE_EVENTS`.
+    detached_count = models.PositiveIntegerField(default=0)
+    resumed_count = models.PositiveIntegerField(default=0)
+    inactive_count = models.PositiveIntegerField(default=0)
+    paused_count = models.PositiveIntegerField(default=0)
+
+    LIFECYCLE_EVENTS = ['DETACHED', 'RESUMED', 'INACTIVE', 'PAUSED']
 
     @property
     def duration_str(self):
-        seconds = int(self.duration.total_seconds())
-        periods = [
-            ('year',        60*60*24*365),
-            ('month',       60*60*24*30),
-            ('day',         60*60*24),
-            ('hour',        60*60),
-            ('minute',      60),
-            ('second',      1)
-        ]
-
-        strings = []
-        for period_name, period_seconds in periods:
-            if seconds > period_seconds:
-                period_value, seconds = divmod(seconds, period_seconds)
-                has_s = 's' if period_value > 1 else ''
-                strings.append("%s %s%s" % (period_value, period_name, has_s))
-        if len(strings) == 0:
-            strings.append("0 seconds")
-        return ", ".join(strings)
+        return duration_str(int(self.duration.total_seconds()))
 
     @property
     def duration(self):
         return self.ended_at - self.started_at
 
+    @property
+    def lifecycle_counts(self):
+        """Returns the (type, count) of the lifecycle events collapsed into this session."""
+        counts = []
+        for event_type in Session.LIFECYCLE_EVENTS:
+            count = getattr(self, f'{event_type.lower()}_count')
+            if count > 0:
+                counts.append((event_type, count))
+        return counts
+
     @property
     def sorted_activities(self):
         return self.activity_set.order_by('-occured_at')
 
+    @cached_property
+    def latest_activity(self):
+        return self.activity_set.select_related('app', 'device', 'release').order_by('-occured_at').first()
+
+
+class Device(models.Model):
+    """Dimension table for the device information of activities."""
+    name = models.CharField(max_length=255)
+    os = models.CharField(max_length=255)
+
+    # (name, os) -> id of committed rows only.
+    ids = LRU(maxsize=4096)
+
+    def __str__(self):
+        return f"{self.name} {self.os}"
+
+    @classmethod
+    def resolve(cls, name, os):
+        key = (name, os)
+        id = Device.ids.get(key)
+        if id is None:
+            device, created = Device.objects.get_or_create(name=name, os=os)
+            id = device.id
+            transaction.on_commit(lambda: Device.ids.put(key, id))
+        return id
+
+    class Meta:
+        unique_together = ['name', 'os']
+
+
+class Release(models.Model):
+    """Dimension table for the application version of activities."""
+    app = models.ForeignKey(App, on_delete=models.CASCADE)
+    version = models.CharField(max_length=255)
+    build = models.CharField(max_length=255)
+
+    # (app_id, version, build) -> id of committed rows only.
+    ids = LRU(maxsize=4096)
+
+    def __str__(self):
+        return f"{self.version}.{self.build}"
+
+    @classmethod
+    def resolve(cls, app, version, build):
+        key = (app.id, version, build)
+        id = Release.ids.get(key)
+        if id is None:
+            release, created = Release.objects.get_or_create(app=app, version=version, build=build)
+            id = release.id
+            transaction.on_commit(lambda: Release.ids.put(key, id))
+        return id
+
+    class Meta:
+        unique_together = ['app', 'version', 'build']
+
 
 class Activity(BaseModel):
     EVENT = 'E'
@@ -258,11 +358,8 @@ class Activity(BaseModel):
     activity_type = models.CharField(max_length=255, db_index=True)
     properties = models.TextField(null=True, default=None, blank=True)
     occured_at = models.DateTimeField(db_index=True)
-    device_name = models.CharField(max_length=255, db_index=True)
-    device_os = models.CharField(max_length=255, db_index=True)
-    package_name = models.CharField(max_length=255, db_index=True)
-    package_version = models.CharField(max_length=255, db_index=True)
-    package_build = models.CharField(max_length=255)
+    device = models.ForeignKey(Device, on_delete=models.CASCADE)
+    release = models.ForeignKey(Release, on_delete=models.CASCADE)
 
     city = models.CharField(max_length=255, blank=True,
                             null=True, default=None)
@@ -270,19 +367,49 @@ class Activity(BaseModel):
         max_length=255, blank=True, null=True, default=None)
     country = models.CharField(
         max_length=255, blank=True, null=True, default=None)
+    # ISO 3166-1 alpha-3 code, resolved once at ingest.
+    country_code = models.CharField(
+        max_length=3, blank=True, null=True, default=None, db_index=True)
+    # Hash of the client id or of the content, to acknowledge retried batches.
+    dedup_key = models.CharField(max_length=40, null=True, default=None, blank=True)
+    # Fraction of the visitors for which this type of activity is recorded.
+    sample_rate = models.FloatField(default=1.0)
 
     @property
     def version(self):
-        return f"{self.package_version}.{self.package_build}"
+        return str(self.release)
+
+    @property
+    def device_name(self):
+        return self.device.name
+
+    @property
+    def device_os(self):
+        return self.device.os
+
+    @property
+    def package_name(self):
+        return self.app.package_name
 
     @property
-    def device(self):
-        return f"{self.device_name} {self.device_os}"
+    def package_version(self):
+        return self.release.version
+
+    @property
+    def package_build(self):
+        return self.release.build
 
     @property
     def location(self):
         return f"{self.city} {self.country}" if self.city is not None else ""
 
+    @property
+    def weight(self):
+        """Number of activities this one stands for, once sampled, not rounded so that sums are unbiased."""
+        if self.sample_rate <= 0 or self.sample_rate >= 1:
+            return 1.0
+        return 1.0 / self.sample_rate
+
     @property
     def is_event(self):
         return self.category == Activity.EVENT
@@ -295,16 +422,25 @@ class Activity(BaseModel):
     def analyzed_type(self):
         return self.activity_type
 
+    @cached_property
+    def decoded_properties(self):
+        if isinstance(self.properties, str):
+            return json.loads(self.properties)
+        return self.properties
+
     @property
     def analyzed_properties(self):
-        if self.properties is None:
+        props = self.decoded_properties
+        if props is None:
             return None
-        props = json.loads(self.properties)
         if self.category == Activity.EVENT:
             if self.activity_type == 'VIEW':
                 return props['view']
             elif self.activity_type == 'NEW_USER':
-                return Visitor.name_from_id(uuid.UUID(hex=props['visitor_id']))
+                visitor_id = uuid.UUID(hex=props['visitor_id'])
+                if str(visitor_id) == str(self.visitor_id):
+                    return self.visitor.name
+                return Visitor.name_from_id(visitor_id)
             elif self.activity_type == 'GOAL':
                 return props['goal']
             elif self.activity_type == 'CRASH':
@@ -313,9 +449,9 @@ class Activity(BaseModel):
 
     @property
     def extended_properties(self):
-        if self.properties is None:
+        if self.decoded_properties is None:
             return None
-        props = json.loads(self.properties)
+        props = dict(self.decoded_properties)
         if self.category == Activity.EVENT:
             if self.activity_type == 'CRASH':
                 return props['stack_trace']
@@ -395,15 +531,112 @@ class Activity(BaseModel):
 
     class Meta:
         verbose_name_plural = 'Activity'
+        unique_together = ['app', 'dedup_key']
+        index_together = [
+            ['session', 'occured_at'],
+            ['app', 'created_at'],
+            ['app', 'activity_type', 'occured_at'],
+        ]
+
+
+class ReleaseDay(models.Model):
+    """Daily aggregates per release, maintained incrementally by `Rollups`."""
+    app = models.ForeignKey(App, on_delete=models.CASCADE)
+    release = models.ForeignKey(Release, on_delete=models.CASCADE)
+    day = models.DateField(db_index=True)
+    sessions = models.PositiveIntegerField(default=0)
+    crashed_sessions = models.PositiveIntegerField(default=0)
+    goals = models.PositiveIntegerField(default=0)
+    # Estimated across visitors when sampling, rounded for display only.
+    activities = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ['release', 'day']
+        index_together = ['app', 'day']
+
+
+class VisitorDay(models.Model):
+    """Sessions started per visitor and per day, maintained incrementally by `Rollups`."""
+    app = models.ForeignKey(App, on_delete=models.CASCADE)
+    visitor = models.ForeignKey(Visitor, on_delete=models.CASCADE)
+    day = models.DateField()
+    sessions = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['visitor', 'day']
+        index_together = ['app', 'day']
+
+
+class ActiveUsers(models.Model):
+    """Distinct visitors over the `window` days ending on `day`, maintained incrementally by `Rollups`.
+
+    Rows for the days to come are created as visitors become active, since
+    they remain part of the following windows.
+    """
+    app = models.ForeignKey(App, on_delete=models.CASCADE)
+    window = models.PositiveSmallIntegerField()
+    day = models.DateField()
+    visitors = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'Active users'
+        unique_together = ['app', 'window', 'day']
+
+
+class VisitorSummary(models.Model):
+    """Lifetime aggregates of a visitor, maintained incrementally by `Rollups`."""
+    visitor = models.OneToOneField(Visitor, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    app = models.ForeignKey(App, on_delete=models.CASCADE)
+    sessions = models.PositiveIntegerField(default=0)
+    # Total time spent in sessions
+    seconds = models.PositiveIntegerField(default=0)
+    activities = models.PositiveIntegerField(default=0)
+    goals = models.PositiveIntegerField(default=0)
+    crashes = models.PositiveIntegerField(default=0)
+    # Time, device, release and country of the most recent activity
+    last_seen_at = models.DateTimeField(default=None, null=True, blank=True)
+    device = models.ForeignKey(Device, on_delete=models.SET_NULL, default=None, null=True, blank=True)
+    release = models.ForeignKey(Release, on_delete=models.SET_NULL, default=None, null=True, blank=True)
+    country_code = models.CharField(max_length=3, blank=True, null=True, default=None)
+    # Name of the country as resolved at ingest, for display.
+    country = models.CharField(max_length=255, blank=True, null=True, default=None)
+
+    @property
+    def duration_str(self):
+        return duration_str(self.seconds)
+
+    class Meta:
+        verbose_name_plural = 'Visitor summaries'
+        index_together = [
+            ['app', 'last_seen_at'],
+            ['app', 'country_code'],
+            ['app', 'country'],
+        ]
 
 
 class Crash(BaseModel):
     signature = models.CharField(db_index=True, max_length=128)
     app = models.ForeignKey(App, on_delete=models.CASCADE)
-    sessions = models.ManyToManyField(Session)
-    activities = models.ManyToManyField(Activity)
     first_at = models.DateTimeField(default=timezone.now)
     last_at = models.DateTimeField(default=timezone.now) 
+    # Number of distinct visitors affected, maintained by `Rollups`.
+    visitors = models.PositiveIntegerField(default=0)
+
+    @property
+    def occurrences(self):
+        return Occurrence.objects.filter(crash=self)
+
+    @property
+    def days(self):
+        return CrashDay.objects.filter(crash=self)
+
+    @property
+    def activities(self):
+        return Activity.objects.filter(occurrence__crash=self).order_by('occured_at')
+
+    @property
+    def sessions(self):
+        return Session.objects.filter(occurrence__crash=self).distinct()
 
     class Meta:
         verbose_name_plural = 'Crashes'
@@ -413,12 +646,92 @@ class Crash(BaseModel):
 class Goal(BaseModel):
     name = models.CharField(db_index=True, max_length=1024)
     app = models.ForeignKey(App, on_delete=models.CASCADE)
-    sessions = models.ManyToManyField(Session)
-    activities = models.ManyToManyField(Activity)
     first_at = models.DateTimeField(default=timezone.now)
     last_at = models.DateTimeField(default=timezone.now) 
+    # Number of distinct visitors affected, maintained by `Rollups`.
+    visitors = models.PositiveIntegerField(default=0)
+
+    @property
+    def occurrences(self):
+        return Occurrence.objects.filter(goal=self)
+
+    @property
+    def days(self):
+        return GoalDay.objects.filter(goal=self)
+
+    @property
+    def activities(self):
+        return Activity.objects.filter(occurrence__goal=self).order_by('occured_at')
+
+    @property
+    def sessions(self):
+        return Session.objects.filter(occurrence__goal=self).distinct()
 
     class Meta:
         verbose_name_plural = 'Goals'
         unique_together = ['name', 'app']
 
+
+class Occurrence(models.Model):
+    """Append-only record of an activity belonging to a crash or a goal."""
+    id = models.BigAutoField(primary_key=True)
+    app = models.ForeignKey(App, on_delete=models.CASCADE)
+    crash = models.ForeignKey(Crash, on_delete=models.CASCADE, null=True)
+    goal = models.ForeignKey(Goal, on_delete=models.CASCADE, null=True)
+    session = models.ForeignKey(Session, on_delete=models.CASCADE)
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE)
+    visitor = models.ForeignKey(Visitor, on_delete=models.CASCADE)
+    release = models.ForeignKey(Release, on_delete=models.CASCADE)
+    occured_at = models.DateTimeField()
+
+    class Meta:
+        index_together = [
+            ['crash', 'occured_at'],
+            ['goal', 'occured_at'],
+            ['crash', 'visitor'],
+            ['goal', 'visitor'],
+        ]
+
+
+class CrashDay(models.Model):
+    """Daily occurrences of a crash per release, maintained incrementally by `Rollups`.
+
+    `visitors` counts the visitors affected for the first time by the crash on
+    that release, so that summing it over days gives the affected visitors of a
+    release.
+    """
+    app = models.ForeignKey(App, on_delete=models.CASCADE)
+    crash = models.ForeignKey(Crash, on_delete=models.CASCADE)
+    release = models.ForeignKey(Release, on_delete=models.CASCADE)
+    day = models.DateField()
+    occurrences = models.PositiveIntegerField(default=0)
+    visitors = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['crash', 'release', 'day']
+        index_together = ['crash', 'day']
+
+
+class GoalDay(models.Model):
+    """Daily occurrences of a goal per release, see `CrashDay`."""
+    app = models.ForeignKey(App, on_delete=models.CASCADE)
+    goal = models.ForeignKey(Goal, on_delete=models.CASCADE)
+    release = models.ForeignKey(Release, on_delete=models.CASCADE)
+    day = models.DateField()
+    occurrences = models.PositiveIntegerField(default=0)
+    visitors = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['goal', 'release', 'day']
+        index_together = ['goal', 'day']
+
+
+class RollupCheckpoint(models.Model):
+    """Position of the rollup worker in the activities of an app, on `(created_at, id)`.
+
+    Created at ingest, right before the first activity that is not rolled up inline.
+    """
+    app = models.OneToOneField(App, on_delete=models.CASCADE, primary_key=True)
+    created_at = models.DateTimeField()
+    activity_id = models.UUIDField(default=None, null=True, blank=True)
+    modified_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,333 @@
+import logging
+
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, CharField, DateTimeField, F, IntegerField, Min, Q, Value, When
+from django.utils import timezone
+
+from femtolytics.models import (
+    Activity, ActiveUsers, Crash, CrashDay, Goal, GoalDay, Occurrence, ReleaseDay, RollupCheckpoint, Session, VisitorDay,
+    VisitorSummary,
+)
+
+logger = logging.getLogger("femtolytics")
+
+
+class Rollups:
+    """Maintains the pre-aggregated tables as activities come in.
+
+    Every update is derived from the activity and from flags stored on the
+    session, so that an activity is accounted for the same way no matter
+    when it is rolled up.
+    """
+
+    @classmethod
+    def increment(cls, model, keys, defaults=None, expressions=None, **deltas):
+        """UPDATE ... SET x = x + delta, creating the row if it does not exist yet.
+
+        `expressions` are applied as is when updating, `defaults` when creating.
+        Returns whether the row was created.
+        """
+        updates = {name: F(name) + value for name, value in deltas.items()}
+        updates.update(expressions or {})
+        if model.objects.filter(**keys).update(**updates) > 0:
+            return False
+        try:
+            with transaction.atomic():
+                model.objects.create(**keys, **(defaults or {}), **deltas)
+            return True
+        except IntegrityError:
+            # Created concurrently
+            model.objects.filter(**keys).update(**updates)
+            return False
+
+    @classmethod
+    def inline(cls):
+        """Whether activities are rolled up as they are ingested rather than by the rollup worker."""
+        inline = True
+        if hasattr(settings, 'FEMTOLYTICS_ROLLUPS_INLINE'):
+            inline = settings.FEMTOLYTICS_ROLLUPS_INLINE
+        return inline
+
+    # Apps for which this process already made sure the rollup worker has a checkpoint.
+    started = set()
+
+    @classmethod
+    def start(cls, app):
+        """Makes sure the rollup worker has a checkpoint for `app` before an activity is left to it.
+
+        The first process ingesting with `FEMTOLYTICS_ROLLUPS_INLINE = False`
+        creates it, so the worker starts right after the last activity that
+        was rolled up inline.
+        """
+        if app.id in Rollups.started:
+            return
+        RollupCheckpoint.objects.get_or_create(
+            app=app, defaults={'created_at': timezone.now() - timedelta(microseconds=1)})
+        app_id = app.id
+        transaction.on_commit(lambda: Rollups.started.add(app_id))
+
+    @classmethod
+    def windows(cls):
+        """Number of days of the windows over which active users are counted."""
+        windows = [1, 7, 30]
+        if hasattr(settings, 'FEMTOLYTICS_ACTIVE_USERS_WINDOWS'):
+            windows = settings.FEMTOLYTICS_ACTIVE_USERS_WINDOWS
+        return windows
+
+    @classmethod
+    def roll_up(cls, activity):
+        """Accounts for an activity that was ingested without being rolled up."""
+        Rollups.on_activity(activity)
+        if activity.category == Activity.EVENT and activity.activity_type in ('CRASH', 'GOAL'):
+            for occurrence in Occurrence.objects.filter(activity=activity):
+                Rollups.on_occurrence(occurrence)
+
+    @classmethod
+    def day(cls, when):
+        return timezone.localdate(when)
+
+    @classmethod
+    def on_activity(cls, activity, recorded=True):
+        """Accounts for an activity in the release health and the visitor summary.
+
+        Sampled out or collapsed events and actions are passed unsaved with
+        `recorded` False, they only count toward their session and visitor.
+        """
+        session = activity.session
+        deltas = {}
+        summary = {}
+        if recorded:
+            # Release health is estimated across visitors, the summary of a visitor in the sample is exact.
+            deltas['activities'] = activity.weight
+            summary['activities'] = 1
+
+        day = Rollups.day(activity.occured_at)
+        # Count the session once, for the release and the day of its first activity.
+        if session.release_id is None:
+            if Session.objects.filter(id=session.id, release__isnull=True).update(
+                    release=activity.release_id, counted_on=day) > 0:
+                session.release_id = activity.release_id
+                session.counted_on = day
+                deltas['sessions'] = 1
+                summary['sessions'] = 1
+                if Rollups.increment(VisitorDay, {'visitor_id': activity.visitor_id, 'day': day},
+                                     defaults={'app_id': activity.app_id}, sessions=1):
+                    Rollups.on_visitor_day(activity.app_id, activity.visitor_id, day)
+            else:
+                # Counted concurrently
+                session.release_id, session.counted_on = Session.objects.filter(id=session.id).values_list(
+                    'release_id', 'counted_on').get()
+
+        if activity.category == Activity.EVENT:
+            if activity.activity_type == 'CRASH':
+                summary['crashes'] = 1
+                if not session.crashed:
+                    if Session.objects.filter(id=session.id, crashed=False).update(crashed=True) > 0:
+                        session.crashed = True
+                        Rollups.on_crashed_session(session, activity)
+            elif activity.activity_type == 'GOAL':
+                deltas['goals'] = 1
+                summary['goals'] = 1
+
+        seconds = Rollups.count_seconds(session)
+        if seconds > 0:
+            summary['seconds'] = seconds
+
+        if len(deltas) > 0:
+            Rollups.increment(
+                ReleaseDay,
+                {'release_id': activity.release_id, 'day': day},
+                defaults={'app_id': activity.app_id},
+                **deltas,
+            )
+        Rollups.increment(
+            VisitorSummary,
+            {'visitor_id': activity.visitor_id},
+            defaults={
+                'app_id': activity.app_id,
+                'last_seen_at': activity.occured_at,
+                'device_id': activity.device_id,
+                'release_id': activity.release_id,
+                'country_code': activity.country_code,
+                'country': activity.country,
+            },
+            expressions=Rollups.latest(activity),
+            **summary,
+        )
+
+    @classmethod
+    def on_crashed_session(cls, session, activity):
+        """Accounts for a session that crashed for the first time.
+
+        Crashed sessions go to the release and the day the session was counted
+        for rather than the ones of the crash, so they are never more than the
+        sessions of a release over any range of days.
+        """
+        day = session.counted_on
+        if day is None:
+            # Counted before the day was stored
+            day = Rollups.day(session.started_at)
+        Rollups.increment(
+            ReleaseDay,
+            {'release_id': session.release_id, 'day': day},
+            defaults={'app_id': activity.app_id},
+            crashed_sessions=1,
+        )
+
+    @classmethod
+    def on_visitor_day(cls, app_id, visitor_id, day):
+        """Accounts for a visitor active on a new day in the active users of every window.
+
+        The visitor is part of the windows ending from `day` to `day + window - 1`,
+        except for the ones it was already part of through the closest days it
+        was active on before and after.
+        """
+        windows = Rollups.windows()
+        if len(windows) == 0:
+            return
+        widest = timedelta(days=max(windows))
+        nearby = VisitorDay.objects.filter(
+            visitor_id=visitor_id, day__gt=day - widest, day__lt=day + widest).exclude(day=day)
+        days = list(nearby.values_list('day', flat=True))
+        before = max([other for other in days if other < day], default=None)
+        after = min([other for other in days if other > day], default=None)
+        for window in windows:
+            start = day
+            if before is not None:
+                start = max(start, before + timedelta(days=window))
+            end = day + timedelta(days=window - 1)
+            if after is not None:
+                end = min(end, after - timedelta(days=1))
+            if start <= end:
+                Rollups.increment_active_users(app_id, window, start, end)
+
+    @classmethod
+    def increment_active_users(cls, app_id, window, start, end):
+        rows = ActiveUsers.objects.filter(app_id=app_id, window=window, day__range=(start, end))
+        existing = set(rows.values_list('day', flat=True))
+        if len(existing) > 0:
+            rows.filter(day__in=existing).update(visitors=F('visitors') + 1)
+        day = start
+        while day <= end:
+            if day not in existing:
+                Rollups.increment(ActiveUsers, {'app_id': app_id, 'window': window, 'day': day}, visitors=1)
+            day += timedelta(days=1)
+
+    @classmethod
+    def rebuild_active_users(cls, app_id):
+        """Recomputes the active users of an app from the days its visitors were active on."""
+        days = {}
+        for visitor_id, day in VisitorDay.objects.filter(app_id=app_id).values_list('visitor_id', 'day'):
+            days.setdefault(visitor_id, []).append(day)
+        counts = active_users_counts(days.values(), Rollups.windows())
+        with transaction.atomic():
+            ActiveUsers.objects.filter(app_id=app_id).delete()
+            ActiveUsers.objects.bulk_create([
+                ActiveUsers(app_id=app_id, window=window, day=day, visitors=visitors)
+                for (window, day), visitors in counts.items()
+            ], batch_size=1000)
+
+    @classmethod
+    def count_seconds(cls, session):
+        """Returns the time the session boundaries moved by since they were last accounted for, once."""
+        seconds = max(int((session.ended_at - session.started_at).total_seconds()), 0)
+        if seconds <= session.counted_seconds:
+            return 0
+        if Session.objects.filter(id=session.id, counted_seconds=session.counted_seconds).update(
+                counted_seconds=seconds) == 0:
+            return 0
+        delta = seconds - session.counted_seconds
+        session.counted_seconds = seconds
+        return delta
+
+    @classmethod
+    def latest(cls, activity):
+        """Moves the last seen time, device, release and country forward if the activity is the most recent."""
+        newer = Q(last_seen_at__isnull=True) | Q(last_seen_at__lt=activity.occured_at)
+        return {
+            'last_seen_at': Case(When(newer, then=Value(activity.occured_at)), default=F('last_seen_at'),
+                                 output_field=DateTimeField()),
+            'device_id': Case(When(newer, then=Value(activity.device_id)), default=F('device_id'),
+                              output_field=IntegerField()),
+            'release_id': Case(When(newer, then=Value(activity.release_id)), default=F('release_id'),
+                               output_field=IntegerField()),
+            'country_code': Case(When(newer, then=Value(activity.country_code)), default=F('country_code'),
+                                 output_field=CharField()),
+            'country': Case(When(newer, then=Value(activity.country)), default=F('country'),
+                            output_field=CharField()),
+        }
+
+    @classmethod
+    def occurrence_target(cls, occurrence):
+        if occurrence.crash_id is not None:
+            return Crash, CrashDay, 'crash_id', occurrence.crash_id
+        return Goal, GoalDay, 'goal_id', occurrence.goal_id
+
+    @classmethod
+    def on_occurrence(cls, occurrence):
+        """Accounts for an occurrence of a crash or a goal.
+
+        Called inline before the occurrence is saved, or later by the rollup
+        worker in which case only the occurrences recorded before it count.
+        """
+        model, day_model, field, group_id = Rollups.occurrence_target(occurrence)
+        deltas = {'occurrences': 1}
+
+        # Releases on which this visitor already hit the crash or goal.
+        previous = Occurrence.objects.filter(**{field: group_id}, visitor_id=occurrence.visitor_id)
+        if occurrence.id is not None:
+            previous = previous.filter(id__lt=occurrence.id)
+        releases = set(previous.values_list('release_id', flat=True).distinct())
+        if len(releases) == 0:
+            model.objects.filter(id=group_id).update(visitors=F('visitors') + 1)
+        if occurrence.release_id not in releases:
+            deltas['visitors'] = 1
+
+        Rollups.increment(
+            day_model,
+            {field: group_id, 'release_id': occurrence.release_id, 'day': Rollups.day(occurrence.occured_at)},
+            defaults={'app_id': occurrence.app_id},
+            **deltas,
+        )
+
+    @classmethod
+    def rebuild_occurrences(cls, group):
+        """Recomputes the counters of a crash or a goal from its occurrences."""
+        if isinstance(group, Crash):
+            day_model, field = CrashDay, 'crash_id'
+        else:
+            day_model, field = GoalDay, 'goal_id'
+        occurrences = Occurrence.objects.filter(**{field: group.id})
+
+        days = {}
+        for row in occurrences.values('release_id', 'occured_at'):
+            key = (row['release_id'], Rollups.day(row['occured_at']))
+            days.setdefault(key, {'occurrences': 0, 'visitors': 0})['occurrences'] += 1
+        # A visitor is accounted for on the day it first hit each release.
+        firsts = occurrences.values('visitor_id', 'release_id').annotate(first_at=Min('occured_at'))
+        for row in firsts:
+            days[(row['release_id'], Rollups.day(row['first_at']))]['visitors'] += 1
+
+        with transaction.atomic():
+            day_model.objects.filter(**{field: group.id}).delete()
+            day_model.objects.bulk_create([
+                day_model(app_id=group.app_id, release_id=release_id, day=day, **{field: group.id}, **counts)
+                for (release_id, day), counts in days.items()
+            ])
+            group.visitors = occurrences.values('visitor_id').distinct().count()
+            group.save(update_fields=['visitors'])
+
+
+def active_users_counts(visitor_days, windows):
+    """Returns the number of distinct visitors per (window, day) from the days each visitor was active on."""
+    counts = {}
+    for days in visitor_days:
+        for window in windows:
+            covered = set()
+            for day in days:
+                covered.update(day + timedelta(days=offset) for offset in range(window))
+            for day in covered:
+                counts[(window, day)] = counts.get((window, day), 0) + 1
+    return counts
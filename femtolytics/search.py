@@ -0,0 +1,149 @@
+import uuid
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from femtolytics.models import Activity, Device, Session, Visitor, VisitorSummary
+
+# Maintained by triggers on SQLite, see migration 0023.
+SQLITE_FTS_TABLE = 'femtolytics_visitor_search'
+SQLITE_FTS_TRIGGER = 'femtolytics_visitor_search_insert'
+
+
+class Search:
+    """Finds the visitors and the sessions of an app from what was typed in the search box.
+
+    Each criterion is looked up through an index and capped to `limit` results,
+    so searching does not depend on the size of the app:
+
+    - visitors by id prefix (primary key range), name (trigram index on
+      PostgreSQL, FTS5 on SQLite), device or country of their latest activity;
+    - sessions by id prefix or type of event or action they contain.
+    """
+    fts = {}
+    # Session search reads activities by chunks of `limit` times this.
+    SESSIONS_CHUNK_FACTOR = 4
+    SESSIONS_MAX_CHUNKS = 25
+
+    @classmethod
+    def limit(cls):
+        limit = 100
+        if hasattr(settings, 'FEMTOLYTICS_SEARCH_LIMIT'):
+            limit = settings.FEMTOLYTICS_SEARCH_LIMIT
+        return limit
+
+    @classmethod
+    def id_range(cls, query):
+        """Returns the lowest and highest UUIDs starting with `query`, None if it is not an id prefix."""
+        prefix = query.replace('-', '').lower()
+        if len(prefix) < 4 or len(prefix) > 32:
+            return None
+        try:
+            int(prefix, 16)
+        except ValueError:
+            return None
+        return uuid.UUID(prefix.ljust(32, '0')), uuid.UUID(prefix.ljust(32, 'f'))
+
+    @classmethod
+    def match_countries(cls, summaries, query):
+        """Filters summaries on a country typed as an ISO 3166-1 alpha-3 code, or by name as resolved at ingest."""
+        names = {query, query.title()}
+        if len(query) == 3 and query.isalpha():
+            return summaries.filter(Q(country_code=query.upper()) | Q(country__in=names))
+        return summaries.filter(country__in=names)
+
+    @classmethod
+    def fts_available(cls, connection):
+        # SQLite migrations that remake the visitor table drop its triggers, fall back to a scan then.
+        if connection.vendor != 'sqlite':
+            return False
+        if connection.alias not in Search.fts:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name = %s",
+                               [SQLITE_FTS_TRIGGER])
+                Search.fts[connection.alias] = cursor.fetchone()[0] > 0
+        return Search.fts[connection.alias]
+
+    @classmethod
+    def match_names(cls, visitors, query):
+        name = Visitor.normalize_name(query)
+        if not name:
+            return visitors.none()
+        if Search.fts_available(connections[visitors.db]):
+            # Every word, as a prefix
+            match = ' '.join('"{}"*'.format(word.replace('"', '""')) for word in name.split())
+            return visitors.filter(pk__in=RawSQL(
+                f'SELECT id FROM femtolytics_visitor WHERE rowid IN '
+                f'(SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s)', [match]))
+        # Uses the trigram index on PostgreSQL.
+        return visitors.filter(search_name__contains=name)
+
+    @classmethod
+    def visitors(cls, app, query):
+        query = query.strip()
+        limit = Search.limit()
+        visitors = Visitor.objects.filter(app=app)
+        ids = []
+
+        id_range = Search.id_range(query)
+        if id_range is not None:
+            ids += visitors.filter(pk__range=id_range).order_by('id').values_list('id', flat=True)[:limit]
+
+        ids += Search.match_names(visitors, query).values_list('id', flat=True)[:limit]
+
+        summaries = VisitorSummary.objects.filter(app=app).order_by('-last_seen_at')
+        # Devices are a small dimension table.
+        devices = list(Device.objects.filter(Q(name__icontains=query) | Q(os__icontains=query)).values_list(
+            'id', flat=True))
+        if len(devices) > 0:
+            ids += summaries.filter(device_id__in=devices).values_list('visitor_id', flat=True)[:limit]
+        ids += Search.match_countries(summaries, query).values_list('visitor_id', flat=True)[:limit]
+
+        ids = list(dict.fromkeys(ids))[:limit]
+        return Visitor.objects.filter(id__in=ids).order_by('-registered_at')
+
+    @classmethod
+    def sessions(cls, app, query):
+        query = query.strip()
+        limit = Search.limit()
+        sessions = Session.objects.filter(app=app)
+        ids = []
+
+        id_range = Search.id_range(query)
+        if id_range is not None:
+            ids += sessions.filter(pk__range=id_range).order_by('id').values_list('id', flat=True)[:limit]
+
+        ids += Search.sessions_with_type(app, query, limit)
+
+        ids = list(dict.fromkeys(ids))[:limit]
+        return Session.objects.filter(id__in=ids).order_by('-ended_at')
+
+    @classmethod
+    def sessions_with_type(cls, app, activity_type, limit):
+        """Returns the ids of up to `limit` sessions with an activity of `activity_type`, most recent first.
+
+        Walks the `(app, activity_type, occured_at)` index backwards in chunks
+        until enough distinct sessions are found, and gives up after
+        `SESSIONS_MAX_CHUNKS` chunks, so a type sent thousands of times per
+        session does not read every activity of the app.
+        """
+        activities = Activity.objects.filter(app=app, activity_type=activity_type).order_by('-occured_at', '-id')
+        chunk_size = limit * Search.SESSIONS_CHUNK_FACTOR
+        ids = {}
+        before = None
+        for _ in range(Search.SESSIONS_MAX_CHUNKS):
+            chunk = activities
+            if before is not None:
+                occured_at, id = before
+                chunk = chunk.filter(Q(occured_at__lt=occured_at) | Q(occured_at=occured_at, id__lt=id))
+            rows = list(chunk.values_list('session_id', 'occured_at', 'id')[:chunk_size])
+            for session_id, occured_at, id in rows:
+                ids.setdefault(session_id, None)
+                if len(ids) >= limit:
+                    return list(ids)
+            if len(rows) < chunk_size:
+                break
+            before = rows[-1][1:]
+        return list(ids)
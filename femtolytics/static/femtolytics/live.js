@@ -0,0 +1,77 @@
+// Follows the activities of an app as they are ingested, over server-sent
+// events or long polling depending on FEMTOLYTICS_LIVE_TRANSPORT.
+$(function() {
+    var live = $('#live');
+    if (live.length === 0) {
+        return;
+    }
+    var maxEntries = 100;
+    var last = 0;
+
+    function time(iso) {
+        return new Date(iso).toLocaleTimeString();
+    }
+
+    function label(entry) {
+        var text = entry.category === 'A' ? entry.type : entry.type.toLowerCase();
+        if (entry.summary) {
+            text += ' ' + entry.summary;
+        }
+        return text;
+    }
+
+    function sessionLink(entry) {
+        var url = live.data('session-url').replace('00000000-0000-0000-0000-000000000000', entry.session_id);
+        return $('<a>').attr('href', url).text(entry.visitor);
+    }
+
+    function render(data) {
+        var sessions = live.find('.live-sessions').empty();
+        data.sessions.forEach(function(entry) {
+            sessions.append($('<tr>').append(
+                $('<td>').append(sessionLink(entry)),
+                $('<td>').text(entry.version || ''),
+                $('<td>').text(label(entry)),
+                $('<td class="text-center">').append($('<small>').text(time(entry.occured_at)))
+            ));
+        });
+        live.find('.live-session-count').text(data.sessions.length);
+
+        var entries = live.find('.live-entries');
+        if (data.last < last) {
+            // The server restarted, its numbering too.
+            entries.empty();
+            last = 0;
+        }
+        data.entries.forEach(function(entry) {
+            if (entry.seq <= last) {
+                return;
+            }
+            entries.prepend($('<tr>').append(
+                $('<td>').text(label(entry)),
+                $('<td>').append(sessionLink(entry)),
+                $('<td class="text-center">').append($('<small>').text(time(entry.occured_at)))
+            ));
+        });
+        entries.children().slice(maxEntries).remove();
+        last = data.last;
+    }
+
+    function poll() {
+        $.getJSON(live.data('feed'), {after: last, wait: last > 0 ? 25 : 0}, function(data) {
+            render(data);
+            poll();
+        }).fail(function() {
+            setTimeout(poll, 5000);
+        });
+    }
+
+    if (live.data('transport') === 'sse' && 'EventSource' in window) {
+        var source = new EventSource(live.data('stream'));
+        source.onmessage = function(event) {
+            render(JSON.parse(event.data));
+        };
+    } else {
+        poll();
+    }
+});
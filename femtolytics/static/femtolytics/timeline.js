@@ -0,0 +1,44 @@
+// Loads the activities of sessions page by page as their end scrolls into view.
+$(function() {
+    if (!('IntersectionObserver' in window)) {
+        return;
+    }
+
+    var observer = new IntersectionObserver(function(entries) {
+        entries.forEach(function(entry) {
+            if (entry.isIntersecting) {
+                load($(entry.target));
+            }
+        });
+    });
+
+    function load(more) {
+        var timeline = $('#' + more.data('timeline'));
+        if (more.data('loading')) {
+            return;
+        }
+        more.data('loading', true);
+        var params = {};
+        if (timeline.data('next')) {
+            params.cursor = timeline.data('next');
+        }
+        $.getJSON(timeline.data('url'), params, function(data) {
+            timeline.append(data.html);
+            timeline.data('next', data.next);
+            more.data('loading', false);
+            observer.unobserve(more[0]);
+            if (data.next) {
+                // Observing again fires right away if the end is still visible.
+                observer.observe(more[0]);
+            } else {
+                more.remove();
+            }
+        }).fail(function() {
+            more.data('loading', false);
+        });
+    }
+
+    $('.timeline-more').each(function() {
+        observer.observe(this);
+    });
+});
@@ -1,3 +1,17 @@
 from femtolytics.tests.models import *
 from femtolytics.tests.api.event import *
-from femtolytics.tests.api.action import *
\ No newline at end of file
+from femtolytics.tests.api.action import *
+from femtolytics.tests.dashboard import *
+from femtolytics.tests.handler import *
+from femtolytics.tests.api.asynchronous import *
+from femtolytics.tests.api.lean import *
+from femtolytics.tests.api.compression import *
+from femtolytics.tests.api.throttling import *
+from femtolytics.tests.api.stats import *
+from femtolytics.tests.rollups import *
+from femtolytics.tests.crashes import *
+from femtolytics.tests.timeline import *
+from femtolytics.tests.worker import *
+from femtolytics.tests.live import *
+from femtolytics.tests.search import *
+from femtolytics.tests.views import *
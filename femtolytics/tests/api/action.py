@@ -373,3 +373,37 @@ class ActionApiTestCase(TestCase):
 
         qs = Activity.objects.filter(app=self.app, category=Activity.ACTION)
         self.assertEqual(qs.count(), 2)
+
+    def test_compact_batch(self):
+        message = {
+            'version': 2,
+            'package': {
+                'name': self.package_name,
+                'version': '1.0.0',
+                'build': '99',
+            },
+            'device': {
+                'name': 'iPhone',
+                'os': 'iOS 1.0.0',
+            },
+            'visitor_id': self.visitor_id,
+            'actions': [
+                {
+                    'type': 'Button Clicked',
+                    'time': self.now.isoformat(),
+                },
+                {
+                    'type': 'Registered',
+                    'time': (self.now + timedelta(seconds=20)).isoformat(),
+                    'properties': {
+                        'plan': 'free',
+                    },
+                },
+            ],
+        }
+        response = self.client.post(reverse('femtolytics_api:action'), json.dumps(
+            message), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        qs = Activity.objects.filter(app=self.app, category=Activity.ACTION)
+        self.assertEqual(qs.count(), 2)
@@ -0,0 +1,95 @@
+import json
+import uuid
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from django.utils import timezone
+from femtolytics.api.views import AsyncActionView, AsyncEventView
+from femtolytics.models import App, Activity, Device, Release
+
+User = get_user_model()
+
+
+class AsyncIngestTestMixin:
+    def setUp(self):
+        # Committed ids are cached, while tables are flushed between tests.
+        Device.ids.clear()
+        Release.ids.clear()
+        self.package_name = 'com.femtolytics.test'
+        self.owner = User.objects.create_user(
+            'john',
+            'lennon@thebeatles.com',
+            'johnpassword')
+        self.app = App.objects.create(
+            owner=self.owner,
+            package_name=self.package_name,
+        )
+        self.factory = RequestFactory()
+        self.now = timezone.now()
+        self.visitor_id = str(uuid.uuid4())
+
+    def post(self, view, message):
+        request = self.factory.post('/', json.dumps(message), content_type='application/json')
+        return async_to_sync(view)(request)
+
+    def message(self, key, type, package_name=None):
+        item = {
+            key: {
+                'type': type,
+                'time': self.now.isoformat(),
+            },
+            'device': {
+                'name': 'iPhone',
+                'os': 'iOS 1.0.0',
+            },
+            'package': {
+                'name': package_name or self.package_name,
+                'version': '1.0.0',
+                'build': '99',
+            },
+            'visitor_id': self.visitor_id,
+        }
+        return {key + 's': [item]}
+
+
+# Ingest does not run on the thread of the test, which has to commit its data.
+@override_settings(FEMTOLYTICS_ASYNC_WORKERS=0)
+class AsyncApiTestCase(AsyncIngestTestMixin, TransactionTestCase):
+    def test_invalid_body(self):
+        request = self.factory.post('/', 'not json', content_type='application/json')
+        response = async_to_sync(AsyncEventView.as_view())(request)
+        self.assertEqual(response.status_code, 400)
+
+        response = self.post(AsyncEventView.as_view(), {})
+        self.assertEqual(response.status_code, 400)
+
+    def test_method_not_allowed(self):
+        response = async_to_sync(AsyncEventView.as_view())(self.factory.get('/'))
+        self.assertEqual(response.status_code, 405)
+
+    def test_no_events(self):
+        response = self.post(AsyncEventView.as_view(), {'events': []})
+        self.assertEqual(response.status_code, 200)
+
+    def test_valid_event(self):
+        response = self.post(AsyncEventView.as_view(), self.message('event', 'VIEW'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Activity.objects.filter(app=self.app, category=Activity.EVENT).count(), 1)
+
+    def test_valid_action(self):
+        response = self.post(AsyncActionView.as_view(), self.message('action', 'Button Clicked'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Activity.objects.filter(app=self.app, category=Activity.ACTION).count(), 1)
+
+    def test_non_registered_app(self):
+        response = self.post(AsyncEventView.as_view(), self.message('event', 'VIEW', 'com.example.app'))
+        self.assertEqual(response.status_code, 404)
+
+
+class AsyncPoolApiTestCase(AsyncIngestTestMixin, TransactionTestCase):
+    def test_valid_event(self):
+        with self.settings(FEMTOLYTICS_ASYNC_WORKERS=2):
+            response = self.post(AsyncEventView.as_view(), self.message('event', 'VIEW'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Activity.objects.filter(app=self.app, category=Activity.EVENT).count(), 1)
@@ -0,0 +1,118 @@
+import gzip
+import json
+import unittest
+import uuid
+import zlib
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from femtolytics.models import App, Activity
+
+User = get_user_model()
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class CompressionApiTestCase(TestCase):
+    def setUp(self):
+        self.package_name = 'com.femtolytics.test'
+        self.owner = User.objects.create_user(
+            'john',
+            'lennon@thebeatles.com',
+            'johnpassword')
+        self.app = App.objects.create(
+            owner=self.owner,
+            package_name=self.package_name,
+        )
+        self.client = Client()
+        self.now = timezone.now()
+        self.visitor_id = str(uuid.uuid4())
+
+    def message(self):
+        return json.dumps({
+            'events': [
+                {
+                    'event': {
+                        'type': 'VIEW',
+                        'time': self.now.isoformat(),
+                        'properties': {
+                            'view': 'Landing Page',
+                        },
+                    },
+                    'device': {
+                        'name': 'iPhone',
+                        'os': 'iOS 1.0.0',
+                    },
+                    'package': {
+                        'name': self.package_name,
+                        'version': '1.0.0',
+                        'build': '99',
+                    },
+                    'visitor_id': self.visitor_id,
+                },
+            ],
+        }).encode('utf-8')
+
+    def post(self, data, encoding):
+        return self.client.post(reverse('femtolytics_api:event'), data,
+            content_type='application/json', HTTP_CONTENT_ENCODING=encoding)
+
+    def test_gzip(self):
+        response = self.post(gzip.compress(self.message()), 'gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Activity.objects.filter(app=self.app).count(), 1)
+
+    def test_deflate(self):
+        response = self.post(zlib.compress(self.message()), 'deflate')
+        self.assertEqual(response.status_code, 200)
+
+        # Raw deflate, without the zlib wrapper
+        compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        data = compressor.compress(self.message()) + compressor.flush()
+        response = self.post(data, 'deflate')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Activity.objects.filter(app=self.app).count(), 2)
+
+    @unittest.skipIf(zstandard is None, 'zstandard is not installed')
+    def test_zstd(self):
+        response = self.post(zstandard.ZstdCompressor().compress(self.message()), 'zstd')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Activity.objects.filter(app=self.app).count(), 1)
+
+    def test_identity(self):
+        response = self.post(self.message(), 'identity')
+        self.assertEqual(response.status_code, 200)
+
+    def test_large_identity(self):
+        # Bigger than Django's DATA_UPLOAD_MAX_MEMORY_SIZE, smaller than FEMTOLYTICS_MAX_BODY_SIZE
+        data = self.message() + b' ' * (3 * 1024 * 1024)
+        response = self.post(data, 'identity')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Activity.objects.filter(app=self.app).count(), 1)
+
+    @override_settings(FEMTOLYTICS_MAX_BODY_SIZE=64 * 1024)
+    def test_identity_too_large(self):
+        response = self.post(self.message() + b' ' * (64 * 1024), 'identity')
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(Activity.objects.filter(app=self.app).count(), 0)
+
+    def test_invalid_data(self):
+        response = self.post(b'definitely not gzip', 'gzip')
+        self.assertEqual(response.status_code, 400)
+
+    def test_unsupported_encoding(self):
+        response = self.post(self.message(), 'br')
+        self.assertEqual(response.status_code, 415)
+
+    @override_settings(FEMTOLYTICS_MAX_BODY_SIZE=64 * 1024)
+    def test_decompression_bomb(self):
+        data = gzip.compress(b' ' * (10 * 1024 * 1024))
+        self.assertLess(len(data), 64 * 1024)
+        response = self.post(data, 'gzip')
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(Activity.objects.filter(app=self.app).count(), 0)
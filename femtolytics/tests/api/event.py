@@ -479,3 +479,116 @@ class EventApiTestCase(TestCase):
         self.assertEqual(crash.activities.count(), 2)
         self.assertEqual(crash.first_at, self.now)
         self.assertEqual(crash.last_at, then)
+
+    def test_compact_batch(self):
+        message = {
+            'version': 2,
+            'package': {
+                'name': self.package_name,
+                'version': '1.0.0',
+                'build': '99',
+            },
+            'device': {
+                'name': 'iPhone',
+                'os': 'iOS 1.0.0',
+            },
+            'visitor_id': self.visitor_id,
+            'events': [
+                {
+                    'type': 'VIEW',
+                    'time': self.now.isoformat(),
+                    'properties': {
+                        'view': 'Landing Page',
+                    },
+                },
+                {
+                    'type': 'PAUSED',
+                    'time': (self.now + timedelta(seconds=20)).isoformat(),
+                },
+            ],
+        }
+        response = self.client.post(reverse('femtolytics_api:event'), json.dumps(
+            message), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        qs = Activity.objects.filter(app=self.app, category=Activity.EVENT).order_by('occured_at')
+        self.assertEqual(qs.count(), 2)
+        self.assertEqual(str(qs[0].visitor_id), self.visitor_id)
+        self.assertEqual(qs[0].activity_type, 'VIEW')
+        self.assertEqual(qs[1].activity_type, 'PAUSED')
+        self.assertEqual(qs[1].device_name, 'iPhone')
+        self.assertEqual(qs[1].package_build, '99')
+
+    def test_retried_batch(self):
+        message = {
+            'version': 2,
+            'package': {
+                'name': self.package_name,
+                'version': '1.0.0',
+                'build': '99',
+            },
+            'device': {
+                'name': 'iPhone',
+                'os': 'iOS 1.0.0',
+            },
+            'visitor_id': self.visitor_id,
+            'events': [
+                {
+                    'id': 'a1',
+                    'type': 'CRASH',
+                    'time': self.now.isoformat(),
+                    'properties': {
+                        'exception': 'Divide by zero',
+                        'stack_trace': 'main.dart:12',
+                    },
+                },
+                {
+                    'id': 'a2',
+                    'type': 'PAUSED',
+                    'time': (self.now + timedelta(seconds=20)).isoformat(),
+                },
+            ],
+        }
+        for _ in range(2):
+            response = self.client.post(reverse('femtolytics_api:event'), json.dumps(
+                message), content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(Activity.objects.filter(app=self.app).count(), 2)
+        self.assertEqual(Crash.objects.get(app=self.app).occurrences.count(), 1)
+
+    def test_compact_batch_invalid(self):
+        message = {
+            'version': 2,
+            'package': {
+                'name': self.package_name,
+            },
+            'device': {
+                'name': 'iPhone',
+                'os': 'iOS 1.0.0',
+            },
+            'visitor_id': self.visitor_id,
+            'events': [],
+        }
+        response = self.client.post(reverse('femtolytics_api:event'), json.dumps(
+            message), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        message['package'] = {
+            'name': self.package_name,
+            'version': '1.0.0',
+            'build': '99',
+        }
+        message['events'] = [
+            {
+                'type': 'VIEW',
+                'time': self.now.isoformat(),
+            },
+            {
+                'type': 'ABC',
+                'time': self.now.isoformat(),
+            },
+        ]
+        response = self.client.post(reverse('femtolytics_api:event'), json.dumps(
+            message), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,72 @@
+import json
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+from femtolytics.api.views import LeanActionView, LeanEventView
+from femtolytics.models import App, Activity
+
+User = get_user_model()
+
+
+class LeanApiTestCase(TestCase):
+    def setUp(self):
+        self.package_name = 'com.femtolytics.test'
+        self.owner = User.objects.create_user(
+            'john',
+            'lennon@thebeatles.com',
+            'johnpassword')
+        self.app = App.objects.create(
+            owner=self.owner,
+            package_name=self.package_name,
+        )
+        self.factory = RequestFactory()
+        self.now = timezone.now()
+        self.visitor_id = str(uuid.uuid4())
+
+    def post(self, view, message):
+        request = self.factory.post('/', json.dumps(message), content_type='application/json')
+        return view(request)
+
+    def message(self, key, type, package_name=None):
+        item = {
+            key: {
+                'type': type,
+                'time': self.now.isoformat(),
+            },
+            'device': {
+                'name': 'iPhone',
+                'os': 'iOS 1.0.0',
+            },
+            'package': {
+                'name': package_name or self.package_name,
+                'version': '1.0.0',
+                'build': '99',
+            },
+            'visitor_id': self.visitor_id,
+        }
+        return {key + 's': [item]}
+
+    def test_invalid_body(self):
+        response = self.post(LeanEventView.as_view(), {})
+        self.assertEqual(response.status_code, 400)
+
+    def test_method_not_allowed(self):
+        response = LeanEventView.as_view()(self.factory.get('/'))
+        self.assertEqual(response.status_code, 405)
+
+    def test_valid_event(self):
+        response = self.post(LeanEventView.as_view(), self.message('event', 'VIEW'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {'status': 'ok'})
+        self.assertEqual(Activity.objects.filter(app=self.app, category=Activity.EVENT).count(), 1)
+
+    def test_valid_action(self):
+        response = self.post(LeanActionView.as_view(), self.message('action', 'Button Clicked'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Activity.objects.filter(app=self.app, category=Activity.ACTION).count(), 1)
+
+    def test_non_registered_app(self):
+        response = self.post(LeanEventView.as_view(), self.message('event', 'VIEW', 'com.example.app'))
+        self.assertEqual(response.status_code, 404)
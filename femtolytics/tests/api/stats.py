@@ -0,0 +1,128 @@
+import math
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.http import http_date
+from django.utils import timezone
+from femtolytics.dashboard import Dashboard
+from femtolytics.handler import Handler
+from femtolytics.models import App
+from rest_framework.test import APIClient, APITestCase
+
+User = get_user_model()
+
+
+class StatsApiTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.package_name = 'com.femtolytics.test'
+        self.owner = User.objects.create_user(
+            'john',
+            'lennon@thebeatles.com',
+            'johnpassword')
+        self.app = App.objects.create(
+            owner=self.owner,
+            package_name=self.package_name,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.now = timezone.now()
+        self.visitor_id = str(uuid.uuid4())
+
+    def ingest(self, type, properties):
+        activity, result = Handler.on_event({
+            'event': {
+                'type': type,
+                'time': self.now.isoformat(),
+                'properties': properties,
+            },
+            'device': {
+                'name': 'iPhone',
+                'os': 'iOS 1.0.0',
+            },
+            'package': {
+                'name': self.package_name,
+                'version': '1.0.0',
+                'build': '99',
+            },
+            'visitor_id': self.visitor_id,
+        })
+        self.assertEqual(result, Handler.SUCCESS)
+
+    def url(self, name):
+        return reverse(f'femtolytics_api:stats_{name}', args=[self.app.id])
+
+    def test_endpoints(self):
+        self.ingest('GOAL', {'goal': 'Subscribed'})
+        self.ingest('CRASH', {'exception': 'Divide by zero'})
+
+        response = self.client.get(self.url('timeseries'), {'duration': 7})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['session_count'], 1)
+
+        response = self.client.get(self.url('goals'))
+        self.assertEqual(response.json()['goals']['Subscribed']['count'], 1)
+        response = self.client.get(self.url('crashes'))
+        self.assertEqual(list(response.json()['crashes'].values())[0]['sample'], 'Divide by zero')
+        response = self.client.get(self.url('map'))
+        self.assertIn('locations', response.json())
+        response = self.client.get(self.url('active_users'))
+        self.assertEqual(response.json()['30dau'], 0)
+        self.assertEqual([window['visitors'] for window in response.json()['active_users']], [1, 1, 1])
+
+        response = self.client.get(self.url('goals'), {'duration': 'week'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_conditional_get(self):
+        response = self.client.get(self.url('goals'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url('goals'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(self.url('goals'), HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        # Each piece and duration has its own tag
+        self.assertNotEqual(self.client.get(self.url('crashes'))['ETag'], etag)
+        self.assertNotEqual(self.client.get(self.url('goals'), {'duration': 7})['ETag'], etag)
+
+        # Ingesting moves the watermark
+        with self.settings(FEMTOLYTICS_DASHBOARD_WATERMARK_INTERVAL=0):
+            self.ingest('GOAL', {'goal': 'Subscribed'})
+        response = self.client.get(self.url('goals'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['goals']['Subscribed']['count'], 1)
+
+    def test_ingest_within_watermark_interval(self):
+        self.ingest('GOAL', {'goal': 'Subscribed'})
+        response = self.client.get(self.url('goals'))
+        etag = response['ETag']
+        self.assertEqual(response.json()['goals']['Subscribed']['count'], 1)
+
+        # The watermark does not move, the cached piece is served until it expires.
+        self.ingest('GOAL', {'goal': 'Subscribed', 'plan': 'yearly'})
+        response = self.client.get(self.url('goals'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        cache.delete(Dashboard.cache_key(self.app, 'goals', 30))
+        response = self.client.get(self.url('goals'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['goals']['Subscribed']['count'], 2)
+
+    def test_last_modified_rounds_up(self):
+        computed_at = time.time() + 0.5
+        cache.set(Dashboard.cache_key(self.app, 'goals', 30), ({}, computed_at))
+        response = self.client.get(self.url('goals'))
+        self.assertEqual(response['Last-Modified'], http_date(math.ceil(computed_at)))
+
+    def test_owner(self):
+        other = User.objects.create_user('paul', 'mccartney@thebeatles.com', 'paulpassword')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(self.url('goals')).status_code, 404)
+        self.assertEqual(APIClient().get(self.url('goals')).status_code, 403)
@@ -0,0 +1,137 @@
+import json
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from femtolytics.api.throttling import KEY_PREFIX, available, dropped, take
+from femtolytics.api.views import LeanActionView
+from femtolytics.models import App, Activity
+
+User = get_user_model()
+
+
+@override_settings(FEMTOLYTICS_RATE_LIMITS={'app': (10, 5), 'visitor': (1, 3)})
+class ThrottlingApiTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.package_name = 'com.femtolytics.test'
+        self.owner = User.objects.create_user(
+            'john',
+            'lennon@thebeatles.com',
+            'johnpassword')
+        self.app = App.objects.create(
+            owner=self.owner,
+            package_name=self.package_name,
+        )
+        self.client = Client()
+        self.now = timezone.now()
+
+    def message(self, visitor_id, count):
+        return json.dumps({
+            'version': 2,
+            'package': {
+                'name': self.package_name,
+                'version': '1.0.0',
+                'build': '99',
+            },
+            'device': {
+                'name': 'iPhone',
+                'os': 'iOS 1.0.0',
+            },
+            'visitor_id': visitor_id,
+            'actions': [
+                {
+                    'id': str(uuid.uuid4()),
+                    'type': 'Button Clicked',
+                    'time': self.now.isoformat(),
+                }
+                for _ in range(count)
+            ],
+        })
+
+    def post(self, visitor_id, count=1):
+        return self.client.post(reverse('femtolytics_api:action'), self.message(visitor_id, count),
+            content_type='application/json')
+
+    def test_take(self):
+        self.assertTrue(take('bucket', 2, 1, 3, now=100))
+        self.assertTrue(take('bucket', 1, 1, 3, now=100))
+        self.assertFalse(take('bucket', 1, 1, 3, now=100))
+        # Refilled at `rate` tokens per second, up to `burst`
+        self.assertTrue(take('bucket', 1, 1, 3, now=101.5))
+        self.assertFalse(take('bucket', 1, 1, 3, now=101.5))
+        self.assertTrue(take('bucket', 3, 1, 3, now=200))
+        # Batches larger than the burst never go through
+        self.assertFalse(take('bucket', 10, 1, 3, now=300))
+        self.assertTrue(take('bucket', 3, 1, 3, now=300))
+
+    def test_visitor_limit(self):
+        visitor_id = str(uuid.uuid4())
+        self.assertEqual(self.post(visitor_id, 2).status_code, 200)
+        response = self.post(visitor_id, 2)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(Activity.objects.filter(app=self.app).count(), 2)
+
+        # Other visitors are not affected
+        self.assertEqual(self.post(str(uuid.uuid4()), 2).status_code, 200)
+        self.assertEqual(dropped([self.package_name]), {self.package_name: 2})
+
+    @override_settings(FEMTOLYTICS_RATE_LIMITS={'app': (0.01, 5)})
+    def test_app_limit(self):
+        for _ in range(5):
+            self.assertEqual(self.post(str(uuid.uuid4())).status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.post(str(uuid.uuid4()))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(Activity.objects.filter(app=self.app).count(), 5)
+
+        # Limits are per package name
+        self.package_name = 'com.femtolytics.other'
+        self.assertEqual(self.post(str(uuid.uuid4())).status_code, 404)
+
+    @override_settings(FEMTOLYTICS_RATE_LIMITS={'app': (0.01, 1)})
+    def test_warns_once(self):
+        self.assertEqual(self.post(str(uuid.uuid4())).status_code, 200)
+        with self.assertLogs('femtolytics', level='WARNING') as logs:
+            for _ in range(3):
+                self.assertEqual(self.post(str(uuid.uuid4())).status_code, 429)
+        self.assertEqual(logs.output, ['WARNING:femtolytics:Rate limited {}, dropped 1 items so far'.format(
+            self.package_name)])
+        self.assertEqual(dropped([self.package_name]), {self.package_name: 3})
+
+    def test_batch_larger_than_burst(self):
+        visitor_id = str(uuid.uuid4())
+        self.assertEqual(self.post(visitor_id, 4).status_code, 413)
+        self.assertEqual(Activity.objects.filter(app=self.app).count(), 0)
+        self.assertEqual(dropped([self.package_name]), {self.package_name: 4})
+        self.assertEqual(self.post(visitor_id, 3).status_code, 200)
+
+    @override_settings(FEMTOLYTICS_RATE_LIMITS={'app': (0.01, 2), 'visitor': (0.01, 3)})
+    def test_rejected_batches_take_no_tokens(self):
+        self.assertEqual(self.post(str(uuid.uuid4()), 2).status_code, 200)
+        visitor_id = str(uuid.uuid4())
+        # Over the app limit, the visitor bucket is left untouched.
+        self.assertEqual(self.post(visitor_id, 2).status_code, 429)
+        self.assertAlmostEqual(
+            available(f'{KEY_PREFIX}:visitor:{self.package_name}:{visitor_id}', 0.01, 3, time.time()), 3)
+
+    def test_lean(self):
+        visitor_id = str(uuid.uuid4())
+        factory = RequestFactory()
+        view = LeanActionView.as_view()
+        request = factory.post('/', self.message(visitor_id, 3), content_type='application/json')
+        self.assertEqual(view(request).status_code, 200)
+        request = factory.post('/', self.message(visitor_id, 1), content_type='application/json')
+        self.assertEqual(view(request).status_code, 429)
+
+    @override_settings(FEMTOLYTICS_RATE_LIMITS=None)
+    def test_disabled(self):
+        visitor_id = str(uuid.uuid4())
+        for _ in range(5):
+            self.assertEqual(self.post(visitor_id, 2).status_code, 200)
+        self.assertEqual(dropped([self.package_name]), {self.package_name: 0})
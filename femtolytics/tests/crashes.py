@@ -0,0 +1,141 @@
+import io
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from femtolytics.crashes import Fingerprinter
+from femtolytics.handler import Handler
+from femtolytics.models import App, Crash
+
+User = get_user_model()
+
+TRACE = (
+    "#0 wrapDatabaseException (package:sqflite/src/exception_impl.dart:11)\n"
+    "<asynchronous suspension>\n"
+    "#1 BasicLock.synchronized (package:synchronized/src/basic_lock.dart:34)\n"
+    "<asynchronous suspension>\n"
+    "#2 PayeeDao.insert (package:instabudget/models/payee_dao.dart:46)\n"
+    "<asynchronous suspension>\n"
+    "#3 Synchronizer.synchronize.<anonymous closure> (package:instabudget/utils/synchronizer.dart:100)\n"
+)
+
+
+class StaticFingerprinter:
+    def fingerprint(self, exception, stack_trace=None):
+        return 'static'
+
+
+class FingerprinterTestCase(TestCase):
+    def test_line_numbers_ignored(self):
+        fingerprinter = Fingerprinter()
+        moved = TRACE.replace('dart:46', 'dart:52').replace('dart:100', 'dart:101')
+        self.assertEqual(fingerprinter.fingerprint('Error', TRACE), fingerprinter.fingerprint('Error', moved))
+
+    def test_addresses_ignored(self):
+        fingerprinter = Fingerprinter()
+        first = "0   MyApp   0x0000000100a4c2f4 -[Payee insert:] + 120\n1   UIKitCore   0x00000001a2b3c4d5 -[UIApplication sendEvent:] + 64\n"
+        second = "0   MyApp   0x0000000100f00000 -[Payee insert:] + 96\n1   UIKitCore   0x00000001a0000000 -[UIApplication sendEvent:] + 64\n"
+        self.assertEqual(fingerprinter.fingerprint('Error', first), fingerprinter.fingerprint('Error', second))
+
+    def test_different_frames(self):
+        fingerprinter = Fingerprinter()
+        other = TRACE.replace('PayeeDao.insert', 'PayeeDao.update')
+        self.assertNotEqual(fingerprinter.fingerprint('Error', TRACE), fingerprinter.fingerprint('Error', other))
+
+    def test_in_app_patterns(self):
+        fingerprinter = Fingerprinter(in_app_patterns=[r'package:instabudget/'])
+        other = TRACE.replace('BasicLock.synchronized', 'ReentrantLock.synchronized')
+        self.assertEqual(fingerprinter.significant_frames(TRACE), [
+            'PayeeDao.insert (package:instabudget/models/payee_dao.dart)',
+            'Synchronizer.synchronize.<anonymous closure> (package:instabudget/utils/synchronizer.dart)',
+        ])
+        self.assertEqual(fingerprinter.fingerprint('Error', TRACE), fingerprinter.fingerprint('Error', other))
+
+    def test_top_frames(self):
+        fingerprinter = Fingerprinter(frames=1)
+        other = TRACE.replace('PayeeDao.insert', 'PayeeDao.update')
+        self.assertEqual(fingerprinter.fingerprint('Error', TRACE), fingerprinter.fingerprint('Error', other))
+
+    def test_exception_only(self):
+        fingerprinter = Fingerprinter()
+        self.assertEqual(
+            fingerprinter.fingerprint("RangeError (index): Invalid value: Not in range 0..2, inclusive: 3"),
+            fingerprinter.fingerprint("RangeError (index): Invalid value: Not in range 0..4, inclusive: 7"))
+        self.assertNotEqual(
+            fingerprinter.fingerprint("RangeError (index): Invalid value"),
+            fingerprinter.fingerprint("StateError: Bad state: No element"))
+
+    @override_settings(FEMTOLYTICS_CRASH_FINGERPRINTER='femtolytics.tests.crashes.StaticFingerprinter')
+    def test_pluggable(self):
+        self.assertIsInstance(Fingerprinter.get(), StaticFingerprinter)
+
+
+class RegroupCrashesTestCase(TestCase):
+    def setUp(self):
+        self.package_name = 'com.femtolytics.test'
+        self.owner = User.objects.create_user(
+            'john',
+            'lennon@thebeatles.com',
+            'johnpassword')
+        self.app = App.objects.create(
+            owner=self.owner,
+            package_name=self.package_name,
+        )
+        self.now = timezone.now()
+
+    def crash(self, stack_trace, signature):
+        activity, result = Handler.on_event({
+            'event': {
+                'type': 'CRASH',
+                'time': self.now.isoformat(),
+                'properties': {
+                    'exception': 'DatabaseException',
+                    'stack_trace': stack_trace,
+                },
+            },
+            'device': {
+                'name': 'iPhone',
+                'os': 'iOS 1.0.0',
+            },
+            'package': {
+                'name': self.package_name,
+                'version': '1.0.0',
+                'build': '99',
+            },
+            'visitor_id': str(uuid.uuid4()),
+        })
+        self.assertEqual(result, Handler.SUCCESS)
+        crash = Crash.objects.get(occurrence__activity=activity)
+        # Pretend the crash was grouped by an older fingerprinter.
+        crash.signature = signature
+        crash.save()
+        return crash
+
+    def test_regroup(self):
+        self.crash(TRACE, 'legacy-1')
+        self.crash(TRACE.replace('dart:46', 'dart:48'), 'legacy-2')
+        self.crash(TRACE.replace('PayeeDao.insert', 'PayeeDao.update'), 'legacy-3')
+        self.assertEqual(Crash.objects.filter(app=self.app).count(), 3)
+
+        out = io.StringIO()
+        call_command('femtolytics_regroup_crashes', '--batch-size', '1', stdout=out)
+        self.assertIn('3 crashes processed, 2 renamed, 1 merged.', out.getvalue())
+
+        crashes = Crash.objects.filter(app=self.app)
+        self.assertEqual(crashes.count(), 2)
+        merged = crashes.get(signature=Fingerprinter().fingerprint('DatabaseException', TRACE))
+        self.assertEqual(merged.activities.count(), 2)
+        self.assertEqual(merged.sessions.count(), 2)
+
+    def test_dry_run(self):
+        self.crash(TRACE, 'legacy-1')
+        self.crash(TRACE.replace('dart:46', 'dart:48'), 'legacy-2')
+
+        out = io.StringIO()
+        call_command('femtolytics_regroup_crashes', '--dry-run', stdout=out)
+        self.assertIn('1 merged', out.getvalue())
+        self.assertEqual(
+            sorted(Crash.objects.filter(app=self.app).values_list('signature', flat=True)),
+            ['legacy-1', 'legacy-2'])
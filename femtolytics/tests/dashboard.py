@@ -0,0 +1,151 @@
+import uuid
+
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from femtolytics.dashboard import Dashboard
+from femtolytics.handler import Handler
+from femtolytics.models import Activity, App, ReleaseDay, Session, Visitor, VisitorSummary
+
+User = get_user_model()
+
+
+class DashboardCacheTestCase(TestCase):
+    def setUp(self):
+        self.package_name = 'com.femtolytics.test'
+        self.owner = User.objects.create_user(
+            'john',
+            'lennon@thebeatles.com',
+            'johnpassword')
+        self.app = App.objects.create(
+            owner=self.owner,
+            package_name=self.package_name,
+        )
+        self.now = timezone.now()
+        self.visitor_id = str(uuid.uuid4())
+
+    def create_session(self):
+        visitor = Visitor.objects.create(app=self.app, registered_at=self.now)
+        return Session.objects.create(
+            app=self.app,
+            visitor=visitor,
+            started_at=self.now,
+            ended_at=self.now,
+        )
+
+    def event(self, type, time):
+        return {
+            'event': {
+                'type': type,
+                'time': time.isoformat(),
+            },
+            'device': {
+                'name': 'iPhone',
+                'os': 'iOS 1.0.0',
+            },
+            'package': {
+                'name': self.package_name,
+                'version': '1.0.0',
+                'build': '99',
+            },
+            'visitor_id': self.visitor_id,
+        }
+
+    def test_stats_are_cached(self):
+        self.create_session()
+        stats = Dashboard.stats(self.app, 30)
+        self.assertEqual(stats['session_count'], 1)
+
+        # Not ingested through the handler, so the cached value is served.
+        self.create_session()
+        with self.assertNumQueries(0):
+            stats = Dashboard.stats(self.app, 30)
+        self.assertEqual(stats['session_count'], 1)
+
+        Dashboard.touch(self.app.id, force=True)
+        stats = Dashboard.stats(self.app, 30)
+        self.assertEqual(stats['session_count'], 2)
+
+    def test_ingest_invalidates(self):
+        self.assertEqual(Dashboard.stats(self.app, 7)['session_count'], 0)
+        with self.settings(FEMTOLYTICS_DASHBOARD_WATERMARK_INTERVAL=0):
+            activity, result = Handler.on_event(self.event('VIEW', self.now - timedelta(hours=1)))
+        self.assertEqual(result, Handler.SUCCESS)
+        self.assertEqual(Dashboard.stats(self.app, 7)['session_count'], 1)
+
+    def test_ingest_is_coalesced(self):
+        watermark = Dashboard.watermark(self.app.id)
+        # Within the interval, ingest keeps the cached pieces.
+        activity, result = Handler.on_event(self.event('VIEW', self.now - timedelta(hours=1)))
+        self.assertEqual(result, Handler.SUCCESS)
+        self.assertEqual(Dashboard.watermark(self.app.id), watermark)
+
+        # Once the watermark is older than the interval, ingest moves it.
+        cache.set(Dashboard.watermark_key(self.app.id), watermark - 30, None)
+        activity, result = Handler.on_event(self.event('VIEW', self.now))
+        self.assertEqual(result, Handler.SUCCESS)
+        self.assertGreaterEqual(Dashboard.watermark(self.app.id), watermark)
+
+    def test_durations_are_cached_separately(self):
+        session = self.create_session()
+        Session.objects.filter(id=session.id).update(started_at=self.now - timedelta(days=10))
+        self.assertEqual(Dashboard.stats(self.app, 30)['session_count'], 1)
+        self.assertEqual(Dashboard.stats(self.app, 7)['session_count'], 0)
+
+    def test_crash_samples(self):
+        event = self.event('CRASH', self.now)
+        event['event']['properties'] = {'exception': 'Divide by zero\nat main.dart:12'}
+        activity, result = Handler.on_event(event)
+        self.assertEqual(result, Handler.SUCCESS)
+        crashes = Dashboard.compute_crashes(self.app, 30)
+        self.assertEqual([crash['sample'] for crash in crashes.values()], ['Divide by zero'])
+
+    def test_overview(self):
+        other = App.objects.create(owner=self.owner, package_name='com.femtolytics.other')
+        empty = App.objects.create(owner=self.owner, package_name='com.femtolytics.empty')
+        for _ in range(2):
+            self.visitor_id = str(uuid.uuid4())
+            self.assertEqual(Handler.on_event(self.event('VIEW', self.now))[1], Handler.SUCCESS)
+        event = self.event('CRASH', self.now + timedelta(seconds=10))
+        event['event']['properties'] = {'exception': 'Divide by zero\nat main.dart:12'}
+        self.assertEqual(Handler.on_event(event)[1], Handler.SUCCESS)
+        self.package_name = other.package_name
+        self.visitor_id = str(uuid.uuid4())
+        self.assertEqual(Handler.on_event(self.event('VIEW', self.now))[1], Handler.SUCCESS)
+
+        apps = [self.app, other, empty]
+        # One query per table, whatever the number of apps.
+        with self.assertNumQueries(3):
+            overview = Dashboard.overview(apps, 30)
+        self.assertEqual([(row['sessions'], row['visitors'], row['crashes']) for row in overview],
+            [(2, 2, 1), (1, 1, 0), (0, 0, 0)])
+        self.assertEqual(overview[0]['crash_free_rate'], 50.0)
+        self.assertIsNone(overview[2]['crash_free_rate'])
+
+        with self.assertNumQueries(0):
+            Dashboard.overview(apps, 30)
+        Dashboard.touch(empty.id, force=True)
+        with self.assertNumQueries(3):
+            Dashboard.overview(apps, 30)
+
+    def test_sampled_counts(self):
+        with self.settings(FEMTOLYTICS_SAMPLING={self.package_name: {'VIEW': 0.5}}):
+            while Handler.sampled(self.visitor_id, 0.5):
+                self.visitor_id = str(uuid.uuid4())
+            for seconds in (0, 10, 20):
+                activity, result = Handler.on_event(self.event('VIEW', self.now + timedelta(seconds=seconds)))
+                self.assertEqual(result, Handler.SAMPLED)
+
+        # Nothing recorded, but the session and the visitor are complete.
+        self.assertFalse(Activity.objects.filter(app=self.app).exists())
+        session = Session.objects.get(app=self.app)
+        self.assertEqual(session.duration, timedelta(seconds=20))
+        stats = Dashboard.compute_stats(self.app, 7)
+        self.assertEqual((stats['session_count'], stats['visitor_count']), (1, 1))
+        self.assertEqual(Dashboard.compute_active_users(self.app)['active_users'][0]['visitors'], 1)
+        release_day = ReleaseDay.objects.get(app=self.app)
+        self.assertEqual((release_day.sessions, release_day.activities), (1, 0))
+        summary = VisitorSummary.objects.get(visitor_id=self.visitor_id)
+        self.assertEqual((summary.sessions, summary.activities, summary.seconds), (1, 0, 20))
@@ -0,0 +1,202 @@
+import unittest
+import uuid
+
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from femtolytics.handler import Handler
+from femtolytics.models import App, Activity, Goal, Occurrence, Session
+
+User = get_user_model()
+
+try:
+    import pycountry
+except ImportError:
+    pycountry = None
+
+
+class HandlerTestCase(TestCase):
+    def setUp(self):
+        self.package_name = 'com.femtolytics.test'
+        self.owner = User.objects.create_user(
+            'john',
+            'lennon@thebeatles.com',
+            'johnpassword')
+        self.app = App.objects.create(
+            owner=self.owner,
+            package_name=self.package_name,
+        )
+        self.now = timezone.now()
+        self.visitor_id = str(uuid.uuid4())
+
+    def event(self, type, time=None, properties=None):
+        event = {
+            'event': {
+                'type': type,
+                'time': (time or self.now).isoformat(),
+            },
+            'device': {
+                'name': 'iPhone',
+                'os': 'iOS 1.0.0',
+            },
+            'package': {
+                'name': self.package_name,
+                'version': '1.0.0',
+                'build': '99',
+            },
+            'visitor_id': self.visitor_id,
+        }
+        if properties is not None:
+            event['event']['properties'] = properties
+        return event
+
+    def test_no_country_code_without_geo_info(self):
+        activity, result = Handler.on_event(self.event('VIEW', properties={'view': 'Home'}))
+        self.assertEqual(result, Handler.SUCCESS)
+        self.assertIsNone(activity.country)
+        self.assertIsNone(activity.country_code)
+
+    @unittest.skipIf(pycountry is None, 'pycountry is not installed')
+    def test_country_code_resolved_at_ingest(self):
+        city = {
+            'city': 'Paris',
+            'region': 'IDF',
+            'country_code': 'FR',
+            'country_name': 'France',
+        }
+        activity, result = Handler.on_event(self.event('VIEW', properties={'view': 'Home'}), city=city)
+        self.assertEqual(result, Handler.SUCCESS)
+        self.assertEqual(Activity.objects.get(id=activity.id).country_code, 'FRA')
+
+        # Falls back on the country name
+        city = {
+            'country_name': 'Germany',
+        }
+        self.assertEqual(Handler.country_code(city), 'DEU')
+        self.assertIsNone(Handler.country_code({'country_code': 'XX', 'country_name': 'Atlantis'}))
+
+    def test_goal_occurrences(self):
+        first, result = Handler.on_event(self.event('GOAL', properties={'goal': 'Purchase'}))
+        self.assertEqual(result, Handler.SUCCESS)
+        second, result = Handler.on_event(self.event('GOAL', self.now + timedelta(seconds=1), properties={'goal': 'Purchase'}))
+        self.assertEqual(result, Handler.SUCCESS)
+
+        goal = Goal.objects.get(app=self.app, name='Purchase')
+        occurrences = Occurrence.objects.filter(goal=goal).order_by('id')
+        self.assertEqual(occurrences.count(), 2)
+        self.assertEqual(occurrences[0].activity_id, first.id)
+        self.assertEqual(occurrences[0].session_id, first.session_id)
+        self.assertEqual(str(occurrences[0].visitor_id), self.visitor_id)
+        self.assertIsNone(occurrences[0].crash_id)
+        self.assertEqual(list(goal.activities), [first, second])
+        self.assertEqual(goal.sessions.count(), 1)
+
+    @override_settings(FEMTOLYTICS_DEDUPLICATE=True)
+    def test_duplicate_event(self):
+        activity, result = Handler.on_event(self.event('VIEW', properties={'view': 'Home'}))
+        self.assertEqual(result, Handler.SUCCESS)
+        # A retried upload is acknowledged without creating anything.
+        duplicate, result = Handler.on_event(self.event('VIEW', properties={'view': 'Home'}))
+        self.assertEqual(result, Handler.DUPLICATE)
+        self.assertIsNone(duplicate)
+        self.assertEqual(Activity.objects.filter(app=self.app).count(), 1)
+        self.assertEqual(Session.objects.filter(app=self.app).count(), 1)
+
+        # Same content at another time is a different event.
+        activity, result = Handler.on_event(self.event('VIEW', self.now + timedelta(seconds=1), properties={'view': 'Home'}))
+        self.assertEqual(result, Handler.SUCCESS)
+
+    def test_duplicate_client_id(self):
+        first = self.event('VIEW', properties={'view': 'Home'})
+        first['event']['id'] = 1
+        activity, result = Handler.on_event(first)
+        self.assertEqual(result, Handler.SUCCESS)
+
+        # The client id takes precedence over the content.
+        second = self.event('VIEW', properties={'view': 'Home'})
+        second['event']['id'] = 2
+        activity, result = Handler.on_event(second)
+        self.assertEqual(result, Handler.SUCCESS)
+        retried = self.event('VIEW', self.now + timedelta(seconds=1), properties={'view': 'Home'})
+        retried['event']['id'] = 2
+        activity, result = Handler.on_event(retried)
+        self.assertEqual(result, Handler.DUPLICATE)
+        self.assertEqual(Activity.objects.filter(app=self.app).count(), 2)
+
+    def test_duplicate_seen(self):
+        event = self.event('VIEW', properties={'view': 'Home'})
+        event['event']['id'] = 1
+        Handler.seen.put((self.package_name, Handler.dedup_key(event, 'event')), True)
+        with self.assertNumQueries(0):
+            activity, result = Handler.on_event(event)
+        self.assertEqual(result, Handler.DUPLICATE)
+
+    def test_duplicate_content(self):
+        # Without a client id, identical events are all recorded by default.
+        for _ in range(2):
+            activity, result = Handler.on_event(self.event('VIEW', properties={'view': 'Home'}))
+            self.assertEqual(result, Handler.SUCCESS)
+            self.assertIsNone(activity.dedup_key)
+        self.assertEqual(Activity.objects.filter(app=self.app).count(), 2)
+
+    def test_sampling(self):
+        sampling = {self.package_name: {'VIEW': 0.5, 'CRASH': 0.5, 'Button Clicked': 0}}
+        with self.settings(FEMTOLYTICS_SAMPLING=sampling):
+            visitors = [str(uuid.uuid4()) for _ in range(200)]
+            kept = [visitor_id for visitor_id in visitors if Handler.sampled(visitor_id, 0.5)]
+            self.assertTrue(50 < len(kept) < 150)
+            # Visitors kept at a rate are kept at any higher rate.
+            self.assertTrue(all(Handler.sampled(visitor_id, 0.8) for visitor_id in kept))
+            self.assertTrue(Handler.sampled(uuid.UUID(kept[0]).int, 0.5))
+
+            dropped = next(visitor_id for visitor_id in visitors if visitor_id not in kept)
+            self.visitor_id = dropped
+            activity, result = Handler.on_event(self.event('VIEW', properties={'view': 'Home'}))
+            self.assertEqual(result, Handler.SAMPLED)
+            self.assertFalse(Activity.objects.filter(visitor_id=dropped).exists())
+            # Crashes are always recorded
+            activity, result = Handler.on_event(self.event('CRASH', properties={'exception': 'Divide by zero'}))
+            self.assertEqual(result, Handler.SUCCESS)
+            self.assertEqual(activity.sample_rate, 1.0)
+
+            self.visitor_id = kept[0]
+            activity, result = Handler.on_event(self.event('VIEW', properties={'view': 'Home'}))
+            self.assertEqual(result, Handler.SUCCESS)
+            self.assertEqual(activity.sample_rate, 0.5)
+            self.assertEqual(activity.weight, 2)
+            activity, result = Handler.on_event(self.event('PAUSED', self.now + timedelta(seconds=1)))
+            self.assertEqual(activity.sample_rate, 1.0)
+
+            action = self.event('VIEW')
+            action['action'] = action.pop('event')
+            action['action']['type'] = 'Button Clicked'
+            activity, result = Handler.on_action(action)
+            self.assertEqual(result, Handler.SAMPLED)
+
+    def test_lifecycle_counters(self):
+        with self.settings(FEMTOLYTICS_LIFECYCLE_EVENTS='counters'):
+            activity, result = Handler.on_event(self.event('VIEW', properties={'view': 'Home'}))
+            self.assertEqual(result, Handler.SUCCESS)
+            for seconds, event_type in [(10, 'PAUSED'), (20, 'RESUMED'), (30, 'PAUSED'), (40, 'DETACHED')]:
+                collapsed, result = Handler.on_event(self.event(event_type, self.now + timedelta(seconds=seconds)))
+                self.assertEqual(result, Handler.COLLAPSED)
+                self.assertIsNone(collapsed)
+
+        self.assertEqual(Activity.objects.filter(app=self.app).count(), 1)
+        session = Session.objects.get(id=activity.session_id)
+        self.assertEqual(session.ended_at, self.now + timedelta(seconds=40))
+        self.assertEqual(session.lifecycle_counts, [('DETACHED', 1), ('RESUMED', 1), ('PAUSED', 2)])
+        self.assertEqual(session.visitor.summary.seconds, 40)
+
+    def test_lifecycle_boundaries(self):
+        with self.settings(FEMTOLYTICS_LIFECYCLE_EVENTS='boundaries'):
+            activity, result = Handler.on_event(self.event('INACTIVE', self.now - timedelta(seconds=5)))
+            self.assertEqual(result, Handler.COLLAPSED)
+            activity, result = Handler.on_event(self.event('VIEW', properties={'view': 'Home'}))
+            self.assertEqual(result, Handler.SUCCESS)
+
+        session = Session.objects.get(id=activity.session_id)
+        self.assertEqual(session.started_at, self.now - timedelta(seconds=5))
+        self.assertEqual(session.lifecycle_counts, [])
+        self.assertEqual(list(session.activity_set.all()), [activity])
@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from femtolytics.handler import Handler
+from femtolytics.live import Live
+from femtolytics.models import App, Device, Release
+from femtolytics.views import LiveFeedView, LiveStreamView
+
+User = get_user_model()
+
+
+class LiveTestCase(TestCase):
+    def setUp(self):
+        Live.feeds = {}
+        self.app_id = uuid.uuid4()
+
+    def entry(self, session_id):
+        return {'session_id': session_id, 'type': 'VIEW'}
+
+    @override_settings(FEMTOLYTICS_LIVE_BUFFER_SIZE=3)
+    def test_ring_buffer(self):
+        for index in range(5):
+            Live.publish(self.app_id, self.entry(f'session-{index}'))
+        entries, last = Live.since(self.app_id)
+        self.assertEqual(last, 5)
+        self.assertEqual([entry['seq'] for entry in entries], [3, 4, 5])
+        entries, last = Live.since(self.app_id, 4)
+        self.assertEqual([entry['session_id'] for entry in entries], ['session-4'])
+        # Numbers from another process start over
+        entries, last = Live.since(self.app_id, 42)
+        self.assertEqual(len(entries), 3)
+        self.assertEqual(Live.since(uuid.uuid4()), ([], 0))
+
+    def test_wait(self):
+        Live.publish(self.app_id, self.entry('session'))
+        start = time.monotonic()
+        self.assertEqual(Live.since(self.app_id, 1, timeout=0.1), ([], 1))
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+
+        publisher = threading.Timer(0.05, Live.publish, [self.app_id, self.entry('other')])
+        publisher.start()
+        entries, last = Live.since(self.app_id, 1, timeout=5)
+        publisher.join()
+        self.assertEqual(last, 2)
+        self.assertEqual(entries[0]['session_id'], 'other')
+
+    def test_active_sessions(self):
+        for session_id in ['a', 'b', 'a']:
+            Live.publish(self.app_id, self.entry(session_id))
+        self.assertEqual([entry['seq'] for entry in Live.active_sessions(self.app_id)], [3, 2])
+        with self.settings(FEMTOLYTICS_LIVE_ACTIVE_SECONDS=-1):
+            self.assertEqual(Live.active_sessions(self.app_id), [])
+
+
+class LiveHandlerTestCase(TransactionTestCase):
+    def setUp(self):
+        Live.feeds = {}
+        # Committed ids are cached, while tables are flushed between tests.
+        Device.ids.clear()
+        Release.ids.clear()
+        self.package_name = 'com.femtolytics.test'
+        self.owner = User.objects.create_user(
+            'john',
+            'lennon@thebeatles.com',
+            'johnpassword')
+        self.app = App.objects.create(
+            owner=self.owner,
+            package_name=self.package_name,
+        )
+        self.now = timezone.now()
+        self.visitor_id = str(uuid.uuid4())
+
+    def event(self, type, properties=None):
+        return {
+            'event': {
+                'type': type,
+                'time': self.now.isoformat(),
+                'properties': properties,
+            },
+            'device': {
+                'name': 'iPhone',
+                'os': 'iOS 1.0.0',
+            },
+            'package': {
+                'name': self.package_name,
+                'version': '1.0.0',
+                'build': '99',
+            },
+            'visitor_id': self.visitor_id,
+        }
+
+    def test_published(self):
+        activity, result = Handler.on_event(self.event('VIEW', {'view': 'Home'}))
+        self.assertEqual(result, Handler.SUCCESS)
+        with override_settings(FEMTOLYTICS_LIFECYCLE_EVENTS='counters'):
+            collapsed, result = Handler.on_event(self.event('PAUSED'))
+            self.assertEqual(result, Handler.COLLAPSED)
+
+        entries, last = Live.since(self.app.id)
+        self.assertEqual([(entry['type'], entry['summary']) for entry in entries], [('VIEW', 'Home'), ('PAUSED', None)])
+        self.assertEqual(entries[0]['session_id'], str(activity.session_id))
+        self.assertEqual(entries[0]['visitor'], activity.visitor.name)
+        self.assertEqual(entries[0]['version'], '1.0.0')
+
+    def test_views(self):
+        Handler.on_event(self.event('VIEW', {'view': 'Home'}))
+        factory = RequestFactory()
+
+        request = factory.get('/', {'after': 0, 'wait': 60})
+        request.user = self.owner
+        data = json.loads(LiveFeedView.as_view()(request, app_id=self.app.id).content)
+        self.assertEqual(data['last'], 1)
+        self.assertEqual(len(data['sessions']), 1)
+
+        request = factory.get('/', HTTP_LAST_EVENT_ID='1')
+        request.user = self.owner
+        response = LiveStreamView.as_view()(request, app_id=self.app.id)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = iter(response.streaming_content)
+        self.assertEqual(next(stream), b'retry: 3000\n\n')
+        self.assertTrue(next(stream).startswith(b'id: 1\ndata: {"entries": []'))
+        response.close()
+
+        request.user = User.objects.create_user('paul', 'mccartney@thebeatles.com', 'paulpassword')
+        with self.assertRaises(Exception):
+            LiveFeedView.as_view()(request, app_id=self.app.id)
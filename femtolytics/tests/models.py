@@ -1,11 +1,13 @@
 import json
+import random
 import uuid
 
 from datetime import timedelta
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from django.utils import timezone
-from femtolytics.models import App, Activity, Session, Visitor
+from femtolytics.models import App, Activity, Device, Release, Session, Visitor
+from femtolytics.utils import LRU
 
 User = get_user_model()
 
@@ -204,3 +206,96 @@ class FindAppVisitorSessionTestCase(TestCase):
         self.assertNotEqual(s.id, session.id)
 
 
+
+
+class VisitorNameTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            'john',
+            'lennon@thebeatles.com',
+            'johnpassword')
+        self.app = App.objects.create(
+            owner=self.owner,
+            package_name='com.femtolytics.test',
+        )
+
+    def test_name_is_deterministic(self):
+        visitor_id = uuid.uuid4()
+        name = Visitor.name_from_id(visitor_id)
+        self.assertEqual(name, Visitor.name_from_id(str(visitor_id)))
+        adjective, animal = name.split(' ')
+        self.assertIn(adjective, Visitor.ADJECTIVES)
+        self.assertIn(animal, Visitor.ANIMALS)
+
+    def test_name_does_not_touch_global_random(self):
+        random.seed(42)
+        expected = random.random()
+        random.seed(42)
+        Visitor.name_from_id(uuid.uuid4())
+        self.assertEqual(random.random(), expected)
+
+    def test_name_is_stored(self):
+        visitor = Visitor.objects.create(app=self.app)
+        self.assertEqual(visitor.name, Visitor.name_from_id(visitor.id))
+
+        # A stored name is never recomputed.
+        Visitor.objects.filter(id=visitor.id).update(name='Legacy Name')
+        visitor = Visitor.objects.get(id=visitor.id)
+        visitor.save()
+        self.assertEqual(Visitor.objects.get(id=visitor.id).name, 'Legacy Name')
+
+
+class DimensionTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            'john',
+            'lennon@thebeatles.com',
+            'johnpassword')
+        self.app = App.objects.create(
+            owner=self.owner,
+            package_name='com.femtolytics.test',
+        )
+
+    def test_resolve_deduplicates(self):
+        device_id = Device.resolve('iPhone', 'iOS 14.0')
+        self.assertEqual(Device.resolve('iPhone', 'iOS 14.0'), device_id)
+        self.assertNotEqual(Device.resolve('iPhone', 'iOS 14.1'), device_id)
+        self.assertEqual(Device.objects.count(), 2)
+
+        release_id = Release.resolve(self.app, '1.0.0', '99')
+        self.assertEqual(Release.resolve(self.app, '1.0.0', '99'), release_id)
+        self.assertEqual(Release.objects.count(), 1)
+
+    def test_activity_properties(self):
+        visitor = Visitor.objects.create(app=self.app)
+        session = Session.objects.create(app=self.app, visitor=visitor, ended_at=timezone.now())
+        activity = Activity.objects.create(
+            visitor=visitor,
+            session=session,
+            app=self.app,
+            category=Activity.EVENT,
+            activity_type='VIEW',
+            occured_at=timezone.now(),
+            device_id=Device.resolve('iPhone', 'iOS 14.0'),
+            release_id=Release.resolve(self.app, '1.0.0', '99'),
+        )
+        activity = Activity.objects.get(id=activity.id)
+        self.assertEqual(str(activity.device), 'iPhone iOS 14.0')
+        self.assertEqual(activity.device_name, 'iPhone')
+        self.assertEqual(activity.device_os, 'iOS 14.0')
+        self.assertEqual(activity.version, '1.0.0.99')
+        self.assertEqual(activity.package_name, 'com.femtolytics.test')
+        self.assertEqual(activity.package_version, '1.0.0')
+        self.assertEqual(activity.package_build, '99')
+
+    def test_lru(self):
+        lru = LRU(maxsize=2)
+        lru.put('a', 1)
+        lru.put('b', 2)
+        self.assertEqual(lru.get('a'), 1)
+        lru.put('c', 3)
+        # 'b' was the least recently used
+        self.assertNotIn('b', lru)
+        self.assertEqual(lru.get('a'), 1)
+        self.assertEqual(lru.get('c'), 3)
+        self.assertEqual(len(lru), 2)
@@ -0,0 +1,209 @@
+import uuid
+
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.db.models import Sum
+from django.test import TestCase
+from django.utils import timezone
+from femtolytics.handler import Handler
+from femtolytics.dashboard import Dashboard
+from femtolytics.models import ActiveUsers, App, Crash, CrashDay, ReleaseDay, Session, VisitorDay, VisitorSummary
+from femtolytics.rollups import Rollups
+
+User = get_user_model()
+
+
+class RollupsTestCase(TestCase):
+    def setUp(self):
+        self.package_name = 'com.femtolytics.test'
+        self.owner = User.objects.create_user(
+            'john',
+            'lennon@thebeatles.com',
+            'johnpassword')
+        self.app = App.objects.create(
+            owner=self.owner,
+            package_name=self.package_name,
+        )
+        self.now = timezone.now()
+        self.visitor_id = str(uuid.uuid4())
+
+    def event(self, type, time, version='1.0.0', properties=None):
+        event = {
+            'event': {
+                'type': type,
+                'time': time.isoformat(),
+            },
+            'device': {
+                'name': 'iPhone',
+                'os': 'iOS 1.0.0',
+            },
+            'package': {
+                'name': self.package_name,
+                'version': version,
+                'build': '99',
+            },
+            'visitor_id': self.visitor_id,
+        }
+        if properties is not None:
+            event['event']['properties'] = properties
+        return event
+
+    def ingest(self, *events):
+        for event in events:
+            activity, result = Handler.on_event(event)
+            self.assertEqual(result, Handler.SUCCESS)
+
+    def test_release_days(self):
+        crash = {'exception': 'Divide by zero', 'stack_trace': 'main.dart:12'}
+        self.ingest(
+            # First session on 1.0.0, crashing twice
+            self.event('VIEW', self.now, properties={'view': 'Home'}),
+            self.event('CRASH', self.now + timedelta(seconds=10), properties=crash),
+            self.event('CRASH', self.now + timedelta(seconds=20), properties=crash),
+            # Second session on 1.0.1, reaching a goal
+            self.event('VIEW', self.now + timedelta(hours=2), version='1.0.1', properties={'view': 'Home'}),
+            self.event('GOAL', self.now + timedelta(hours=2, seconds=5), version='1.0.1', properties={'goal': 'Subscribed'}),
+        )
+        self.assertEqual(Session.objects.filter(app=self.app).count(), 2)
+
+        first = ReleaseDay.objects.get(app=self.app, release__version='1.0.0')
+        self.assertEqual(first.sessions, 1)
+        self.assertEqual(first.crashed_sessions, 1)
+        self.assertEqual(first.goals, 0)
+        self.assertEqual(first.activities, 3)
+
+        second = ReleaseDay.objects.filter(app=self.app, release__version='1.0.1')
+        self.assertEqual(sum(day.sessions for day in second), 1)
+        self.assertEqual(sum(day.crashed_sessions for day in second), 0)
+        self.assertEqual(sum(day.goals for day in second), 1)
+
+    def test_crashed_sessions_follow_the_session(self):
+        crash = {'exception': 'Divide by zero', 'stack_trace': 'main.dart:12'}
+        # The app was updated during the session, the crash goes to the release the session was counted for.
+        self.ingest(
+            self.event('VIEW', self.now, properties={'view': 'Home'}),
+            self.event('CRASH', self.now + timedelta(seconds=10), version='1.0.1', properties=crash),
+        )
+        session = Session.objects.get(app=self.app)
+        self.assertEqual(session.release.version, '1.0.0')
+        self.assertEqual(session.counted_on, timezone.localdate(self.now))
+
+        days = ReleaseDay.objects.filter(app=self.app).order_by('release__version')
+        self.assertEqual([(day.release.version, day.sessions, day.crashed_sessions) for day in days],
+                         [('1.0.0', 1, 1), ('1.0.1', 0, 0)])
+
+    def test_sampled_release_days(self):
+        with self.settings(FEMTOLYTICS_SAMPLING={self.package_name: {'VIEW': 0.25}}):
+            while not Handler.sampled(self.visitor_id, 0.25):
+                self.visitor_id = str(uuid.uuid4())
+            self.ingest(
+                self.event('VIEW', self.now, properties={'view': 'Home'}),
+                self.event('VIEW', self.now + timedelta(seconds=10), properties={'view': 'Settings'}),
+                self.event('PAUSED', self.now + timedelta(seconds=20)),
+            )
+        # Scaled back up across visitors, exact for the visitor.
+        self.assertEqual(sum(day.activities for day in ReleaseDay.objects.filter(app=self.app)), 4 + 4 + 1)
+        self.assertEqual(VisitorSummary.objects.get(visitor_id=self.visitor_id).activities, 3)
+
+    def test_sampled_release_days_are_not_rounded(self):
+        with self.settings(FEMTOLYTICS_SAMPLING={self.package_name: {'VIEW': 0.4}}):
+            while not Handler.sampled(self.visitor_id, 0.4):
+                self.visitor_id = str(uuid.uuid4())
+            self.ingest(*[self.event('VIEW', self.now + timedelta(seconds=seconds)) for seconds in range(2)])
+        self.assertAlmostEqual(sum(day.activities for day in ReleaseDay.objects.filter(app=self.app)), 2.5 + 2.5)
+
+    def test_crash_days(self):
+        crash = {'exception': 'Divide by zero', 'stack_trace': 'main.dart:12'}
+        self.ingest(
+            self.event('CRASH', self.now, properties=crash),
+            self.event('CRASH', self.now + timedelta(seconds=10), properties=crash),
+            self.event('CRASH', self.now + timedelta(hours=2), version='1.0.1', properties=crash),
+        )
+        self.visitor_id = str(uuid.uuid4())
+        self.ingest(self.event('CRASH', self.now + timedelta(hours=3), version='1.0.1', properties=crash))
+
+        group = Crash.objects.get(app=self.app)
+        self.assertEqual(group.visitors, 2)
+        counts = {
+            row['release__version']: (row['occurrences'], row['visitors'])
+            for row in CrashDay.objects.filter(crash=group).values('release__version').annotate(
+                occurrences=Sum('occurrences'), visitors=Sum('visitors'))
+        }
+        self.assertEqual(counts, {'1.0.0': (2, 1), '1.0.1': (2, 2)})
+
+        # Rebuilding from the occurrences gives the same counters.
+        expected = sorted(CrashDay.objects.filter(crash=group).values_list('release_id', 'day', 'occurrences', 'visitors'))
+        CrashDay.objects.filter(crash=group).update(occurrences=0, visitors=0)
+        Crash.objects.filter(id=group.id).update(visitors=0)
+        Rollups.rebuild_occurrences(Crash.objects.get(id=group.id))
+        self.assertEqual(sorted(CrashDay.objects.filter(crash=group).values_list(
+            'release_id', 'day', 'occurrences', 'visitors')), expected)
+        self.assertEqual(Crash.objects.get(id=group.id).visitors, 2)
+
+    def test_visitor_summary(self):
+        crash = {'exception': 'Divide by zero', 'stack_trace': 'main.dart:12'}
+        self.ingest(
+            self.event('VIEW', self.now, properties={'view': 'Home'}),
+            self.event('VIEW', self.now + timedelta(seconds=30), properties={'view': 'Settings'}),
+            self.event('CRASH', self.now + timedelta(seconds=40), properties=crash),
+            # Second session, on a newer release
+            self.event('VIEW', self.now + timedelta(hours=2), version='1.0.1', properties={'view': 'Home'}),
+            self.event('GOAL', self.now + timedelta(hours=2, seconds=20), version='1.0.1', properties={'goal': 'Subscribed'}),
+            # Out of order, extends the first session
+            self.event('VIEW', self.now - timedelta(seconds=10), properties={'view': 'Splash'}),
+        )
+        summary = VisitorSummary.objects.get(visitor_id=self.visitor_id)
+        self.assertEqual(summary.sessions, 2)
+        self.assertEqual(summary.activities, 6)
+        self.assertEqual(summary.goals, 1)
+        self.assertEqual(summary.crashes, 1)
+        self.assertEqual(summary.seconds, 50 + 20)
+        self.assertEqual(summary.seconds, sum(
+            int(session.duration.total_seconds()) for session in Session.objects.filter(visitor_id=self.visitor_id)))
+        self.assertEqual(summary.last_seen_at, self.now + timedelta(hours=2, seconds=20))
+        self.assertEqual(summary.release.version, '1.0.1')
+        self.assertEqual(str(summary.device), 'iPhone iOS 1.0.0')
+
+    def test_visitor_summary_country(self):
+        activity, result = Handler.on_event(self.event('VIEW', self.now), city={'country_name': 'France'})
+        self.assertEqual(result, Handler.SUCCESS)
+        activity, result = Handler.on_event(self.event('VIEW', self.now - timedelta(seconds=10)),
+                                            city={'country_name': 'Belgium'})
+        self.assertEqual(result, Handler.SUCCESS)
+        # The name resolved at ingest, of the latest activity
+        self.assertEqual(VisitorSummary.objects.get(visitor_id=self.visitor_id).country, 'France')
+
+    def test_active_users(self):
+        # Both sessions of today on the same day
+        self.now = timezone.localtime(self.now).replace(hour=8)
+        # Out of order, across the edges of the windows
+        self.ingest(
+            self.event('VIEW', self.now, properties={'view': 'Home'}),
+            self.event('VIEW', self.now - timedelta(days=10), properties={'view': 'Home'}),
+            self.event('VIEW', self.now + timedelta(hours=2), properties={'view': 'Home'}),
+            self.event('VIEW', self.now - timedelta(days=3), properties={'view': 'Home'}),
+            self.event('VIEW', self.now - timedelta(days=40), properties={'view': 'Home'}),
+        )
+        self.visitor_id = str(uuid.uuid4())
+        self.ingest(self.event('VIEW', self.now - timedelta(days=6), properties={'view': 'Home'}))
+
+        today = Rollups.day(self.now)
+        self.assertEqual(VisitorDay.objects.get(day=today, visitor__in=Session.objects.filter(
+            started_at=self.now - timedelta(days=10)).values('visitor_id')).sessions, 2)
+        counts = dict(ActiveUsers.objects.filter(app=self.app, day=today).values_list('window', 'visitors'))
+        self.assertEqual(counts, {1: 1, 7: 2, 30: 2})
+        self.assertEqual(ActiveUsers.objects.get(app=self.app, window=7, day=today - timedelta(days=4)).visitors, 2)
+        self.assertEqual(ActiveUsers.objects.get(app=self.app, window=30, day=today - timedelta(days=11)).visitors, 1)
+
+        # Rebuilding from the visitor days gives the same counters.
+        expected = sorted(ActiveUsers.objects.filter(app=self.app).values_list('window', 'day', 'visitors'))
+        ActiveUsers.objects.all().delete()
+        Rollups.rebuild_active_users(self.app.id)
+        self.assertEqual(sorted(ActiveUsers.objects.filter(app=self.app).values_list('window', 'day', 'visitors')), expected)
+
+        with self.settings(FEMTOLYTICS_30DAU_SESSIONS_THRESHOLD=4, FEMTOLYTICS_7DAU_SESSIONS_THRESHOLD=2):
+            active_users = Dashboard.compute_active_users(self.app)
+        self.assertEqual(active_users['30dau'], 1)
+        self.assertEqual(active_users['7dau'], 1)
+        self.assertEqual([(window['label'], window['visitors']) for window in active_users['active_users']],
+            [('DAU', 1), ('WAU', 2), ('MAU', 2)])
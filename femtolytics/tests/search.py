@@ -0,0 +1,116 @@
+import uuid
+
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from femtolytics.handler import Handler
+from femtolytics.models import Activity, App, VisitorSummary
+from femtolytics.search import Search
+
+User = get_user_model()
+
+
+class SearchTestCase(TestCase):
+    def setUp(self):
+        self.package_name = 'com.femtolytics.test'
+        self.owner = User.objects.create_user(
+            'john',
+            'lennon@thebeatles.com',
+            'johnpassword')
+        self.app = App.objects.create(
+            owner=self.owner,
+            package_name=self.package_name,
+        )
+        self.now = timezone.now()
+
+    def ingest(self, visitor_id, type, time, device='iPhone', category='event'):
+        item = {
+            category: {
+                'type': type,
+                'time': time.isoformat(),
+            },
+            'device': {
+                'name': device,
+                'os': 'iOS 1.0.0',
+            },
+            'package': {
+                'name': self.package_name,
+                'version': '1.0.0',
+                'build': '99',
+            },
+            'visitor_id': visitor_id,
+        }
+        if category == 'event':
+            activity, result = Handler.on_event(item)
+        else:
+            activity, result = Handler.on_action(item)
+        self.assertEqual(result, Handler.SUCCESS)
+        return Activity.objects.get(id=activity.id)
+
+    def test_id_range(self):
+        low, high = Search.id_range('0BAD-CAFE')
+        self.assertEqual(str(low), '0badcafe-0000-0000-0000-000000000000')
+        self.assertEqual(str(high), '0badcafe-ffff-ffff-ffff-ffffffffffff')
+        self.assertIsNone(Search.id_range('abc'))
+        self.assertIsNone(Search.id_range('Happy'))
+
+    def test_visitors(self):
+        first = self.ingest(str(uuid.uuid4()), 'VIEW', self.now).visitor
+        second = self.ingest(str(uuid.uuid4()), 'VIEW', self.now, device='Pixel 4').visitor
+        VisitorSummary.objects.filter(visitor=second).update(country_code='FRA', country='France')
+
+        def search(query):
+            return set(Search.visitors(self.app, query))
+
+        self.assertEqual(search(first.name), {first})
+        self.assertEqual(search(str(second.id)[:8]), {second})
+        # Words prefixes, in any case
+        adjective, animal = first.name.split(' ', 1)
+        self.assertIn(first, search(animal[:3].upper()))
+        self.assertIn(first, search(adjective[:3]))
+        self.assertEqual(search('pixel'), {second})
+        self.assertEqual(search('fra'), {second})
+        self.assertEqual(search('france'), {second})
+        self.assertEqual(search('nobody'), set())
+
+        # Other apps are not searched
+        other = App.objects.create(owner=self.owner, package_name='com.femtolytics.other')
+        self.assertEqual(set(Search.visitors(other, first.name)), set())
+
+    def test_renamed_visitors(self):
+        visitor = self.ingest(str(uuid.uuid4()), 'VIEW', self.now).visitor
+        visitor.name = 'Zealous Quokka'
+        visitor.save()
+        self.assertEqual(visitor.search_name, 'zealous quokka')
+        self.assertEqual(list(Search.visitors(self.app, 'quokka')), [visitor])
+        visitor.delete()
+        self.assertEqual(list(Search.visitors(self.app, 'quokka')), [])
+
+    def test_indexed(self):
+        self.assertEqual(Search.fts_available(connection), connection.vendor == 'sqlite')
+
+    def test_sessions(self):
+        visitor_id = str(uuid.uuid4())
+        clicked = self.ingest(visitor_id, 'Button Clicked', self.now, category='action').session
+        other = self.ingest(visitor_id, 'VIEW', self.now + timedelta(hours=2)).session
+        self.assertNotEqual(clicked, other)
+
+        self.assertEqual(list(Search.sessions(self.app, 'Button Clicked')), [clicked])
+        self.assertEqual(list(Search.sessions(self.app, str(other.id)[:6])), [other])
+        self.assertEqual(list(Search.sessions(self.app, 'VIEW')), [other])
+        self.assertEqual(list(Search.sessions(self.app, 'Swiped')), [])
+
+    def test_sessions_chunks(self):
+        visitor_id = str(uuid.uuid4())
+        older = self.ingest(visitor_id, 'VIEW', self.now).session
+        for seconds in range(10):
+            latest = self.ingest(visitor_id, 'VIEW', self.now + timedelta(hours=2, seconds=seconds)).session
+        self.assertNotEqual(older, latest)
+
+        with self.settings(FEMTOLYTICS_SEARCH_LIMIT=2):
+            # Chunks of 8 activities, the older session is in the second one.
+            self.assertEqual(list(Search.sessions(self.app, 'VIEW')), [latest, older])
+            with self.assertNumQueries(1):
+                self.assertEqual(Search.sessions_with_type(self.app, 'VIEW', 1), [latest.id])
@@ -0,0 +1,98 @@
+import uuid
+
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from femtolytics.handler import Handler
+from femtolytics.models import App, Session
+from femtolytics.timeline import Timeline
+
+User = get_user_model()
+
+
+class TimelineTestCase(TestCase):
+    def setUp(self):
+        self.package_name = 'com.femtolytics.test'
+        self.owner = User.objects.create_user(
+            'john',
+            'lennon@thebeatles.com',
+            'johnpassword')
+        self.app = App.objects.create(
+            owner=self.owner,
+            package_name=self.package_name,
+        )
+        self.now = timezone.now()
+        self.visitor_id = str(uuid.uuid4())
+
+    def view(self, time, name):
+        activity, result = Handler.on_event({
+            'event': {
+                'type': 'VIEW',
+                'time': time.isoformat(),
+                'properties': {
+                    'view': name,
+                },
+            },
+            'device': {
+                'name': 'iPhone',
+                'os': 'iOS 1.0.0',
+            },
+            'package': {
+                'name': self.package_name,
+                'version': '1.0.0',
+                'build': '99',
+            },
+            'visitor_id': self.visitor_id,
+        })
+        self.assertEqual(result, Handler.SUCCESS)
+        return activity
+
+    def test_pages(self):
+        # Two activities share the same time to exercise the tie breaker.
+        times = [self.now, self.now + timedelta(seconds=1), self.now + timedelta(seconds=1)] + [
+            self.now + timedelta(seconds=i) for i in range(2, 9)]
+        for index, time in enumerate(times):
+            self.view(time, f'View {index}')
+        session = Session.objects.get(app=self.app)
+
+        seen = []
+        cursor = None
+        pages = 0
+        while True:
+            activities, cursor = Timeline.page(session, cursor, limit=3)
+            pages += 1
+            seen.extend(activities)
+            if cursor is None:
+                break
+        self.assertEqual(pages, 4)
+        self.assertEqual(len(seen), 10)
+        self.assertEqual(len(set(activity.id for activity in seen)), 10)
+        self.assertEqual(seen, sorted(seen, key=lambda activity: (activity.occured_at, str(activity.id)), reverse=True))
+        self.assertEqual(seen[0].analyzed_properties, 'View 9')
+
+    @override_settings(FEMTOLYTICS_TIMELINE_PAGE_SIZE=2)
+    def test_page_size(self):
+        for index in range(3):
+            self.view(self.now + timedelta(seconds=index), f'View {index}')
+        session = Session.objects.get(app=self.app)
+        activities, cursor = Timeline.page(session, limit=100)
+        self.assertEqual(len(activities), 2)
+        self.assertIsNotNone(cursor)
+
+    def test_invalid_cursor(self):
+        self.view(self.now, 'Home')
+        session = Session.objects.get(app=self.app)
+        with self.assertRaises(ValueError):
+            Timeline.page(session, 'not a cursor')
+
+    def test_new_activities_invalidate_pages(self):
+        self.view(self.now, 'Home')
+        session = Session.objects.get(app=self.app)
+        activities, cursor = Timeline.page(session)
+        self.assertEqual(len(activities), 1)
+
+        with self.settings(FEMTOLYTICS_DASHBOARD_WATERMARK_INTERVAL=0):
+            self.view(self.now + timedelta(seconds=5), 'Settings')
+        activities, cursor = Timeline.page(session)
+        self.assertEqual([activity.analyzed_properties for activity in activities], ['Settings', 'Home'])
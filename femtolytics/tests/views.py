@@ -0,0 +1,143 @@
+import uuid
+
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from femtolytics.handler import Handler
+from femtolytics.models import App, Session, Visitor
+
+User = get_user_model()
+
+
+class ViewsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.package_name = 'com.femtolytics.test'
+        self.owner = User.objects.create_user(
+            'john',
+            'lennon@thebeatles.com',
+            'johnpassword')
+        self.app = App.objects.create(
+            owner=self.owner,
+            package_name=self.package_name,
+        )
+        self.now = timezone.now()
+        self.visitor_id = str(uuid.uuid4())
+        self.client = Client()
+        self.client.force_login(self.owner)
+
+    def ingest(self, type, time, version='1.0.0', properties=None):
+        event = {
+            'event': {
+                'type': type,
+                'time': time.isoformat(),
+            },
+            'device': {
+                'name': 'iPhone',
+                'os': 'iOS 1.0.0',
+            },
+            'package': {
+                'name': self.package_name,
+                'version': version,
+                'build': '99',
+            },
+            'visitor_id': self.visitor_id,
+        }
+        if properties is not None:
+            event['event']['properties'] = properties
+        activity, result = Handler.on_event(event)
+        self.assertEqual(result, Handler.SUCCESS)
+        return activity
+
+    def crashed_session(self):
+        self.ingest('VIEW', self.now, properties={'view': 'Home'})
+        self.ingest('VIEW', self.now + timedelta(seconds=5), properties={'view': 'Settings'})
+        self.ingest('CRASH', self.now + timedelta(seconds=10), properties={
+            'exception': 'Divide by zero', 'stack_trace': '#0 main (package:test/main.dart:12)'})
+        return Session.objects.get(app=self.app, visitor_id=self.visitor_id)
+
+    def test_overview(self):
+        self.crashed_session()
+        other = App.objects.create(owner=self.owner, package_name='com.femtolytics.other')
+        response = self.client.get(reverse('femtolytics:overview'), {'duration': 7})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['duration'], 7)
+        self.assertEqual([(row['app'], row['sessions'], row['visitors'], row['crash_free_rate'])
+                          for row in response.context['overview']], [(other, 0, 0, None), (self.app, 1, 1, 0.0)])
+        self.assertEqual(response.context['totals']['sessions'], 1)
+
+    def test_releases(self):
+        self.crashed_session()
+        self.visitor_id = str(uuid.uuid4())
+        self.ingest('VIEW', self.now, version='1.0.1')
+        response = self.client.get(reverse('femtolytics:releases_by_app', args=[self.app.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['app'], self.app)
+        self.assertEqual([(release['version'], release['sessions'], release['crash_free_rate'])
+                          for release in response.context['releases']],
+                         [('1.0.1.99', 1, 100.0), ('1.0.0.99', 1, 0.0)])
+
+    def test_sessions(self):
+        session = self.crashed_session()
+        response = self.client.get(reverse('femtolytics:sessions_by_app', args=[self.app.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['sessions']), [session])
+        self.assertEqual(response.context['count'], 1)
+
+        response = self.client.get(reverse('femtolytics:sessions_by_app', args=[self.app.id]), {'q': 'CRASH'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['query'], 'CRASH')
+        self.assertEqual(list(response.context['sessions']), [session])
+
+    def test_session_timeline(self):
+        session = self.crashed_session()
+        response = self.client.get(reverse('femtolytics:session', args=[self.app.id, session.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['session'], session)
+
+        url = reverse('femtolytics:session_timeline', args=[self.app.id, session.id])
+        page = self.client.get(url, {'limit': 2}).json()
+        self.assertIn('Divide by zero', page['html'])
+        self.assertNotIn('Home', page['html'])
+        self.assertIsNotNone(page['next'])
+        page = self.client.get(url, {'limit': 2, 'cursor': page['next']}).json()
+        self.assertIn('Home', page['html'])
+        self.assertIsNone(page['next'])
+        self.assertEqual(self.client.get(url, {'cursor': 'not a cursor'}).status_code, 400)
+
+    def test_visitors(self):
+        self.crashed_session()
+        visitor = Visitor.objects.get(pk=self.visitor_id)
+        response = self.client.get(reverse('femtolytics:visitors_by_app', args=[self.app.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['visitors']), [visitor])
+
+        response = self.client.get(reverse('femtolytics:visitors_by_app', args=[self.app.id]),
+                                   {'q': self.visitor_id[:8]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['query'], self.visitor_id[:8])
+        self.assertEqual(list(response.context['visitors']), [visitor])
+
+
+    def test_visitor(self):
+        self.crashed_session()
+        visitor = Visitor.objects.get(pk=self.visitor_id)
+        response = self.client.get(reverse('femtolytics:visitor', args=[self.app.id, visitor.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['summary'].sessions, 1)
+
+    def test_live(self):
+        response = self.client.get(reverse('femtolytics:live_by_app', args=[self.app.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['app'], self.app)
+        self.assertEqual(response.context['transport'], 'poll')
+
+    def test_owner(self):
+        other = User.objects.create_user('paul', 'mccartney@thebeatles.com', 'paulpassword')
+        self.client.force_login(other)
+        for name in ['releases_by_app', 'sessions_by_app', 'visitors_by_app', 'live_by_app']:
+            self.assertEqual(self.client.get(reverse(f'femtolytics:{name}', args=[self.app.id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('femtolytics:overview')).context['overview'], [])
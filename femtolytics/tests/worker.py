@@ -0,0 +1,134 @@
+import io
+import uuid
+
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from femtolytics.handler import Handler
+from femtolytics.models import App, Crash, CrashDay, GoalDay, ReleaseDay, RollupCheckpoint, VisitorSummary
+
+User = get_user_model()
+
+
+class RollupWorkerTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            'john',
+            'lennon@thebeatles.com',
+            'johnpassword')
+        self.inline_app = App.objects.create(
+            owner=self.owner,
+            package_name='com.femtolytics.inline',
+        )
+        self.worker_app = App.objects.create(
+            owner=self.owner,
+            package_name='com.femtolytics.worker',
+        )
+        self.now = timezone.now() - timedelta(hours=4)
+
+    def event(self, package_name, visitor_id, type, time, version='1.0.0', properties=None):
+        event = {
+            'event': {
+                'type': type,
+                'time': time.isoformat(),
+            },
+            'device': {
+                'name': 'iPhone',
+                'os': 'iOS 1.0.0',
+            },
+            'package': {
+                'name': package_name,
+                'version': version,
+                'build': '99',
+            },
+            'visitor_id': visitor_id,
+        }
+        if properties is not None:
+            event['event']['properties'] = properties
+        return event
+
+    def ingest(self, app):
+        crash = {'exception': 'Divide by zero', 'stack_trace': 'main.dart:12'}
+        first, second = str(uuid.uuid4()), str(uuid.uuid4())
+        for visitor_id, type, time, version, properties in [
+            (first, 'VIEW', self.now, '1.0.0', {'view': 'Home'}),
+            (first, 'CRASH', self.now + timedelta(seconds=10), '1.0.0', crash),
+            (first, 'CRASH', self.now + timedelta(seconds=20), '1.0.0', crash),
+            (first, 'VIEW', self.now + timedelta(hours=2), '1.0.1', {'view': 'Home'}),
+            (first, 'GOAL', self.now + timedelta(hours=2, seconds=5), '1.0.1', {'goal': 'Subscribed'}),
+            (second, 'VIEW', self.now + timedelta(minutes=1), '1.0.1', {'view': 'Home'}),
+            (second, 'CRASH', self.now + timedelta(minutes=2), '1.0.1', crash),
+            (first, 'VIEW', self.now - timedelta(seconds=30), '1.0.0', {'view': 'Splash'}),
+        ]:
+            activity, result = Handler.on_event(self.event(app.package_name, visitor_id, type, time, version, properties))
+            self.assertEqual(result, Handler.SUCCESS)
+
+    def snapshot(self, app):
+        return {
+            'release_days': sorted(ReleaseDay.objects.filter(app=app).values_list(
+                'release__version', 'day', 'sessions', 'crashed_sessions', 'goals', 'activities')),
+            'crash_days': sorted(CrashDay.objects.filter(app=app).values_list(
+                'release__version', 'day', 'occurrences', 'visitors')),
+            'goal_days': sorted(GoalDay.objects.filter(app=app).values_list(
+                'release__version', 'day', 'occurrences', 'visitors')),
+            'crash_visitors': sorted(Crash.objects.filter(app=app).values_list('visitors', flat=True)),
+            'visitors': sorted(VisitorSummary.objects.filter(app=app).values_list(
+                'sessions', 'seconds', 'activities', 'goals', 'crashes', 'last_seen_at', 'release__version')),
+        }
+
+    def test_worker_matches_inline(self):
+        self.maxDiff = None
+        self.ingest(self.inline_app)
+        with override_settings(FEMTOLYTICS_ROLLUPS_INLINE=False):
+            self.ingest(self.worker_app)
+            self.assertEqual(ReleaseDay.objects.filter(app=self.worker_app).count(), 0)
+
+            call_command('femtolytics_rollups', '--lag', '0', '--batch-size', '3', stdout=io.StringIO())
+            expected = self.snapshot(self.inline_app)
+            self.assertEqual(self.snapshot(self.worker_app), expected)
+
+            # Restarting does not roll up anything twice.
+            out = io.StringIO()
+            call_command('femtolytics_rollups', '--lag', '0', stdout=out)
+            self.assertEqual(out.getvalue(), '')
+            self.assertEqual(self.snapshot(self.worker_app), expected)
+
+    @override_settings(FEMTOLYTICS_ROLLUPS_INLINE=False)
+    def test_lag(self):
+        self.ingest(self.worker_app)
+        call_command('femtolytics_rollups', '--lag', '3600', stdout=io.StringIO())
+        self.assertEqual(ReleaseDay.objects.filter(app=self.worker_app).count(), 0)
+
+    @override_settings(FEMTOLYTICS_ROLLUPS_INLINE=False)
+    def test_partitions(self):
+        self.ingest(self.worker_app)
+        call_command('femtolytics_rollups', '--lag', '0', '--partitions', '2', '--partition', '0', stdout=io.StringIO())
+        call_command('femtolytics_rollups', '--lag', '0', '--partitions', '2', '--partition', '1', stdout=io.StringIO())
+        self.assertEqual(sum(ReleaseDay.objects.filter(app=self.worker_app).values_list('activities', flat=True)), 8)
+        self.assertEqual(RollupCheckpoint.objects.count(), 1)
+
+    def test_switch(self):
+        # Activities rolled up inline are not rolled up again once the worker takes over.
+        self.ingest(self.worker_app)
+        self.assertFalse(RollupCheckpoint.objects.exists())
+        with override_settings(FEMTOLYTICS_ROLLUPS_INLINE=False):
+            expected = self.snapshot(self.worker_app)
+            call_command('femtolytics_rollups', '--lag', '0', stdout=io.StringIO())
+            self.assertEqual(self.snapshot(self.worker_app), expected)
+
+            self.now += timedelta(days=1)
+            self.ingest(self.worker_app)
+            self.assertEqual(RollupCheckpoint.objects.count(), 1)
+            call_command('femtolytics_rollups', '--lag', '0', stdout=io.StringIO())
+        self.now -= timedelta(days=1)
+        self.ingest(self.inline_app)
+        self.now += timedelta(days=1)
+        self.ingest(self.inline_app)
+        self.assertEqual(self.snapshot(self.worker_app), self.snapshot(self.inline_app))
+
+    def test_inline_refused(self):
+        with self.assertRaises(CommandError):
+            call_command('femtolytics_rollups', stdout=io.StringIO())
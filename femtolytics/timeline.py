@@ -0,0 +1,80 @@
+import base64
+import binascii
+import logging
+import uuid
+
+from dateutil import parser
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from femtolytics.dashboard import Dashboard, MISSING
+from femtolytics.models import Activity
+
+logger = logging.getLogger("femtolytics")
+
+
+class Timeline:
+    """Pages through the activities of a session, most recent first.
+
+    Pages are delimited by a cursor on `(occured_at, id)` rather than by an
+    offset, so reading any page costs the same on a session with tens of
+    thousands of activities. Pages are cached under the app watermark, with
+    their properties already decoded, so like the dashboard they pick up new
+    activities once per watermark interval.
+    """
+
+    @classmethod
+    def page_size(cls):
+        size = 50
+        if hasattr(settings, 'FEMTOLYTICS_TIMELINE_PAGE_SIZE'):
+            size = settings.FEMTOLYTICS_TIMELINE_PAGE_SIZE
+        return size
+
+    @classmethod
+    def encode_cursor(cls, activity):
+        value = '{}|{}'.format(activity.occured_at.isoformat(), activity.id)
+        return base64.urlsafe_b64encode(value.encode('utf-8')).decode('ascii')
+
+    @classmethod
+    def decode_cursor(cls, cursor):
+        """Returns `(occured_at, id)`, raises ValueError for an invalid cursor."""
+        try:
+            value = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+            occured_at, id = value.split('|')
+            return parser.isoparse(occured_at), uuid.UUID(id)
+        except (TypeError, UnicodeError, binascii.Error) as e:
+            raise ValueError(str(e))
+
+    @classmethod
+    def page(cls, session, cursor=None, limit=None):
+        """Returns the activities following `cursor` and the cursor of the next page, if any."""
+        if limit is None or limit <= 0 or limit > Timeline.page_size():
+            limit = Timeline.page_size()
+        after = Timeline.decode_cursor(cursor) if cursor is not None else None
+        key = 'femtolytics:timeline:{}:{}:{}:{}'.format(
+            session.id, cursor, limit, Dashboard.watermark(session.app_id))
+        value = cache.get(key, MISSING)
+        if value is MISSING:
+            logger.debug(f'Timeline cache miss {key}')
+            value = Timeline.compute_page(session, after, limit)
+            cache.set(key, value, Dashboard.cache_timeout())
+        return value
+
+    @classmethod
+    def compute_page(cls, session, after, limit):
+        activities = Activity.objects.filter(session=session).select_related(
+            'app', 'visitor', 'device', 'release').order_by('-occured_at', '-id')
+        if after is not None:
+            occured_at, id = after
+            activities = activities.filter(Q(occured_at__lt=occured_at) | Q(occured_at=occured_at, id__lt=id))
+        # One more row tells whether there is a next page.
+        activities = list(activities[:limit + 1])
+        next_cursor = None
+        if len(activities) > limit:
+            activities = activities[:limit]
+            next_cursor = Timeline.encode_cursor(activities[-1])
+        for activity in activities:
+            # Decode once, the decoded properties are cached with the page.
+            activity.decoded_properties
+        return activities, next_cursor
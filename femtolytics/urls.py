@@ -7,6 +7,7 @@ app_name = 'femtolytics'
 urlpatterns = [
      path('', views.DashboardView.as_view(), name='index'),
      path('dashboard/<uuid:app_id>', views.DashboardByAppView.as_view(), name='dashboards_by_app'),
+     path('overview', views.OverviewView.as_view(), name='overview'),
      path('apps', views.AppsView.as_view(), name='apps'),
      path('apps/add', views.AppsAdd.as_view(), name='apps_add'),
      path('apps/edit/<uuid:app_id>', views.AppsEdit.as_view(), name='apps_edit'),
@@ -16,6 +17,7 @@ urlpatterns = [
      path('sessions', views.SessionsView.as_view(), name='sessions'),
      path('sessions/<uuid:app_id>', views.SessionsByAppView.as_view(), name='sessions_by_app'),
      path('sessions/<uuid:app_id>/<uuid:session_id>', views.SessionView.as_view(), name='session'),
+     path('sessions/<uuid:app_id>/<uuid:session_id>/timeline', views.SessionTimelineView.as_view(), name='session_timeline'),
      path('visitors', views.VisitorsView.as_view(), name='visitors'),
      path('visitors/<uuid:app_id>', views.VisitorsByAppView.as_view(), name='visitors_by_app'),
      path('visitors/<uuid:app_id>/<uuid:visitor_id>', views.VisitorView.as_view(), name='visitor'),
@@ -25,4 +27,10 @@ urlpatterns = [
      path('goals', views.GoalsView.as_view(), name='goals'),
      path('goals/<uuid:app_id>', views.GoalsByAppView.as_view(), name='goals_by_app'),
      path('goals/<uuid:app_id>/<uuid:goal_id>', views.GoalView.as_view(), name='goal'),
+     path('releases', views.ReleasesView.as_view(), name='releases'),
+     path('releases/<uuid:app_id>', views.ReleasesByAppView.as_view(), name='releases_by_app'),
+     path('live', views.LiveView.as_view(), name='live'),
+     path('live/<uuid:app_id>', views.LiveByAppView.as_view(), name='live_by_app'),
+     path('live/<uuid:app_id>/feed', views.LiveFeedView.as_view(), name='live_feed'),
+     path('live/<uuid:app_id>/stream', views.LiveStreamView.as_view(), name='live_stream'),
 ]
@@ -1,20 +1,28 @@
 import json
 import logging
+import time
 
 from datetime import timedelta
-from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models.functions import TruncDay
-from django.db.models import Count
+from django.db.models import Count, Sum
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404, Http404
+from django.template.loader import render_to_string
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
-from django.views.generic.base import View, TemplateView
-from femtolytics.models import Activity, App, Crash, Goal, Session, Visitor
+from django.views.generic.base import View
+from femtolytics.api import throttling
+from femtolytics.dashboard import Dashboard
+from femtolytics.live import Live
+from femtolytics.models import App, Crash, Goal, ReleaseDay, Session, Visitor, VisitorSummary
+from femtolytics.search import Search
+from femtolytics.timeline import Timeline
 from femtolytics.forms import AppForm
 
 logger = logging.getLogger("femtolytics")
 
+OCCURRENCES_PER_PAGE = 50
+
 def safe_cast(val, to_type, default=None):
     try:
         return to_type(val)
@@ -22,6 +30,47 @@ def safe_cast(val, to_type, default=None):
         return default
 
 
+def pagination_context(count, page, page_size):
+    context = {}
+    context['count'] = count
+    context['page_size'] = page_size
+    context['page'] = page
+    context['first_page'] = 0
+    context['previous_page'] = page - 1 if page > 0 else 0
+    context['next_page'] = page + 1 if (1 +page) * page_size < count else page
+    context['last_page'] = round(count / page_size)
+    context['pages'] = []
+    first = page - 3 if page > 3 else 0
+    for index in range(6):
+        if first + index <= context['last_page']:
+            context['pages'].append(first+index)
+    return context
+
+
+def occurrences_context(group, duration):
+    since = timezone.localdate() - timedelta(days=duration)
+    days = group.days.filter(day__gte=since)
+    # SELECT day, SUM(occurrences) FROM crashday WHERE crash_id = ? AND day >= ? GROUP BY day
+    histogram = days.values('day').annotate(c=Sum('occurrences')).values('day', 'c').order_by('day')
+    # SELECT release_id, SUM(occurrences), SUM(visitors) FROM crashday WHERE crash_id = ? AND day >= ? GROUP BY release_id
+    versions = days.values('release_id', 'release__version', 'release__build').annotate(
+        occurrences=Sum('occurrences'), visitors=Sum('visitors')).order_by('-release_id')
+    latest = group.occurrences.select_related(
+        'session', 'visitor', 'activity__app', 'activity__device', 'activity__release').order_by('-occured_at')
+    return {
+        'duration': duration,
+        'count': group.days.aggregate(c=Sum('occurrences'))['c'] or 0,
+        'visitors': group.visitors,
+        'histogram': list(histogram),
+        'versions': [{
+            'version': '{}.{}'.format(version['release__version'], version['release__build']),
+            'occurrences': version['occurrences'],
+            'visitors': version['visitors'],
+        } for version in versions],
+        'occurrences': latest[:OCCURRENCES_PER_PAGE],
+    }
+
+
 class DashboardView(LoginRequiredMixin, View):
     success_url = 'femtolytics:dashboards_by_app'
     failed_url = 'femtolytics:apps'
@@ -51,149 +100,61 @@ class DashboardByAppView(LoginRequiredMixin, View):
         
         # Last 5 sessions
         context['sessions'] = Session.objects.filter(
-            app=app).prefetch_related('visitor').order_by('-ended_at')[:6]
+            app=app).prefetch_related('visitor').annotate(activity_count=Count('activity')).order_by('-ended_at')[:6]
 
         # Graph information (for the last `duration` days)
         duration = int(request.GET.get('duration', 30))
         context['duration'] = duration
-        period_start = timezone.now() - timedelta(days=duration)
-        stats = {}
-        # Create empty entries
-        tzinfo = None
-        for index in range(0, duration):
-            then = period_start + timedelta(days=index)
-            then = timezone.datetime(then.year, then.month, then.day, tzinfo=then.tzinfo)
-            tzinfo = then.tzinfo
-            stats[then] = {
-                'sessions': 0,
-                'visitors': 0,
-            }
-        # SELECT COUNT(*) AS c, DATE(started_at) AS day FROM sessions GROUP BY day
-        sessions = Session.objects.filter(app=app, started_at__gte=period_start).annotate(day=TruncDay(
-            'started_at')).values('day').annotate(c=Count('id')).values('day', 'c')
-        context['session_count'] = 0
-        for session in sessions:
-            then = timezone.datetime(session['day'].year, session['day'].month, session['day'].day, tzinfo=tzinfo)
-            stats[then] = {
-                'sessions': session['c'],
-                'visitors': 0,
-            }
-            context['session_count'] += session['c']
-        # SELECT COUNT(*) AS c, DATE(registered_at) AS day FROM visitors GROUP BY day
-        visitors = Visitor.objects.filter(app=app, registered_at__gte=period_start).annotate(day=TruncDay(
-            'registered_at')).values('day').annotate(c=Count('id')).values('day', 'c')
-        context['visitor_count'] = 0
-        for visitor in visitors:
-            then = timezone.datetime(visitor['day'].year, visitor['day'].month, visitor['day'].day, tzinfo=tzinfo)
-            stats[then]['visitors'] = visitor['c']
-            context['visitor_count'] += visitor['c']
-        # Organize entries to be easily graphed.
-        entries = []
-        for day in sorted(stats):
-            entries.append({
-                'day': day,
-                'sessions': stats[day]['sessions'],
-                'visitors': stats[day]['visitors'],
-            })
-        context['stats'] = entries
+        context.update(Dashboard.stats(app, duration))
 
-        # Map Information        
-        try:
-            import pycountry
-            from django.contrib.gis.geoip2 import GeoIP2
-
-            # SELECT COUNT(DISTINCT(visitor_id)) AS c, country FROM activity GROUP BY country
-            activities = Activity.objects.filter(app=app, occured_at__gte=period_start).values(
-                'country').annotate(c=Count('visitor_id', distinct=True)).values('country', 'c')
-            locations = []
-            min_sessions = 0
-            max_sessions = None
-            for activity in activities:
-                if activity['country'] is not None:
-                    if min_sessions is None or activity['c'] < min_sessions:
-                        min_sessions = activity['c']
-                    if max_sessions is None or activity['c'] > max_sessions:
-                        max_sessions = activity['c']
-                    country = pycountry.countries.get(name=activity['country'])
-                    locations.append({
-                        'country': activity['country'],
-                        'alpha_2': country.alpha_2 if country is not None else None,
-                        'alpha_3': country.alpha_3 if country is not None else None,
-                        'count': activity['c'],
-                    })
-            for location in locations:
-                if max_sessions > min_sessions:
-                    r = (location['count'] - min_sessions) / \
-                        (max_sessions - min_sessions)
-                    r = round(r, 1)
-                    location['fill'] = 'FILL{}'.format(r)
-                else:
-                    location['fill'] = 'FILL0.7'
-
-            context['locations'] = locations
-        except ImportError as e:
-            # pycountry unavailable, ignore silently
+        # Map Information
+        locations = Dashboard.locations(app, duration)
+        if locations is None:
             context['no_geoip'] = True
-            pass
-
-        # Goals
-        goals = Goal.objects.filter(app=app, last_at__gte=period_start).prefetch_related('activities')
-        goal_map = {}
-        for goal in goals:
-            goal_map[goal.name] = {
-                'id': goal.id,
-                'short_id': goal.short_id,
-                'count': goal.activities.count(),
-            }
-        context['goals'] = goal_map
-
-        # Crashes
-        crashes = Crash.objects.filter(app=app, last_at__gte=period_start).prefetch_related('activities')
-        crash_map = {}
-        for crash in crashes:
-            crash_map[crash.signature] = {
-                'id': crash.id,
-                'short_id': crash.short_id,
-                'count': crash.activities.count(),
-                'sample': crash.activities.first().analyzed_properties,
-            }
-        context['crashes'] = crash_map
-
-        # Compute 30-DAU
-        thirty = timezone.now() - timedelta(days=30)
-        min_sessions = 5
-        if hasattr(settings, 'FEMTOLYTICS_30DAU_SESSIONS_THRESHOLD'):
-            min_sessions = settings.FEMTOLYTICS_30DAU_SESSIONS_THRESHOLD
-
-        activities = Activity.objects.filter(app=app, occured_at__gte=thirty).values(
-            'visitor_id').annotate(c=Count('session_id', distinct=True)).filter(c__gte=min_sessions).values('visitor_id', 'c')
-        context['30dau'] = activities.count()
-
-        # Compute 7-DAU
-        seven = timezone.now() - timedelta(days=7)
-        min_sessions = 2
-        if hasattr(settings, 'FEMTOLYTICS_7DAU_SESSIONS_THRESHOLD'):
-            min_sessions = settings.FEMTOLYTICS_7DAU_SESSIONS_THRESHOLD
-
-        activities = Activity.objects.filter(app=app, occured_at__gte=seven).values(
-            'visitor_id').annotate(c=Count('session_id', distinct=True)).filter(c__gte=min_sessions).values('visitor_id', 'c')
-        context['7dau'] = activities.count()
+        else:
+            context['locations'] = locations
+
+        context['goals'] = Dashboard.goals(app, duration)
+        context['crashes'] = Dashboard.crashes(app, duration)
+        context.update(Dashboard.active_users(app))
 
         return render(request, self.template_name, context)
 
 
+class OverviewView(LoginRequiredMixin, View):
+    template_name = 'femtolytics/overview.html'
+
+    def get(self, request):
+        context = {}
+        duration = safe_cast(request.GET.get('duration'), int, 30)
+        context['duration'] = duration
+        context['overview'] = Dashboard.overview(App.objects.filter(owner=request.user).order_by('package_name'), duration)
+        context['totals'] = {
+            name: sum(row[name] for row in context['overview'])
+            for name in ['sessions', 'visitors', 'crashes', 'goals']
+        }
+        return render(request, self.template_name, context)
+
+
 class VisitorView(LoginRequiredMixin, View):
     template_name = 'femtolytics/visitor.html'
 
     def get(self, request, app_id, visitor_id):
         visitor = get_object_or_404(Visitor, pk=visitor_id)
-        if visitor.app.owner != request.user:
-            return Http404
+        if visitor.app.owner != request.user or visitor.app_id != app_id:
+            raise Http404
+
+        page_size = 10
 
         context = {}
         context['visitor'] = visitor
-        context['sessions'] = Session.objects.filter(
-            visitor=visitor_id).prefetch_related('visitor', 'app').order_by('-ended_at')
+        context['summary'] = VisitorSummary.objects.filter(visitor=visitor).select_related('device', 'release').first()
+        qs = Session.objects.filter(visitor=visitor).prefetch_related('visitor', 'app').order_by('-ended_at')
+        page = safe_cast(request.GET.get('page'), int, 0)
+        context.update(pagination_context(qs.count(), page, page_size))
+
+        offset = page_size * page
+        context['sessions'] = qs[offset:offset+page_size]
         return render(request, self.template_name, context)
 
 
@@ -202,7 +163,11 @@ class AppsView(LoginRequiredMixin, View):
 
     def get(self, request):
         context = {}
-        context['apps'] = App.objects.filter(owner=request.user)
+        apps = list(App.objects.filter(owner=request.user))
+        dropped = throttling.dropped([app.package_name for app in apps])
+        for app in apps:
+            app.dropped = dropped[app.package_name]
+        context['apps'] = apps
         return render(request, self.template_name, context)
 
 
@@ -295,20 +260,15 @@ class SessionsByAppView(LoginRequiredMixin, View):
         context['app'] = app
         context['activated'] = Session.objects.filter(app=app).count() > 0
         context['apps'] = App.objects.filter(owner=request.user)
-        qs = Session.objects.filter(app=app).prefetch_related('visitor', 'app', 'activity_set').order_by('-ended_at')
-        context['count'] = qs.count()
-        context['page_size'] = page_size
+        query = request.GET.get('q', '').strip()
+        if query:
+            context['query'] = query
+            context['sessions'] = Search.sessions(app, query).prefetch_related('visitor', 'app')
+            return render(request, self.template_name, context)
+
+        qs = Session.objects.filter(app=app).prefetch_related('visitor', 'app').order_by('-ended_at')
         page = safe_cast(request.GET.get('page'), int, 0)
-        context['page'] = page
-        context['first_page'] = 0
-        context['previous_page'] = page - 1 if page > 0 else 0
-        context['next_page'] = page + 1 if (1 +page) * page_size < context['count'] else page
-        context['last_page'] = round(context['count'] / page_size)
-        context['pages'] = []
-        first = page - 3 if page > 3 else 0
-        for index in range(6):
-            if first + index <= context['last_page']:
-                context['pages'].append(first+index)
+        context.update(pagination_context(qs.count(), page, page_size))
 
         offset = page_size * page
         context['sessions'] = qs[offset:offset+page_size]
@@ -329,6 +289,27 @@ class SessionView(LoginRequiredMixin, View):
         return render(request, self.template_name, context)
 
 
+class SessionTimelineView(LoginRequiredMixin, View):
+    template_name = 'femtolytics/fragments/timeline.html'
+
+    def get(self, request, app_id, session_id):
+        app = get_object_or_404(App, pk=app_id)
+        if app.owner != request.user:
+            raise Http404
+        session = get_object_or_404(Session, pk=session_id)
+        if session.app != app:
+            raise Http404
+        try:
+            activities, next_cursor = Timeline.page(
+                session, request.GET.get('cursor'), safe_cast(request.GET.get('limit'), int))
+        except ValueError:
+            return JsonResponse({'error': 'invalid cursor'}, status=400)
+        return JsonResponse({
+            'html': render_to_string(self.template_name, {'activities': activities}, request),
+            'next': next_cursor,
+        })
+
+
 class VisitorsView(LoginRequiredMixin, View):
     success_url = 'femtolytics:visitors_by_app'
     failed_url = 'femtolytics:apps'
@@ -352,8 +333,13 @@ class VisitorsByAppView(LoginRequiredMixin, View):
         context['app'] = app
         context['activated'] = Session.objects.filter(app=app).count() > 0
         context['apps'] = App.objects.filter(owner=request.user)
-        context['visitors'] = Visitor.objects.filter(
-            app=app).order_by('-registered_at')
+        query = request.GET.get('q', '').strip()
+        if query:
+            context['query'] = query
+            context['visitors'] = Search.visitors(app, query)
+        else:
+            context['visitors'] = Visitor.objects.filter(
+                app=app).order_by('-registered_at')
         return render(request, self.template_name, context)
 
 class CrashesView(LoginRequiredMixin, View):
@@ -378,16 +364,7 @@ class CrashesByAppView(LoginRequiredMixin, View):
         context = {}
         context['app'] = app
         context['activated'] = Session.objects.filter(app=app).count() > 0
-        crashes = Crash.objects.filter(app=app).prefetch_related('activities')
-        crash_map = {}
-        for crash in crashes:
-            crash_map[crash.signature] = {
-                'id': crash.id,
-                'short_id': crash.short_id,
-                'count': crash.activities.count(),
-                'sample': crash.activities.first().analyzed_properties,
-            }
-        context['crashes'] = crash_map
+        context['crashes'] = Dashboard.summarize_crashes(Crash.objects.filter(app=app))
         return render(request, self.template_name, context)
 
 class CrashView(LoginRequiredMixin, View):
@@ -401,7 +378,7 @@ class CrashView(LoginRequiredMixin, View):
         if crash.app != app:
             raise Http404
     
-        context = {}
+        context = occurrences_context(crash, safe_cast(request.GET.get('duration'), int, 30))
         context['app'] = app
         context['crash'] = crash
         return render(request, self.template_name, context)
@@ -427,15 +404,7 @@ class GoalsByAppView(LoginRequiredMixin, View):
         context = {}
         context['app'] = app
         context['activated'] = Session.objects.filter(app=app).count() > 0
-        goals = Goal.objects.filter(app=app).prefetch_related('activities')
-        goal_map = {}
-        for goal in goals:
-            goal_map[goal.name] = {
-                'id': goal.id,
-                'short_id': goal.short_id,
-                'count': goal.activities.count(),
-            }
-        context['goals'] = goal_map        
+        context['goals'] = Dashboard.summarize_goals(Goal.objects.filter(app=app))
         
         return render(request, self.template_name, context)
 
@@ -450,7 +419,142 @@ class GoalView(LoginRequiredMixin, View):
         if goal.app != app:
             raise Http404
     
-        context = {}
+        context = occurrences_context(goal, safe_cast(request.GET.get('duration'), int, 30))
         context['app'] = app
         context['goal'] = goal
         return render(request, self.template_name, context)
+
+
+class ReleasesView(LoginRequiredMixin, View):
+    success_url = 'femtolytics:releases_by_app'
+    failed_url = 'femtolytics:apps'
+
+    def get(self, request):
+        apps = App.objects.filter(owner=request.user)
+        if apps.count() == 0:
+            return redirect(self.failed_url)
+        else:
+            return redirect(self.success_url, apps[0].id)
+
+
+class ReleasesByAppView(LoginRequiredMixin, View):
+    template_name = 'femtolytics/releases.html'
+
+    def get(self, request, app_id):
+        app = get_object_or_404(App, pk=app_id)
+        if app.owner != request.user:
+            raise Http404
+
+        context = {}
+        context['app'] = app
+        context['apps'] = App.objects.filter(owner=request.user)
+        context['activated'] = Session.objects.filter(app=app).count() > 0
+        duration = safe_cast(request.GET.get('duration'), int, 30)
+        context['duration'] = duration
+
+        # SELECT release_id, SUM(sessions), ... FROM releaseday WHERE app_id = ? AND day >= ? GROUP BY release_id
+        since = timezone.localdate() - timedelta(days=duration)
+        days = ReleaseDay.objects.filter(app=app, day__gte=since).values(
+            'release_id', 'release__version', 'release__build').annotate(
+            sessions=Sum('sessions'), crashed_sessions=Sum('crashed_sessions'),
+            goals=Sum('goals'), activities=Sum('activities')).order_by('-release_id')
+        releases = []
+        for day in days:
+            crash_free = None
+            if day['sessions'] > 0:
+                crash_free = round(100.0 * (day['sessions'] - day['crashed_sessions']) / day['sessions'], 2)
+            releases.append({
+                'version': '{}.{}'.format(day['release__version'], day['release__build']),
+                'sessions': day['sessions'],
+                'crashed_sessions': day['crashed_sessions'],
+                'crash_free_sessions': day['sessions'] - day['crashed_sessions'],
+                'crash_free_rate': crash_free,
+                'goals': day['goals'],
+                'goals_per_session': round(day['goals'] / day['sessions'], 2) if day['sessions'] > 0 else None,
+                'activities': round(day['activities']),
+            })
+        context['releases'] = releases
+        return render(request, self.template_name, context)
+
+
+class LiveView(LoginRequiredMixin, View):
+    success_url = 'femtolytics:live_by_app'
+    failed_url = 'femtolytics:apps'
+
+    def get(self, request):
+        apps = App.objects.filter(owner=request.user)
+        if apps.count() == 0:
+            return redirect(self.failed_url)
+        else:
+            return redirect(self.success_url, apps[0].id)
+
+
+class LiveByAppView(LoginRequiredMixin, View):
+    template_name = 'femtolytics/live.html'
+
+    def get(self, request, app_id):
+        app = get_object_or_404(App, pk=app_id)
+        if app.owner != request.user:
+            raise Http404
+
+        context = {}
+        context['app'] = app
+        context['apps'] = App.objects.filter(owner=request.user)
+        context['transport'] = Live.transport()
+        return render(request, self.template_name, context)
+
+
+def live_data(app, after, timeout):
+    entries, last = Live.since(app.id, after, timeout)
+    return {
+        'entries': entries,
+        'last': last,
+        'sessions': Live.active_sessions(app.id),
+    }
+
+
+class LiveFeedView(LoginRequiredMixin, View):
+    """Long polling: answers as soon as there are entries after `after`, or after `wait` seconds."""
+    max_wait = 25
+
+    def get(self, request, app_id):
+        app = get_object_or_404(App, pk=app_id)
+        if app.owner != request.user:
+            raise Http404
+        after = safe_cast(request.GET.get('after'), int, 0)
+        wait = min(max(safe_cast(request.GET.get('wait'), float, 0), 0), self.max_wait)
+        return JsonResponse(live_data(app, after, wait))
+
+
+class LiveStreamView(LoginRequiredMixin, View):
+    """Server-sent events, each one carrying the same data as `LiveFeedView`.
+
+    Every stream holds a worker thread, so streams are closed after
+    `duration` seconds and browsers reconnect from the last event they got.
+    """
+    duration = 300
+    keepalive = 15
+
+    def get(self, request, app_id):
+        app = get_object_or_404(App, pk=app_id)
+        if app.owner != request.user:
+            raise Http404
+        after = safe_cast(request.META.get('HTTP_LAST_EVENT_ID', request.GET.get('after')), int, 0)
+        response = StreamingHttpResponse(self.stream(app, after), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def stream(self, app, after):
+        yield 'retry: 3000\n\n'
+        data = live_data(app, after, 0)
+        yield 'id: {}\ndata: {}\n\n'.format(data['last'], json.dumps(data))
+        after = data['last']
+        deadline = time.monotonic() + self.duration
+        while time.monotonic() < deadline:
+            data = live_data(app, after, self.keepalive)
+            if data['last'] == after:
+                yield ': keepalive\n\n'
+                continue
+            yield 'id: {}\ndata: {}\n\n'.format(data['last'], json.dumps(data))
+            after = data['last']